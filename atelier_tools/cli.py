@@ -1,7 +1,47 @@
 #!/usr/bin/env python3
 
-from .ryza_parser import Database, create_typescript_interfaces
-from .ryza_chain_finder import ChainFinder
+import os
+import sys
+
+from .ryza_parser import Element, Item, create_typescript_interfaces
+from .ryza_chain_batch import read_queries, run_batch
+from .ryza_chain_finder import ChainConstraints, ChainFinder, SearchMode
+from .ryza_chain_oracle import load_oracle
+from .ryza_item_table import (ItemTable, find_game_items,
+                              parse_game_conditions)
+from .ryza_search import MatchRank
+from .ryza_server import QueryService, serve
+from .ryza_snapshot import cache_dir, load_database
+
+GAMES = ('ryza1', 'ryza2')
+# late game powerful items can mess up early game chain searches
+LATE_GAME_ITEMS = [
+    'red stone',
+    'philosopher\'s stone',
+    'crystal element',
+    'holy nut',
+]
+
+
+def add_search_mode_arguments(parser) -> None:
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument(
+        '--bidirectional',
+        dest='mode',
+        action='store_const',
+        const=SearchMode.BIDIRECTIONAL,
+        default=SearchMode.BREADTH_FIRST,
+        help='search from both ends, ties may resolve to other chains')
+    modes.add_argument('--astar',
+                       dest='mode',
+                       action='store_const',
+                       const=SearchMode.ASTAR,
+                       help='A* search with landmark bounds, ties may '
+                       'resolve to other chains')
+    parser.add_argument('--landmarks',
+                        type=int,
+                        default=8,
+                        help='number of landmarks for --astar')
 
 
 def main():
@@ -18,48 +58,275 @@ def main():
                              default='en',
                              help='2 letter language code')
     main_parser.add_argument('-v', '--verbose', action='store_true')
+    main_parser.add_argument('--no-cache',
+                             action='store_true',
+                             help='always parse the game files, do not use '
+                             'or update the database snapshot')
+    main_parser.add_argument('--hash-inputs',
+                             action='store_true',
+                             help='match the database snapshot to the game '
+                             'files by their contents instead of their size '
+                             'and modification time, slower')
+    main_parser.add_argument('--lazy',
+                             action='store_true',
+                             help='only parse the parts of the game files '
+                             'the command uses, this never writes a snapshot')
+    main_parser.add_argument('--jobs',
+                             type=int,
+                             default=None,
+                             help='processes used for reading the game files '
+                             '(default: read them in the main process)')
     subparsers = main_parser.add_subparsers(dest='command')
 
     item_info_parser = subparsers.add_parser('items', help='item info')
     item_info_parser.add_argument('item_names', nargs='*', type=str.lower)
+    item_info_parser.add_argument('--where',
+                                  action='append',
+                                  default=[],
+                                  help='only list items matching a condition '
+                                  'like level<=20, price<300, element=ice, '
+                                  'category=(fuel) or effect!=...; can be '
+                                  'repeated')
+    item_info_parser.add_argument('--sort',
+                                  help='sort the --where results by a field, '
+                                  'prefix it with - for descending order')
+    item_info_parser.add_argument('--fields',
+                                  default='tag,name',
+                                  help='comma separated fields of the --where '
+                                  'results (default: tag,name)')
+    item_info_parser.add_argument('--all-games',
+                                  action='store_true',
+                                  help='query the items of every game, see '
+                                  'the game field')
+    item_info_parser.add_argument('--all-langs',
+                                  action='store_true',
+                                  help='query the items once per language '
+                                  'with a string table, see the lang field')
 
     item_chain_parser = subparsers.add_parser('chain', help='find craft chain')
     item_chain_parser.add_argument('--limit',
                                    type=int,
                                    default=10,
                                    help='number of chains to display')
+    add_search_mode_arguments(item_chain_parser)
+    item_chain_parser.add_argument('--compare-expansions',
+                                   action='store_true',
+                                   help='also print the nodes each search '
+                                   'mode expands and the spur searches it '
+                                   'runs for these chains')
+    item_chain_parser.add_argument('--spur-jobs',
+                                   type=int,
+                                   default=1,
+                                   help='processes running the searches for '
+                                   'each next chain at the same time')
+    item_chain_parser.add_argument('--timeout',
+                                   type=float,
+                                   help='stop searching after this many '
+                                   'seconds, printing each chain as it is '
+                                   'found')
+    item_chain_parser.add_argument('--budget',
+                                   type=int,
+                                   help='stop searching after expanding this '
+                                   'many nodes, printing each chain as it is '
+                                   'found')
+    item_chain_parser.add_argument('--store',
+                                   action='store_true',
+                                   help='keep the chains found on disk, and '
+                                   'reuse them on later runs')
+    item_chain_parser.add_argument('--exclude',
+                                   action='append',
+                                   default=[],
+                                   type=str.lower,
+                                   metavar='NAME',
+                                   help='category or item the chains must '
+                                   'not use, can be repeated')
+    item_chain_parser.add_argument('--no-late-game',
+                                   action='store_true',
+                                   help='exclude ' +
+                                   ', '.join(LATE_GAME_ITEMS))
+    item_chain_parser.add_argument('--max-level',
+                                   type=int,
+                                   default=None,
+                                   help='only use items up to this level')
+    item_chain_parser.add_argument('--no-dlc',
+                                   action='store_true',
+                                   help='do not use DLC items')
+    item_chain_parser.add_argument('--no-ev-links',
+                                   action='store_true',
+                                   help='do not use EV-link connections')
+    item_chain_parser.add_argument('--no-morphs',
+                                   action='store_true',
+                                   help='do not use morph connections')
+    item_chain_parser.add_argument('--carry-effect',
+                                   action='append',
+                                   default=[],
+                                   help='only use items that can have this '
+                                   'effect, can be repeated')
+    item_chain_parser.add_argument('--carry-element',
+                                   action='append',
+                                   default=[],
+                                   type=str.lower,
+                                   choices=[
+                                       elem.value.lower() for elem in Element
+                                   ],
+                                   help='only use items that can have this '
+                                   'element, can be repeated')
+    item_chain_parser.add_argument('--carry-category',
+                                   action='append',
+                                   default=[],
+                                   help='only use items that can have this '
+                                   'category, can be repeated')
     item_chain_parser.add_argument('source',
                                    type=str.lower,
                                    help='category or item to start chain from')
     item_chain_parser.add_argument('target',
                                    type=str.lower,
                                    help='category or item to chain to')
+    item_chain_parser.add_argument('--from',
+                                   dest='more_sources',
+                                   action='append',
+                                   default=[],
+                                   type=str.lower,
+                                   metavar='SOURCE',
+                                   help='another category or item to start '
+                                   'from, can be repeated')
+    item_chain_parser.add_argument('--to',
+                                   dest='more_targets',
+                                   action='append',
+                                   default=[],
+                                   type=str.lower,
+                                   metavar='TARGET',
+                                   help='another category or item to chain '
+                                   'to, can be repeated')
+
+    batch_parser = subparsers.add_parser(
+        'chain-batch',
+        help='find craft chains for many queries, one JSON line each')
+    batch_parser.add_argument('--limit',
+                              type=int,
+                              default=10,
+                              help='number of chains of queries without '
+                              'their own limit')
+    add_search_mode_arguments(batch_parser)
+    batch_parser.add_argument('--workers',
+                              type=int,
+                              default=None,
+                              help='processes answering queries at the same '
+                              'time (default: one per CPU core)')
+    batch_parser.add_argument('queries',
+                              type=argparse.FileType('r'),
+                              nargs='?',
+                              default='-',
+                              help='file of tab separated source, target '
+                              'and optional limit lines')
+
+    distance_parser = subparsers.add_parser(
+        'distance', help='chain lengths from the precomputed table')
+    distance_parser.add_argument('--within',
+                                 type=int,
+                                 default=1,
+                                 help='without a target, list everything '
+                                 'at most this many steps away')
+    distance_parser.add_argument('--rebuild',
+                                 action='store_true',
+                                 help='recompute the table even if the '
+                                 'cached one is up to date')
+    distance_parser.add_argument('source',
+                                 type=str.lower,
+                                 help='category or item to start from')
+    distance_parser.add_argument('target',
+                                 type=str.lower,
+                                 nargs='?',
+                                 help='category or item to measure to')
+
+    serve_parser = subparsers.add_parser(
+        'serve', help='answer queries over a local HTTP JSON API')
+    serve_parser.add_argument('--host', type=str, default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8377)
+    serve_parser.add_argument('--socket',
+                              type=str,
+                              default=None,
+                              help='listen on this unix socket instead')
+    serve_parser.add_argument('--cache-size',
+                              type=int,
+                              default=256,
+                              help='number of chain results to keep')
 
     recipe_find_parser = subparsers.add_parser('category',
                                                help='find recipe for category')
     recipe_find_parser.add_argument('category', type=str.lower)
 
+    search_parser = subparsers.add_parser(
+        'search', help='ranked item and category search')
+    search_parser.add_argument('--limit',
+                               type=int,
+                               default=20,
+                               help='number of matches to display')
+    search_parser.add_argument('query', type=str.lower)
+
     subparsers.add_parser('dump-effects', help='dump effect names')
     subparsers.add_parser('dump-categories', help='dump category names')
     subparsers.add_parser('dump-ts-types', help='dump typescript types')
 
     dump_json = subparsers.add_parser('dump-json', help='dump effect names')
-    dump_json.add_argument('dump_file', type=argparse.FileType('w'))
+    dump_json.add_argument('--all-langs',
+                           action='store_true',
+                           help='dump every language with a string table, '
+                           '{lang} in dump_file is replaced with the '
+                           'language code')
+    dump_json.add_argument('dump_file', type=str)
 
     args = main_parser.parse_args()
+    if (args.command == 'dump-json' and args.all_langs
+            and '{lang}' not in args.dump_file):
+        main_parser.error('dump_file has to contain {lang} with --all-langs')
 
-    db = Database(args.game, lang=args.lang)
+    db = load_database(args.game,
+                       lang=args.lang,
+                       use_cache=not args.no_cache,
+                       jobs=args.jobs,
+                       lazy=args.lazy,
+                       hash_inputs=args.hash_inputs)
 
-    # TODO: re-add this option?
-    # late game powerful items can mess up early game chain searches
-    # disabled = [
-    #     # 'red stone',
-    #     # 'Philosopher\'s Stone',
-    #     # 'Crystal Element',
-    #     # 'Holy Nut',
-    # ]
-
-    if args.command == 'items':
+    if args.command == 'items' and (args.where or args.sort or args.all_games
+                                    or args.all_langs):
+        dbs = [db]
+        if args.all_games:
+            dbs += [
+                load_database(game,
+                              lang=args.lang,
+                              use_cache=not args.no_cache,
+                              jobs=args.jobs,
+                              lazy=args.lazy,
+                              hash_inputs=args.hash_inputs)
+                for game in GAMES if game != db.game
+            ]
+        tables = []
+        for game_db in dbs:
+            langs = (game_db.available_languages()
+                     if args.all_langs else [game_db.lang])
+            for lang in langs:
+                with game_db.language(lang):
+                    tables.append(ItemTable.build(game_db))
+        table = tables[0] if len(tables) == 1 else ItemTable.combine(tables)
+        query = table.query()
+        try:
+            # names are looked up in each game, tags can differ between them
+            for text in args.where:
+                query = query.where_games(parse_game_conditions(dbs, text))
+            if args.item_names:
+                query = query.only_games(find_game_items(dbs, args.item_names))
+            if args.sort:
+                query = query.sort(args.sort.lstrip('-'),
+                                   args.sort.startswith('-'))
+            query = query.select(*args.fields.split(','))
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        for row in query:
+            print('\t'.join(','.join(value) if isinstance(value, list) else
+                            str(value) for value in row))
+    elif args.command == 'items':
         if not args.item_names:
             for item in db.items.values():
                 item.print(args.verbose)
@@ -72,28 +339,141 @@ def main():
                     item.print(args.verbose)
                     seen.add(item.tag)
     elif args.command == 'chain':
-        # find source
-        source_item, source_cat = db.find_item_or_category(args.source)
-        if not (source_item or source_cat):
-            print(f'{args.source} not found!')
-            return 1
-        assert not (source_item and source_cat)
+        ends = []
+        for queries in ([args.source] + args.more_sources,
+                        [args.target] + args.more_targets, args.exclude):
+            found = []
+            for query in queries:
+                item, cat = db.find_item_or_category(query)
+                if not (item or cat):
+                    print(f'{query} not found!')
+                    return 1
+                assert not (item and cat)
+                found.append(item or cat)
+            ends.append(found)
+        sources, targets, exclusions = ends
+        if args.no_late_game:
+            for name in LATE_GAME_ITEMS:
+                # not every game has all of them, and a near miss would
+                # exclude some unrelated item
+                for match in db.search(name, (Item, ), loose=False):
+                    if match.rank <= MatchRank.EXACT_NAME:
+                        exclusions.append(match.obj)
+        effects = []
+        for query in args.carry_effect:
+            effect = db.find_effect(query)
+            if not effect:
+                print(f'{query} not found!')
+                return 1
+            effects.append(effect)
+        categories = []
+        for query in args.carry_category:
+            cat = db.find_category(query)
+            if not cat:
+                print(f'{query} not found!')
+                return 1
+            categories.append(cat)
+        elements = [
+            elem for elem in Element
+            if elem.value.lower() in args.carry_element
+        ]
+        constraints = ChainConstraints(
+            frozenset(thing.tag for thing in exclusions), args.max_level,
+            args.no_dlc, args.no_ev_links, args.no_morphs,
+            frozenset(effect.tag for effect in effects), frozenset(elements),
+            frozenset(cat.tag for cat in categories))
 
-        # find target
-        target_item, target_cat = db.find_item_or_category(args.target)
-        if not (target_item or target_cat):
-            print(f'{args.target} not found!')
+        source_names = ', '.join(source.name for source in sources)
+        target_names = ', '.join(target.name for target in targets)
+        print(f'Finding craft chain from {source_names} to {target_names}...')
+        landmarks = 0
+        if args.mode == SearchMode.ASTAR or args.compare_expansions:
+            landmarks = args.landmarks
+        finder = ChainFinder(
+            db,
+            store_dir=cache_dir(db.game) if args.store else None,
+            landmarks=landmarks)
+        finder.start_spur_pool(args.spur_jobs)
+        source_tags = [source.tag for source in sources]
+        target_tags = [target.tag for target in targets]
+        try:
+            finder.print_paths(source_tags, target_tags, args.limit,
+                               args.mode, constraints, args.timeout,
+                               args.budget)
+            if args.compare_expansions:
+                for mode in SearchMode:
+                    query = finder.query(source_tags, target_tags, mode,
+                                         constraints)
+                    for _ in query.paths(args.limit):
+                        pass
+                    print(f'{mode.value}: {query.expansions} nodes expanded, '
+                          f'{query.spur_searches} spur searches')
+        finally:
+            # the comparison uses the spur pool too
+            finder.close()
+    elif args.command == 'chain-batch':
+        landmarks = args.landmarks if args.mode == SearchMode.ASTAR else 0
+        finder = ChainFinder(db, landmarks=landmarks)
+        workers = args.workers or os.cpu_count() or 1
+        with args.queries:
+            failed = run_batch(finder, read_queries(args.queries, args.limit),
+                               sys.stdout, workers, args.mode)
+        if failed:
             return 1
-        assert not (target_item and target_cat)
-
+    elif args.command == 'distance':
+        source_item, source_cat = db.find_item_or_category(args.source)
         source = source_item or source_cat
-        assert source
-        target = target_item or target_cat
-        assert target
+        if not source:
+            print(f'{args.source} not found!')
+            return 1
+        target = None
+        if args.target:
+            target_item, target_cat = db.find_item_or_category(args.target)
+            target = target_item or target_cat
+            if not target:
+                print(f'{args.target} not found!')
+                return 1
 
-        print(f'Finding craft chain from {source.name} to {target.name}...')
         finder = ChainFinder(db)
-        finder.print_paths(source.tag, target.tag, args.limit)
+        oracle = load_oracle(finder, args.rebuild)
+        if target:
+            dist = oracle.distance(source.tag, target.tag)
+            if dist is None:
+                print(f'No chain from {source.name} to {target.name}')
+                return 1
+            print(f'{source.name} to {target.name}: {dist} steps')
+            path = oracle.node_path(finder.ids[source.tag],
+                                    finder.ids[target.tag])
+            print(finder.format_path(path))
+        else:
+            print(f'At most {args.within} steps from {source.name}:')
+            for dist, tag in oracle.within(source.tag, args.within):
+                thing = db.items.get(tag) or db.categories[tag]
+                print(f'  {dist}: {thing.name}')
+    elif args.command == 'serve':
+        serve(QueryService(db, args.cache_size), args.host, args.port,
+              args.socket)
+    elif args.command == 'category':
+        cat = db.find_category(args.category)
+        if not cat:
+            print(f'{args.category} not found!')
+            return 1
+        print(f'{cat.name} -- {cat.tag}')
+        members = [str(i) for i in db.items.values() if cat in i.categories]
+        members.extend(f'{i}*' for i in db.items.values()
+                       if cat in i.possible_categories)
+        if members:
+            print(f'  Items: {", ".join(members)}')
+        # an ingredient slot can be unlocked on the mixfield, so check the
+        # item's ingredients instead of the recipe's
+        recipes = [str(i) for i in db.items.values() if cat in i.ingredients]
+        if recipes:
+            print(f'  Used in: {", ".join(recipes)}')
+    elif args.command == 'search':
+        for match in db.search(args.query, limit=args.limit):
+            kind = type(match.obj).__name__.lower()
+            print(f'{match.rank.name.lower():11} {kind:8} '
+                  f'{match.obj.tag} -- {match.obj.name}')
     elif args.command == 'dump-effects':
         for eff in db.effects.values():
             # FIXME: dump some useful effect data?
@@ -102,7 +482,16 @@ def main():
         for cat in db.categories.values():
             print(f'{cat.tag} -- {cat.name}')
     elif args.command == 'dump-json':
-        db.dump(args.dump_file)
+        # other languages only re-read their names and descriptions
+        langs = db.available_languages() if args.all_langs else [db.lang]
+        for lang in langs:
+            path = args.dump_file.replace('{lang}', lang)
+            with db.language(lang):
+                if path == '-':
+                    db.dump(sys.stdout)
+                else:
+                    with open(path, 'w') as fp:
+                        db.dump(fp)
     elif args.command == 'dump-ts-types':
         create_typescript_interfaces()
     else:
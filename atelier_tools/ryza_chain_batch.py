@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+from typing import Iterable, Iterator, NamedTuple, Optional, TextIO, Union
+import json
+import multiprocessing
+import threading
+
+from .ryza_chain_finder import ChainFinder, NodePath, SearchMode
+
+# the finder of a worker process, see init_worker
+WORKER_FINDER: Optional[ChainFinder] = None
+
+
+class BatchQuery(NamedTuple):
+    # input line number, so results can be matched up
+    line: int
+    source: str
+    target: str
+    limit: int
+
+
+class BatchError(NamedTuple):
+    '''an input line that is not a query'''
+    line: int
+    error: str
+
+
+def read_queries(fp: TextIO,
+                 limit: int) -> Iterator[Union[BatchQuery, BatchError]]:
+    '''queries from tab separated `source, target[, limit]` lines
+
+    empty lines and lines starting with # are skipped, malformed ones come
+    as BatchErrors so the rest of the batch still runs'''
+    for line, text in enumerate(fp, 1):
+        text = text.strip()
+        if not text or text.startswith('#'):
+            continue
+        fields = [field.strip() for field in text.split('\t')]
+        if len(fields) not in (2, 3):
+            yield BatchError(
+                line, 'expected source, target and optionally a limit, '
+                'separated by tabs')
+            continue
+        query_limit = limit
+        if len(fields) == 3:
+            try:
+                query_limit = int(fields[2])
+            except ValueError:
+                yield BatchError(line, f'limit is not a number: {fields[2]}')
+                continue
+        yield BatchQuery(line, fields[0].lower(), fields[1].lower(),
+                         query_limit)
+
+
+def chain_record(finder: ChainFinder, path: NodePath) -> dict:
+    tags = [finder.tags[node] for node in path]
+    names = []
+    for tag in tags:
+        thing = finder.db.items.get(tag) or finder.db.categories[tag]
+        names.append(thing.name)
+    steps = [finder.connection(a, b) for a, b in zip(path, path[1:])]
+    return {
+        'cost': sum(step.cost for step in steps),
+        'tags': tags,
+        'names': names,
+        'connections': [step.description for step in steps],
+        'costs': [step.cost for step in steps],
+    }
+
+
+def run_query(finder: ChainFinder, query: BatchQuery, source: str,
+              target: str, mode: SearchMode) -> str:
+    '''the JSON line of one query, `source` and `target` are tags'''
+    chains = [
+        chain_record(finder, path) for path in finder.query(
+            source, target, mode).paths(query.limit)
+    ]
+    return json.dumps({
+        'line': query.line,
+        'source': source,
+        'target': target,
+        'limit': query.limit,
+        'chains': chains,
+    })
+
+
+def init_worker(finder: ChainFinder) -> None:
+    global WORKER_FINDER
+    WORKER_FINDER = finder
+
+
+def run_worker_query(query: BatchQuery, source: str, target: str,
+                     mode: SearchMode) -> str:
+    assert WORKER_FINDER
+    return run_query(WORKER_FINDER, query, source, target, mode)
+
+
+def run_batch(finder: ChainFinder,
+              queries: Iterable[Union[BatchQuery, BatchError]],
+              out: TextIO,
+              jobs: int = 1,
+              mode: SearchMode = SearchMode.BREADTH_FIRST) -> int:
+    '''write the JSON line of each query to `out` as soon as it is done
+
+    the queries are spread over `jobs` processes, each with its own copy of
+    the finder: forked where possible, so it is neither pickled nor
+    rebuilt. Only a few queries per process are read ahead and results are
+    written by the pool as they finish, so piped input is answered while it
+    is still being written. Results come in the order they finish, their
+    `line` is that of the query. Malformed lines and queries that can not
+    be resolved or raise get an `error` line instead. Returns the number of
+    them'''
+    db = finder.db
+    # names repeat a lot in guides, only look each up once
+    resolved: dict[str, Optional[str]] = {}
+
+    def resolve(name: str) -> Optional[str]:
+        if name not in resolved:
+            item, cat = db.find_item_or_category(name)
+            thing = item or cat
+            resolved[name] = thing.tag if thing else None
+        return resolved[name]
+
+    # results are written from the pool's thread
+    lock = threading.Lock()
+
+    def write(line: str) -> None:
+        with lock:
+            out.write(line + '\n')
+            out.flush()
+
+    failed = 0
+
+    def fail(query: Union[BatchQuery, BatchError], error: str) -> None:
+        nonlocal failed
+        write(json.dumps({'line': query.line, 'error': error}))
+        with lock:
+            failed += 1
+
+    executor: Optional[Executor] = None
+    if jobs > 1:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            'fork' if 'fork' in methods else None)
+        executor = ProcessPoolExecutor(jobs,
+                                       mp_context=context,
+                                       initializer=init_worker,
+                                       initargs=(finder, ))
+    # queries in flight, enough to keep every process busy
+    window = 2 * jobs
+    slots = threading.BoundedSemaphore(window)
+
+    def finish(query: BatchQuery, future: Future) -> None:
+        try:
+            if not future.cancelled():
+                write(future.result())
+        except Exception as e:
+            fail(query, f'{type(e).__name__}: {e}')
+        finally:
+            slots.release()
+
+    try:
+        for query in queries:
+            if isinstance(query, BatchError):
+                fail(query, query.error)
+                continue
+            source, target = resolve(query.source), resolve(query.target)
+            if not (source and target):
+                missing = query.source if not source else query.target
+                fail(query, f'{missing} not found')
+                continue
+            if executor:
+                slots.acquire()
+                future = executor.submit(run_worker_query, query, source,
+                                         target, mode)
+                future.add_done_callback(partial(finish, query))
+                continue
+            try:
+                write(run_query(finder, query, source, target, mode))
+            except Exception as e:
+                fail(query, f'{type(e).__name__}: {e}')
+        # every slot is free once the last result is written
+        for _ in range(window):
+            slots.acquire()
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return failed
@@ -1,10 +1,25 @@
 #!/usr/bin/env python3
 
-from collections import defaultdict
-from typing import Generator, NamedTuple
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from itertools import count, islice, repeat
+from pathlib import Path as FilePath
+from threading import Lock
+from typing import (AsyncIterator, Generator, Iterable, Iterator, NamedTuple,
+                    Optional, Union)
+import asyncio
+import hashlib
 import heapq
+import multiprocessing
+import shelve
+import time
 
-from .ryza_parser import Database, Category
+from .ryza_parser import Database, Category, Element
 
 
 class ConnectionType(NamedTuple):
@@ -25,25 +40,376 @@ class Connection:
 
 
 Path = tuple[str, ...]
+# the same as Path, with node ids instead of tags
+NodePath = tuple[int, ...]
+
+# one tag, or any number of them
+Tags = Union[str, Iterable[str]]
+
+INF = float('inf')
+# landmark distances of nodes a landmark does not connect to, and of the
+# ones too far away to count
+UNREACHED = 255
+FAR = UNREACHED - 1
+
+
+class SearchMode(Enum):
+    '''how ChainQuery finds each shortest path'''
+    # see ChainQuery._find_path_bfs and the others
+    BREADTH_FIRST = 'bfs'
+    BIDIRECTIONAL = 'bidirectional'
+    ASTAR = 'astar'
+
+
+class Chain(NamedTuple):
+    '''a chain found by ChainQuery, and the start and target it links'''
+    start: str
+    target: str
+    path: NodePath
+    cost: int
+
+
+class SearchCutShort(Exception):
+    '''a ChainQuery search ran out of time or nodes, see
+    ChainQuery.limit_search'''
+
+
+class ChainConstraints(NamedTuple):
+    '''what the chains of a search must not use'''
+    # item and category tags
+    excluded: frozenset[str] = frozenset()
+    # items above this level
+    max_level: Optional[int] = None
+    no_dlc: bool = False
+    no_ev_links: bool = False
+    no_morphs: bool = False
+    # every item of a chain must be able to have all of these effect tags,
+    # elements and category tags, see CarryBits
+    carry_effects: frozenset[str] = frozenset()
+    carry_elements: frozenset[Element] = frozenset()
+    carry_categories: frozenset[str] = frozenset()
+
+
+NO_CONSTRAINTS = ChainConstraints()
+
+
+class ChainMasks(NamedTuple):
+    '''ChainConstraints as flags by node id and connection kind id, 1 for
+    the ones a search must not use'''
+    nodes: bytearray
+    kinds: bytearray
+
+    def allowing(self, nodes: Iterable[int]) -> ChainMasks:
+        '''the masks with `nodes` allowed again'''
+        nodes = [node for node in nodes if self.nodes[node]]
+        if not nodes:
+            return self
+        allowed = bytearray(self.nodes)
+        for node in nodes:
+            allowed[node] = 0
+        return ChainMasks(allowed, self.kinds)
+
+
+ELEMENT_BITS = {elem: 1 << idx for idx, elem in enumerate(Element)}
+
+
+class CarryBits(NamedTuple):
+    '''what the item of each node id can have, as bitsets
+
+    effects are those of any effect level and of forging, elements and
+    categories also the ones added in synthesis. Category nodes have none'''
+    effects: list[int]
+    # see ELEMENT_BITS
+    elements: list[int]
+    # bit i is the i-th category of the database
+    categories: list[int]
+    effect_bits: dict[str, int]
+    category_bits: dict[str, int]
+
+    @classmethod
+    def build(cls, finder: ChainFinder) -> CarryBits:
+        db = finder.db
+        effect_bits = {
+            tag: 1 << idx
+            for idx, tag in enumerate(sorted(db.effects))
+        }
+        category_bits = {
+            tag: 1 << idx
+            for idx, tag in enumerate(db.categories)
+        }
+        effects, elements, categories = [], [], []
+        for tag in finder.tags:
+            item = db.items.get(tag)
+            effect_set = element_set = category_set = 0
+            if item:
+                for levels in item.effects:
+                    for spec in levels.values():
+                        effect_set |= effect_bits[spec.effect.tag]
+                for forge_effects in item.forge_effects:
+                    for forge_effect in forge_effects:
+                        effect_set |= effect_bits[
+                            forge_effect.forged_effect.tag]
+                for elem in [*item.elements, *item.possible_elements]:
+                    element_set |= ELEMENT_BITS[elem]
+                for cat in [*item.categories, *item.possible_categories]:
+                    category_set |= category_bits[cat.tag]
+            effects.append(effect_set)
+            elements.append(element_set)
+            categories.append(category_set)
+        return cls(effects, elements, categories, effect_bits, category_bits)
+
+    def required(self,
+                 constraints: ChainConstraints) -> list[tuple[list[int], int]]:
+        '''(bitsets, bits) pairs for the carry constraints, an item is
+        allowed if it has all the bits of each pair'''
+        required = [
+            (self.effects,
+             sum(self.effect_bits[tag] for tag in constraints.carry_effects)),
+            (self.elements,
+             sum(ELEMENT_BITS[elem] for elem in constraints.carry_elements)),
+            (self.categories,
+             sum(self.category_bits[tag]
+                 for tag in constraints.carry_categories)),
+        ]
+        return [(bits, need) for bits, need in required if need]
+
+
+# the starts, the targets, the search mode and the constraints
+ResultKey = tuple[NodePath, NodePath, SearchMode, ChainConstraints]
+
+
+class ChainResults:
+    '''the chains of one query found so far, and the search for more
+
+    the Yen search is a generator suspended after the last chain it found,
+    so asking for more chains carries on where it stopped'''
+    paths: list[NodePath]
+    # None once every chain is found
+    search: Optional[Iterator[NodePath]]
+    lock: Lock
+
+    def __init__(self, query: ChainQuery, paths: Iterable[NodePath] = ()):
+        self.paths = list(paths)
+        # chains from a ChainStore are found again before the new ones,
+        # the search is the same so they come in the same order
+        self.search = islice(query.paths(None), len(self.paths), None)
+        self.lock = Lock()
+
+    def get(self, limit: int) -> tuple[list[NodePath], bool]:
+        '''the first `limit` chains, and whether any were new'''
+        # one search at a time, generators can not run on two threads
+        with self.lock:
+            found = len(self.paths)
+            while len(self.paths) < limit and self.search:
+                path = next(self.search, None)
+                if path is None:
+                    self.search = None
+                else:
+                    self.paths.append(path)
+            return self.paths[:limit], len(self.paths) > found
+
+
+class ChainStore:
+    '''chains found on earlier runs, in a shelve file of one graph
+
+    entries are the chain tags of a query and whether that is all of
+    them, see ChainFinder.store_key'''
+    graph_hash: str
+    shelf: shelve.Shelf
+    lock: Lock
+
+    def __init__(self, directory: FilePath, graph_hash: str):
+        directory.mkdir(parents=True, exist_ok=True)
+        # chains of older graphs are never valid again
+        for old in directory.glob('chains-*'):
+            if not old.name.startswith(f'chains-{graph_hash}'):
+                old.unlink()
+        self.graph_hash = graph_hash
+        self.shelf = shelve.open(str(directory / f'chains-{graph_hash}'))
+        self.lock = Lock()
+
+    def get(self, key: str) -> Optional[tuple[list[Path], bool]]:
+        with self.lock:
+            return self.shelf.get(key)
+
+    def put(self, key: str, paths: list[Path], complete: bool) -> None:
+        with self.lock:
+            self.shelf[key] = (paths, complete)
+
+    def close(self) -> None:
+        with self.lock:
+            self.shelf.close()
+
+
+def step_distances(offsets: array, heads: array, costs: array,
+                   source: int) -> array:
+    '''0-1 breadth first search over CSR arrays, the steps from `source`
+    to every node, capped at FAR and UNREACHED for nodes it does not reach'''
+    dists = array('B', [UNREACHED]) * (len(offsets) - 1)
+    dists[source] = 0
+    queue = deque([source])
+    while queue:
+        a = queue.popleft()
+        dist = dists[a]
+        for edge in range(offsets[a], offsets[a + 1]):
+            b = heads[edge]
+            new = min(dist + costs[edge], FAR)
+            if new < dists[b]:
+                dists[b] = new
+                if costs[edge]:
+                    queue.append(b)
+                else:
+                    queue.appendleft(b)
+    return dists
+
+
+class Landmarks:
+    '''ALT lower bounds on the chain length between two nodes, for A*
+
+    these are the steps from a few landmark nodes to every node and back,
+    over the whole graph: any category is a node, and chains do not end at
+    the target. Queries only ever take steps away from that, so by the
+    triangle inequality d(L, t) - d(L, v) and d(v, L) - d(t, L) never
+    overestimate the steps from v to t'''
+    nodes: list[int]
+    # steps from each landmark to every node, and from every node to it
+    dists_from: list[array]
+    dists_to: list[array]
+
+    def __init__(self, nodes: list[int], dists_from: list[array],
+                 dists_to: list[array]):
+        self.nodes = nodes
+        self.dists_from = dists_from
+        self.dists_to = dists_to
+
+    @classmethod
+    def build(cls, finder: ChainFinder, count: int) -> Landmarks:
+        '''pick `count` landmarks far apart from each other'''
+        forward = (finder.offsets, finder.targets, finder.costs)
+        backward = (finder.rev_offsets, finder.sources, finder.rev_costs)
+        n = len(finder.tags)
+        # start far away from the node with the most edges
+        busiest = max(range(n),
+                      key=lambda node: finder.offsets[node + 1] - finder.
+                      offsets[node])
+        seed = step_distances(*forward, busiest)
+        spread = [dist if dist != UNREACHED else 0 for dist in seed]
+        nodes: list[int] = []
+        dists_from = []
+        dists_to = []
+        for _ in range(min(count, n)):
+            # the first node of the largest spread
+            node = max(range(n), key=lambda node: (spread[node], -node))
+            if node in nodes:
+                break
+            nodes.append(node)
+            dists_from.append(step_distances(*forward, node))
+            dists_to.append(step_distances(*backward, node))
+            # distance to the closest landmark, both ways
+            for other in range(n):
+                dist = sum(
+                    dists[other] for dists in (dists_from[-1], dists_to[-1])
+                    if dists[other] != UNREACHED)
+                spread[other] = dist if len(nodes) == 1 else min(
+                    spread[other], dist)
+        return cls(nodes, dists_from, dists_to)
+
+    def bound(self, node: int, targets: Iterable[int]) -> float:
+        '''a lower bound on the steps from `node` to the closest target,
+        INF if it can not reach any'''
+        best = INF
+        for target in targets:
+            bound: float = 0
+            for dists_from, dists_to in zip(self.dists_from, self.dists_to):
+                from_node, from_target = dists_from[node], dists_from[target]
+                if from_node != UNREACHED:
+                    # the landmark reaches the node, but not the target
+                    if from_target == UNREACHED:
+                        bound = INF
+                        break
+                    if from_node != FAR:
+                        bound = max(bound, from_target - from_node)
+                to_node, to_target = dists_to[node], dists_to[target]
+                if to_target != UNREACHED:
+                    # the target reaches the landmark, but not the node
+                    if to_node == UNREACHED:
+                        bound = INF
+                        break
+                    if to_target != FAR:
+                        bound = max(bound, to_node - to_target)
+            best = min(best, bound)
+            if not best:
+                break
+        return best
 
 
 class ChainFinder:
+    '''shortest craft chains between items and categories
+
+    the graph is compiled to integer node ids, in sorted tag order so ties
+    are broken the same way as when comparing tags, and CSR adjacency
+    arrays: the edges of node `a` are `offsets[a]:offsets[a + 1]` in
+    `targets`, `costs` and `kinds`
+
+    categories are hub nodes: items have edges to their categories, and
+    categories to the recipes using them. A search never stops at a hub,
+    an item having a category is connected to every recipe using it with
+    one (ingredient) step. The only exceptions are the start and the
+    target, categories can be both'''
     db: Database
-    # connection cache, normally Item -> Item connections
-    connections: dict[str, dict[str, ConnectionType]]
-    # Category -> Item connections
-    to_category: dict[str, dict[str, ConnectionType]]
-    # Item -> Category connections
-    from_category: dict[str, dict[str, ConnectionType]]
-
-    def __init__(self, db: Database):
+    # node id -> tag, and back
+    tags: list[str]
+    ids: dict[str, int]
+    is_category: bytearray
+    offsets: array
+    targets: array
+    costs: array
+    # index into connection_kinds
+    kinds: array
+    # every distinct ConnectionType used by an edge
+    connection_kinds: list[ConnectionType]
+    # position of each category node in db.categories, -1 for items
+    category_order: array
+    # the same edges in reverse: the edges into node `b` are
+    # `rev_offsets[b]:rev_offsets[b + 1]` in `sources` and `rev_costs`
+    rev_offsets: array
+    sources: array
+    rev_costs: array
+    rev_kinds: array
+    # identifies the compiled graph, see ChainStore
+    graph_hash: str
+    # the most recently used query results, see find_paths
+    cache_size: int
+    store: Optional[ChainStore]
+    # for SearchMode.ASTAR
+    landmark_count: int
+    landmarks: Optional[Landmarks]
+    # runs the spur searches of Yen's algorithm, see start_spur_pool
+    spur_pool: Optional[SpurPool]
+
+    def __init__(self,
+                 db: Database,
+                 cache_size: int = 64,
+                 store_dir: Optional[FilePath] = None,
+                 landmarks: int = 0):
+        '''`cache_size` query results are kept in memory, and with a
+        `store_dir` every result is also saved there for later runs.
+        A* searches need a few `landmarks`, 8 or so'''
         self.db = db
+        self.cache_size = cache_size
+        self.landmark_count = landmarks
+        self._results_lock = Lock()
+        self._results: OrderedDict[ResultKey, ChainResults] = OrderedDict()
+        self._masks: dict[ChainConstraints, ChainMasks] = {}
+        self._carry_bits: Optional[CarryBits] = None
         # not a defaultdict, so we can keep track of all item tags with it
-        cons = self.connections = {}
+        cons: dict[str, dict[str, ConnectionType]] = {}
         # NOTE: this is basically reversed compared to cons:
         # to_cat[A][B] means a connection B (item) -> A (category)
-        to_cat = self.to_category = defaultdict(dict)
-        from_cat = self.from_category = defaultdict(dict)
+        to_cat: dict[str, dict[str,
+                               ConnectionType]] = defaultdict(dict)
+        from_cat: dict[str, dict[str,
+                                 ConnectionType]] = defaultdict(dict)
 
         # build the cache
         def add_con(cons, a: str, b: str, con: ConnectionType):
@@ -67,131 +433,1044 @@ class ChainFinder:
                     add_con(from_cat, ing.tag, tag, Connection.CAT_INGREDIENT)
                 else:
                     add_con(cons, ing.tag, tag, Connection.INGREDIENT)
-        for tag, cat in db.categories.items():
-            to_items = list(from_cat[tag].keys())
-            from_items = list(to_cat[tag].keys())
-            for a in from_items:
-                for b in to_items:
-                    con = Connection.CAT_INGREDIENT._replace(
-                        description=cat.name)
-                    add_con(cons, a, b, con)
-
-    def _find_path_dijkstra(self, start: str,
-                            target: str) -> tuple[float, Path]:
-        dists: dict[str, float] = defaultdict(lambda: float('inf'))
+
+        # category hubs: their recipes going out, and the items having
+        # them coming in
+        for tag in db.categories:
+            cons[tag] = from_cat[tag]
+        for cat_tag, items in to_cat.items():
+            for tag, con in items.items():
+                cons[tag][cat_tag] = con
+        self.compile(cons)
+        self.spur_pool = None
+        self.store = None
+        if store_dir:
+            self.store = ChainStore(store_dir, self.graph_hash)
+
+    def compile(self, cons: dict[str, dict[str, ConnectionType]]) -> None:
+        '''build the CSR arrays from a tag -> tag -> connection mapping'''
+        self.tags = sorted(cons)
+        self.ids = {tag: idx for idx, tag in enumerate(self.tags)}
+        self.is_category = bytearray(tag in self.db.categories
+                                     for tag in self.tags)
+        positions = {tag: idx for idx, tag in enumerate(self.db.categories)}
+        self.category_order = array('l',
+                                    (positions.get(tag, -1)
+                                     for tag in self.tags))
+        self.connection_kinds = []
+        kind_ids: dict[ConnectionType, int] = {}
+        self.offsets = array('l', [0])
+        self.targets = array('l')
+        self.costs = array('B')
+        self.kinds = array('H')
+        for tag in self.tags:
+            # sorted, so connection() can bisect
+            edges = sorted((self.ids[b], con) for b, con in cons[tag].items())
+            for b, con in edges:
+                if con not in kind_ids:
+                    kind_ids[con] = len(self.connection_kinds)
+                    self.connection_kinds.append(con)
+                self.targets.append(b)
+                self.costs.append(con.cost)
+                self.kinds.append(kind_ids[con])
+            self.offsets.append(len(self.targets))
+        self.compile_reverse()
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update('\n'.join(self.tags).encode())
+        digest.update(repr(self.connection_kinds).encode())
+        for values in (self.offsets, self.targets, self.costs, self.kinds):
+            digest.update(values.tobytes())
+        self.graph_hash = digest.hexdigest()
+        # results of the old graph
+        self.clear_cache()
+        self._masks = {}
+        self._carry_bits = None
+        self.landmarks = None
+        if self.landmark_count:
+            self.landmarks = Landmarks.build(self, self.landmark_count)
+
+    def compile_reverse(self) -> None:
+        '''build the reverse CSR arrays, sources sorted like targets'''
+        n = len(self.tags)
+        counts = [0] * (n + 1)
+        for b in self.targets:
+            counts[b + 1] += 1
+        for b in range(n):
+            counts[b + 1] += counts[b]
+        self.rev_offsets = array('l', counts)
+        self.sources = array('l', [0]) * len(self.targets)
+        self.rev_costs = array('B', [0]) * len(self.targets)
+        self.rev_kinds = array('H', [0]) * len(self.targets)
+        fill = counts[:n]
+        for a in range(n):
+            for edge in range(self.offsets[a], self.offsets[a + 1]):
+                b = self.targets[edge]
+                self.sources[fill[b]] = a
+                self.rev_costs[fill[b]] = self.costs[edge]
+                self.rev_kinds[fill[b]] = self.kinds[edge]
+                fill[b] += 1
+
+    def masks(self, constraints: ChainConstraints) -> ChainMasks:
+        if constraints in self._masks:
+            return self._masks[constraints]
+        required = []
+        if (constraints.carry_effects or constraints.carry_elements
+                or constraints.carry_categories):
+            required = self.carry_bits().required(constraints)
+        nodes = bytearray(len(self.tags))
+        for node, tag in enumerate(self.tags):
+            item = self.db.items.get(tag)
+            if tag in constraints.excluded:
+                nodes[node] = 1
+            elif item is None:
+                continue
+            elif (constraints.max_level is not None
+                  and item.level > constraints.max_level):
+                nodes[node] = 1
+            elif constraints.no_dlc and self.db.is_dlc(item):
+                nodes[node] = 1
+            elif any(bits[node] & need != need for bits, need in required):
+                nodes[node] = 1
+        excluded_kinds = set()
+        if constraints.no_ev_links:
+            excluded_kinds.add(Connection.EV_LINK)
+        if constraints.no_morphs:
+            excluded_kinds.add(Connection.MORPH)
+        kinds = bytearray(kind in excluded_kinds
+                          for kind in self.connection_kinds)
+        masks = ChainMasks(nodes, kinds)
+        self._masks[constraints] = masks
+        return masks
+
+    def carry_bits(self) -> CarryBits:
+        '''built on first use, it needs every item's effects'''
+        if self._carry_bits is None:
+            self._carry_bits = CarryBits.build(self)
+        return self._carry_bits
+
+    def find_edge(self, a: int, b: int) -> int:
+        '''index of the a -> b edge, -1 if there is none'''
+        lo, hi = self.offsets[a], self.offsets[a + 1]
+        edge = bisect_left(self.targets, b, lo, hi)
+        if edge == hi or self.targets[edge] != b:
+            return -1
+        return edge
+
+    def connection(self,
+                   a: int,
+                   b: int,
+                   masks: Optional[ChainMasks] = None) -> ConnectionType:
+        '''the best connection type of a search step from a to b
+
+        like the edges, steps through a category hub are ranked by
+        ConnectionType.sort and named after the first such category. With
+        `masks`, only edges and hubs a search with them could use count'''
+        edge = self.find_edge(a, b)
+        best = None
+        if edge >= 0 and not (masks and masks.kinds[self.kinds[edge]]):
+            best = self.connection_kinds[self.kinds[edge]]
+        hub = -1
+        if not self.is_category[b]:
+            for edge in range(self.offsets[a], self.offsets[a + 1]):
+                cat = self.targets[edge]
+                if not self.is_category[cat] or self.find_edge(cat, b) < 0:
+                    continue
+                if masks and masks.nodes[cat]:
+                    continue
+                if hub < 0 or (self.category_order[cat] <
+                               self.category_order[hub]):
+                    hub = cat
+        if hub >= 0 and (best is None
+                         or best.sort > Connection.CAT_INGREDIENT.sort):
+            name = self.db.categories[self.tags[hub]].name
+            best = Connection.CAT_INGREDIENT._replace(description=name)
+        if best is None:
+            if masks:
+                # a hub that is also a start or target of the search
+                return self.connection(a, b)
+            raise KeyError((self.tags[a], self.tags[b]))
+        return best
+
+    def path_cost(self,
+                  path: NodePath,
+                  masks: Optional[ChainMasks] = None) -> int:
+        return sum(
+            self.connection(a, b, masks).cost for a, b in zip(path, path[1:]))
+
+    def node_ids(self, tags: Tags) -> list[int]:
+        if isinstance(tags, str):
+            tags = [tags]
+        return [self.ids[tag] for tag in tags]
+
+    def query(self,
+              starts: Tags,
+              targets: Tags,
+              mode: SearchMode = SearchMode.BREADTH_FIRST,
+              constraints: ChainConstraints = NO_CONSTRAINTS) -> ChainQuery:
+        '''chains from any of `starts` to any of `targets`'''
+        return ChainQuery(self, self.node_ids(starts), self.node_ids(targets),
+                          mode, constraints)
+
+    def start_spur_pool(self, jobs: int) -> None:
+        '''run the spur searches of each Yen iteration on `jobs` processes
+
+        the chains found stay the same, only the searches are spread out.
+        Start the pool after the last compile, the workers have copies of
+        the graph as it is now'''
+        if self.spur_pool:
+            self.spur_pool.close()
+        self.spur_pool = SpurPool(self, jobs) if jobs > 1 else None
+
+    def close(self) -> None:
+        if self.store:
+            self.store.close()
+            self.store = None
+        if self.spur_pool:
+            self.spur_pool.close()
+            self.spur_pool = None
+
+    def __getstate__(self) -> dict:
+        # locks, open files and worker pools stay in their process
+        state = self.__dict__.copy()
+        for name in ('_results_lock', '_results', 'store', 'spur_pool'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._results_lock = Lock()
+        self._results = OrderedDict()
+        self.store = None
+        self.spur_pool = None
+
+    def clear_cache(self) -> None:
+        with self._results_lock:
+            self._results.clear()
+
+    def store_key(self, key: ResultKey) -> str:
+        starts, targets, mode, constraints = key
+        # sets have no stable order, sort them
+        fields = (sorted(constraints.excluded), constraints.max_level,
+                  constraints.no_dlc, constraints.no_ev_links,
+                  constraints.no_morphs, sorted(constraints.carry_effects),
+                  sorted(elem.value for elem in constraints.carry_elements),
+                  sorted(constraints.carry_categories))
+        return ' '.join([
+            ','.join(self.tags[node] for node in starts), '->',
+            ','.join(self.tags[node] for node in targets), mode.value,
+            repr(fields)
+        ])
+
+    def find_paths(
+            self,
+            starts: Tags,
+            targets: Tags,
+            limit: int = 10,
+            mode: SearchMode = SearchMode.BREADTH_FIRST,
+            constraints: ChainConstraints = NO_CONSTRAINTS) -> list[Chain]:
+        '''the `limit` cheapest chains from any of `starts` to any of
+        `targets`
+
+        results are cached, so repeating a query is free, and asking for
+        more chains than before only searches for the missing ones'''
+        query = self.query(starts, targets, mode, constraints)
+        key: ResultKey = (query.starts, query.targets, mode, constraints)
+        store = self.store
+        if store and store.graph_hash != self.graph_hash:
+            store = None
+        stored = None
+        with self._results_lock:
+            results = self._results.get(key)
+            if results:
+                self._results.move_to_end(key)
+            else:
+                if store:
+                    stored = store.get(self.store_key(key))
+                paths: list[NodePath] = []
+                if stored:
+                    paths = [
+                        tuple(self.ids[tag] for tag in path)
+                        for path in stored[0]
+                    ]
+                results = ChainResults(query, paths)
+                if stored and stored[1]:
+                    results.search = None
+                self._results[key] = results
+                while len(self._results) > self.cache_size:
+                    self._results.popitem(last=False)
+
+        paths, new = results.get(limit)
+        if store and new:
+            store.put(self.store_key(key),
+                      [tuple(self.tags[node] for node in path)
+                       for path in results.paths], results.search is None)
+        return [
+            Chain(self.tags[path[0]], self.tags[path[-1]], path,
+                  self.path_cost(path, query.masks)) for path in paths
+        ]
+
+    def stream_paths(self,
+                     starts: Tags,
+                     targets: Tags,
+                     limit: Optional[int] = 10,
+                     mode: SearchMode = SearchMode.BREADTH_FIRST,
+                     constraints: ChainConstraints = NO_CONSTRAINTS,
+                     timeout: Optional[float] = None,
+                     budget: Optional[int] = None) -> ChainStream:
+        '''like find_paths, but each chain comes as soon as it is found and
+        the search can be cut short, see ChainStream. This bypasses the
+        result cache'''
+        return ChainStream(self.query(starts, targets, mode, constraints),
+                           limit, timeout, budget)
+
+    def format_path(self,
+                    path: NodePath,
+                    masks: Optional[ChainMasks] = None) -> str:
+        parts = []
+        prev = None
+        for node in path:
+            tag = self.tags[node]
+            thing = self.db.items.get(tag) or self.db.categories[tag]
+            if prev is not None:
+                desc = self.connection(prev, node, masks).description
+                parts[-1] += ' ' + desc
+            parts.append(thing.name)
+            prev = node
+        return ' -> '.join(parts)
+
+    def print_paths(self,
+                    starts: Tags,
+                    targets: Tags,
+                    limit: int = 10,
+                    mode: SearchMode = SearchMode.BREADTH_FIRST,
+                    constraints: ChainConstraints = NO_CONSTRAINTS,
+                    timeout: Optional[float] = None,
+                    budget: Optional[int] = None) -> None:
+        '''print the chains of find_paths, or with a `timeout` or `budget`
+        those of stream_paths, each as soon as it is found'''
+        masks = self.masks(constraints).allowing(
+            self.node_ids(starts) + self.node_ids(targets))
+        if timeout is None and budget is None:
+            for chain in self.find_paths(starts, targets, limit, mode,
+                                         constraints):
+                print(self.format_path(chain.path, masks))
+            return
+        stream = self.stream_paths(starts, targets, limit, mode, constraints,
+                                   timeout, budget)
+        for chain in stream:
+            print(self.format_path(chain.path, masks), flush=True)
+        if stream.cut_short:
+            print(f'Search cut short, chains found: {len(stream.chains)}')
+
+
+class ChainQuery:
+    '''one k shortest chains search on a ChainFinder
+
+    the finder's graph is only read. The search runs from a virtual source
+    node to a virtual sink node, added past the finder's node ids, and the
+    nodes and first hops Yen's algorithm removes only exist as masks of a
+    single spur search. So any number of queries, from threads or
+    interleaved generators, can share one ChainFinder
+
+    the source leads to every start and every target to the sink, so a
+    single run finds the best chains between all of them. A chain never
+    goes on past a target, its first and last node are the start and
+    target it links'''
+    finder: ChainFinder
+    # sorted node ids
+    starts: NodePath
+    targets: NodePath
+    start_set: frozenset[int]
+    target_set: frozenset[int]
+    # the virtual nodes: source -> starts, and targets -> sink
+    source: int
+    sink: int
+    mode: SearchMode
+    constraints: ChainConstraints
+    # the nodes and edges the constraints rule out, never the starts and
+    # targets themselves
+    masks: ChainMasks
+    # whether any connection kind is masked
+    filter_kinds: bool
+    # nodes settled by all searches so far
+    expansions: int
+    # spur searches run by Yen's algorithm so far
+    spur_searches: int
+    # see limit_search
+    deadline: Optional[float]
+    max_expansions: Optional[int]
+    cancelled: bool
+
+    def __init__(self,
+                 finder: ChainFinder,
+                 starts: Iterable[int],
+                 targets: Iterable[int],
+                 mode: SearchMode = SearchMode.BREADTH_FIRST,
+                 constraints: ChainConstraints = NO_CONSTRAINTS):
+        if mode == SearchMode.ASTAR and not finder.landmarks:
+            raise ValueError('A* needs a ChainFinder with landmarks')
+        self.finder = finder
+        self.start_set = frozenset(starts)
+        self.target_set = frozenset(targets)
+        self.starts = tuple(sorted(self.start_set))
+        self.targets = tuple(sorted(self.target_set))
+        self.mode = mode
+        self.constraints = constraints
+        self.masks = finder.masks(constraints).allowing(self.start_set
+                                                        | self.target_set)
+        self.filter_kinds = any(self.masks.kinds)
+        self.source = len(finder.tags)
+        self.sink = self.source + 1
+        self.expansions = 0
+        self.spur_searches = 0
+        self.deadline = None
+        self.max_expansions = None
+        self.cancelled = False
+        # expansions at which the searches next call _check_limits
+        self._check_at: float = INF
+        # see _sink_distances
+        self._sink_dists: Optional[list[float]] = None
+        # A* bounds of each node, -1 until needed
+        self._bounds = [-1.0] * (self.sink + 1)
+        self._bounds[self.source] = self._bounds[self.sink] = 0
+
+    def limit_search(self,
+                     deadline: Optional[float] = None,
+                     budget: Optional[int] = None) -> None:
+        '''make the searches raise SearchCutShort once time.monotonic()
+        passes `deadline`, or after expanding `budget` more nodes
+
+        a search cut short can not go on, and neither can a paths()
+        generator it ran for'''
+        self.deadline = deadline
+        self.max_expansions = None
+        if budget is not None:
+            self.max_expansions = self.expansions + budget
+        self._schedule_check()
+
+    def cancel(self) -> None:
+        '''cut the running search short, from any thread'''
+        self.cancelled = True
+        self._check_at = -1
+
+    def _schedule_check(self) -> None:
+        # the clock is only read every few expansions
+        check_at = INF
+        if self.deadline is not None:
+            check_at = self.expansions + 64
+        if self.max_expansions is not None:
+            check_at = min(check_at, self.max_expansions)
+        if self.cancelled:
+            check_at = -1
+        self._check_at = check_at
+
+    def _check_limits(self) -> None:
+        if self.cancelled:
+            raise SearchCutShort('cancelled')
+        if (self.max_expansions is not None
+                and self.expansions >= self.max_expansions):
+            raise SearchCutShort('out of nodes to expand')
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise SearchCutShort('out of time')
+        self._schedule_check()
+
+    def neighbours(self, a: int) -> Generator[tuple[int, int], None, None]:
+        '''(node, cost) pairs of the search steps from `a`'''
+        if a == self.source:
+            for start in self.starts:
+                yield start, 0
+            return
+        if a == self.sink:
+            return
+        if a in self.target_set:
+            # the chain ends here, even if it could go on
+            yield self.sink, 0
+            return
+        finder = self.finder
+        offsets, heads, costs = finder.offsets, finder.targets, finder.costs
+        kinds, is_category = finder.kinds, finder.is_category
+        # masked items are marked visited by the searches, only hubs and
+        # edges are masked here
+        masked, masked_kinds = self.masks
+        filter_kinds = self.filter_kinds
+        for edge in range(offsets[a], offsets[a + 1]):
+            if filter_kinds and masked_kinds[kinds[edge]]:
+                continue
+            b = heads[edge]
+            if not is_category[b]:
+                yield b, costs[edge]
+                continue
+            # only stop at a category if it is a target, otherwise step
+            # right through it
+            if b in self.target_set:
+                yield b, costs[edge]
+            if masked[b]:
+                continue
+            for hub_edge in range(offsets[b], offsets[b + 1]):
+                if filter_kinds and masked_kinds[kinds[hub_edge]]:
+                    continue
+                yield heads[hub_edge], costs[edge] + costs[hub_edge]
+
+    def reverse_neighbours(
+            self, b: int) -> Generator[tuple[int, int], None, None]:
+        '''(node, cost) pairs of the search steps into `b`, the same
+        steps neighbours() yields, from the reverse edges'''
+        if b == self.sink:
+            for target in self.targets:
+                yield target, 0
+            return
+        if b == self.source:
+            return
+        if b in self.start_set:
+            yield self.source, 0
+        finder = self.finder
+        rev_offsets, sources = finder.rev_offsets, finder.sources
+        rev_costs, rev_kinds = finder.rev_costs, finder.rev_kinds
+        is_category = finder.is_category
+        masked, masked_kinds = self.masks
+        filter_kinds = self.filter_kinds
+        if is_category[b]:
+            # only target categories are ever stepped into
+            if b in self.target_set:
+                for edge in range(rev_offsets[b], rev_offsets[b + 1]):
+                    if filter_kinds and masked_kinds[rev_kinds[edge]]:
+                        continue
+                    yield sources[edge], rev_costs[edge]
+            return
+        for edge in range(rev_offsets[b], rev_offsets[b + 1]):
+            if filter_kinds and masked_kinds[rev_kinds[edge]]:
+                continue
+            a = sources[edge]
+            # targets only go on to the sink, but are still hubs
+            if a not in self.target_set:
+                yield a, rev_costs[edge]
+            if not is_category[a] or masked[a]:
+                continue
+            for hub_edge in range(rev_offsets[a], rev_offsets[a + 1]):
+                if filter_kinds and masked_kinds[rev_kinds[hub_edge]]:
+                    continue
+                member = sources[hub_edge]
+                if member not in self.target_set:
+                    yield member, rev_costs[hub_edge] + rev_costs[edge]
+
+    def _find_path(self,
+                   start: int,
+                   blocked: Iterable[int] = (),
+                   skip_first: Iterable[int] = ()) -> tuple[float, NodePath]:
+        '''cheapest path from `start` to the sink
+
+        `blocked` nodes are never entered, and the `skip_first` nodes are
+        not entered straight from `start`'''
+        if self.mode == SearchMode.BIDIRECTIONAL:
+            return self._find_path_bidirectional(start, blocked, skip_first)
+        if self.mode == SearchMode.ASTAR:
+            return self._find_path_astar(start, blocked, skip_first)
+        return self._find_path_bfs(start, blocked, skip_first)
+
+    def _find_path_bfs(
+            self,
+            start: int,
+            blocked: Iterable[int] = (),
+            skip_first: Iterable[int] = ()) -> tuple[float, NodePath]:
+        '''0-1 breadth first search for _find_path
+
+        every step costs 0 or 1, so nodes are taken a cost level at a time
+        instead of from a heap of (cost, node) pairs: free steps stay on the
+        current level, the others go to the next one. A level is taken in
+        node id order, like Dijkstra's heap pops, so ties are broken the
+        same way'''
+        n = self.sink + 1
+        dists = [INF] * n
+        preds = array('l', [-1]) * n
+        # the virtual nodes are never masked
+        visited = self.masks.nodes + bytearray(2)
+        for node in blocked:
+            visited[node] = 1
         dists[start] = 0
-        queue = [(0, start, tuple())]
-        visited: set[str] = set()
+        skipped = set(skip_first)
+        sink = self.sink
+        level = [start]
+        cost = 0
+
+        while level:
+            next_level = []
+            while level:
+                a = heapq.heappop(level)
+                if visited[a]:
+                    continue
+                visited[a] = 1
+                self.expansions += 1
+                if self.expansions >= self._check_at:
+                    self._check_limits()
+                for b, step in self.neighbours(a):
+                    if visited[b]:
+                        continue
+                    if a == start and b in skipped:
+                        continue
+                    new = cost + step
+                    if new >= dists[b]:
+                        continue
+                    dists[b] = new
+                    preds[b] = a
+                    if b == sink:
+                        # only free steps lead to the sink, nothing later
+                        # can reach it cheaper
+                        return (new, self._trace(preds, start, sink))
+                    if step:
+                        next_level.append(b)
+                    else:
+                        heapq.heappush(level, b)
+            next_level.sort()
+            level = next_level
+            cost += 1
+        return (INF, tuple())
+
+    def _find_path_bidirectional(
+            self,
+            start: int,
+            blocked: Iterable[int] = (),
+            skip_first: Iterable[int] = ()) -> tuple[float, NodePath]:
+        '''bidirectional 0-1 breadth first search for _find_path
+
+        a second search goes back from the sink over the reverse edges,
+        each round a whole level of the side with fewer nodes waiting, and
+        both stop once no meeting can beat the best one so far. This visits
+        far fewer nodes on long chains, but ties can meet on another chain
+        of the same cost than _find_path_bfs finds'''
+        n = self.sink + 1
+        skipped = set(skip_first)
+        dists = ([INF] * n, [INF] * n)
+        # predecessors going forward, successors going back
+        links = (array('l', [-1]) * n, array('l', [-1]) * n)
+        visited = (self.masks.nodes + bytearray(2),
+                   self.masks.nodes + bytearray(2))
+        for node in blocked:
+            visited[0][node] = visited[1][node] = 1
+        dists[0][start] = 0
+        dists[1][self.sink] = 0
+        levels = [[start], [self.sink]]
+        costs = [0, 0]
+        best = INF
+        # the last forward node and first backward node of the best chain
+        meet = (-1, -1)
+
+        while levels[0] and levels[1] and best > costs[0] + costs[1]:
+            side = 0 if len(levels[0]) <= len(levels[1]) else 1
+            dist, link, done = dists[side], links[side], visited[side]
+            other = dists[1 - side]
+            steps = self.neighbours if side == 0 else self.reverse_neighbours
+            level = levels[side]
+            next_level = []
+            cost = costs[side]
+            while level:
+                a = heapq.heappop(level)
+                if done[a]:
+                    continue
+                done[a] = 1
+                self.expansions += 1
+                if self.expansions >= self._check_at:
+                    self._check_limits()
+                for b, step in steps(a):
+                    if done[b]:
+                        continue
+                    first, second = (a, b) if side == 0 else (b, a)
+                    if first == start and second in skipped:
+                        continue
+                    new = cost + step
+                    if new + other[b] < best:
+                        best = new + other[b]
+                        meet = (first, second)
+                    if new >= dist[b]:
+                        continue
+                    dist[b] = new
+                    link[b] = a
+                    if step:
+                        next_level.append(b)
+                    else:
+                        heapq.heappush(level, b)
+            next_level.sort()
+            levels[side] = next_level
+            costs[side] = cost + 1
+
+        if best == INF:
+            return (INF, tuple())
+        forward, backward = meet
+        path = list(self._trace(links[0], start, forward))
+        while True:
+            path.append(backward)
+            if backward == self.sink:
+                break
+            backward = links[1][backward]
+        return (best, tuple(path))
+
+    def bound(self, node: int) -> float:
+        '''lower bound on the cost from `node` to the sink'''
+        bound = self._bounds[node]
+        if bound < 0:
+            assert self.finder.landmarks
+            bound = self.finder.landmarks.bound(node, self.targets)
+            self._bounds[node] = bound
+        return bound
+
+    def _find_path_astar(
+            self,
+            start: int,
+            blocked: Iterable[int] = (),
+            skip_first: Iterable[int] = ()) -> tuple[float, NodePath]:
+        '''A* for _find_path, with the finder's landmark bounds
+
+        the bounds are consistent, so like Dijkstra every node is settled
+        once, but only nodes that can still be on a shortest chain are. Ties
+        may resolve to another chain of the same cost'''
+        n = self.sink + 1
+        dists = [INF] * n
+        preds = array('l', [-1]) * n
+        visited = self.masks.nodes + bytearray(2)
+        for node in blocked:
+            visited[node] = 1
+        dists[start] = 0
+        skipped = set(skip_first)
+        queue = [(self.bound(start), start)]
 
         while queue:
-            cost, a, path = heapq.heappop(queue)
-            if a in visited:
+            _, a = heapq.heappop(queue)
+            if visited[a]:
                 continue
-            visited.add(a)
-            path = path + (a, )
-            if a == target:
-                return (cost, path)
+            visited[a] = 1
+            self.expansions += 1
+            if self.expansions >= self._check_at:
+                self._check_limits()
+            cost = dists[a]
+            if a == self.sink:
+                return (cost, self._trace(preds, start, a))
+            for b, step in self.neighbours(a):
+                if visited[b]:
+                    continue
+                if a == start and b in skipped:
+                    continue
+                new = cost + step
+                if new >= dists[b]:
+                    continue
+                bound = self.bound(b)
+                if bound == INF:
+                    # no target in reach
+                    visited[b] = 1
+                    continue
+                dists[b] = new
+                preds[b] = a
+                heapq.heappush(queue, (new + bound, b))
+        return (INF, tuple())
 
-            for b, con in self.connections[a].items():
-                if b in visited:
+    @staticmethod
+    def _trace(preds: array, start: int, end: int) -> NodePath:
+        path = [end]
+        while end != start:
+            end = preds[end]
+            path.append(end)
+        return tuple(reversed(path))
+
+    def _sink_distances(self) -> list[float]:
+        '''the cost from every node to the sink, with nothing blocked
+
+        one backward 0-1 breadth first search over the reverse steps, the
+        same for every spur search of the query'''
+        if self._sink_dists is not None:
+            return self._sink_dists
+        n = self.sink + 1
+        dists = [INF] * n
+        visited = self.masks.nodes + bytearray(2)
+        dists[self.sink] = 0
+        queue = deque([self.sink])
+        while queue:
+            b = queue.popleft()
+            if visited[b]:
+                continue
+            visited[b] = 1
+            self.expansions += 1
+            if self.expansions >= self._check_at:
+                self._check_limits()
+            for a, step in self.reverse_neighbours(b):
+                new = dists[b] + step
+                if visited[a] or new >= dists[a]:
                     continue
-                dist = dists[b]
-                new = cost + con.cost
-                if new < dist:
-                    dists[b] = new
-                    heapq.heappush(queue, (new, b, path))
-        return (float('inf'), tuple())
-
-    def _find_paths_yen(self,
-                        start: str,
-                        target: str,
-                        limit: int = 10) -> Generator[Path, None, None]:
-        best_paths: list[Path] = [self._find_path_dijkstra(start, target)[1]]
+                dists[a] = new
+                if step:
+                    queue.append(a)
+                else:
+                    queue.appendleft(a)
+        self._sink_dists = dists
+        return dists
+
+    def _spur_bound(self, search: SpurSearch) -> float:
+        '''lower bound on the cost of the spur path of `search`, INF if
+        there is none'''
+        dists = self._sink_distances()
+        blocked = set(search.blocked)
+        skipped = set(search.skip_first)
+        bound = INF
+        for b, step in self.neighbours(search.spur):
+            if b not in blocked and b not in skipped:
+                bound = min(bound, step + dists[b])
+        return bound
+
+    def _step_costs(self, path: NodePath, costs: list[float],
+                    start: int) -> list[float]:
+        '''`costs`, the costs of `path` up to each node before `start`,
+        extended to the whole path'''
+        costs = costs[:start + 1]
+        for a, b in zip(path[start:], path[start + 1:]):
+            step = 0
+            if a != self.source and b != self.sink:
+                step = self.finder.connection(a, b, self.masks).cost
+            costs.append(costs[-1] + step)
+        return costs
+
+    def _find_paths_yen(
+            self,
+            limit: Optional[int] = 10) -> Generator[NodePath, None, None]:
+        '''the `limit` cheapest paths, including the virtual nodes, all of
+        them if `limit` is None
+
+        Yen's algorithm with Lawler's refinement: a path is only spurred
+        from the node where it left the path it was found from, the spur
+        searches before that node were already done for that path. A spur
+        search only runs once the bound on its cost, from the distances to
+        the sink, could make it the next path, many never do'''
+        best_paths: list[NodePath] = [
+            self._find_path(self.source)[1]
+        ]
         if not best_paths[0]:
             return None
-        # FIXME: while generators are cool, we have some very delicate
-        # shared state stored in `self`, so it's pretty unsafe
         yield best_paths[0]
-        candidates: list[tuple[float, Path]] = []
-        candidates_set: set[Path] = set()
-
-        deleted_connections: dict[tuple[str, str], ConnectionType] = {}
-        deleted_nodes: dict[str, dict[str, ConnectionType]] = {}
-
-        for _ in range(1, limit):
-            # len(...)-1: we don't want to delete the target node
-            for i in range(len(best_paths[-1]) - 1):
-                spur = best_paths[-1][i]
-                root_path = best_paths[-1][:i + 1]
-
-                for path in best_paths:
-                    if root_path == path[:i + 1]:
-                        # do not go down a path we already visited
-                        a = path[i]
-                        b = path[i + 1]
-                        key = (a, b)
-                        if key not in deleted_connections:
-                            deleted_connections[key] = self.connections[a][b]
-                            del self.connections[a][b]
-                for node in root_path[:-1]:
-                    # no looping back
-                    if node not in deleted_nodes:
-                        deleted_nodes[node] = self.connections[node]
-                    self.connections[node] = {}
-
-                _, spur_path = self._find_path_dijkstra(spur, target)
-
-                # undelete the disabled nodes
-                for node, cons in deleted_nodes.items():
-                    self.connections[node] = cons
-                deleted_nodes = {}
-                for key, cons in deleted_connections.items():
-                    a, b = key
-                    self.connections[a][b] = cons
-                deleted_connections = {}
-
-                if spur_path:
-                    path = root_path[:-1] + spur_path
-                    if path in candidates_set:
+        # the cost of each best path up to each of its nodes
+        best_costs = [self._step_costs(best_paths[0], [0], 0)]
+        # (cost, 1, path) of the candidates, and (bound, 0, order, best path
+        # index, spur index, search) of the spur searches still to run, so
+        # searches that could tie come first
+        candidates: list[tuple] = []
+        # the best path index and spur index each candidate was found from
+        origins: dict[NodePath, tuple[int, int]] = {}
+        order = count()
+        deviation = 0
+
+        for _ in count(1) if limit is None else range(1, limit):
+            index = len(best_paths) - 1
+            last = best_paths[index]
+            # len(...)-1: we don't want to spur from the sink
+            for i in range(deviation, len(last) - 1):
+                root_path = last[:i + 1]
+                # do not go down a path we already visited
+                skip = tuple(
+                    path[i + 1] for path in best_paths
+                    if root_path == path[:i + 1])
+                # no looping back
+                search = SpurSearch(last[i], root_path[:-1], skip)
+                bound = best_costs[index][i] + self._spur_bound(search)
+                if bound < INF:
+                    heapq.heappush(candidates,
+                                   (bound, 0, next(order), index, i, search))
+
+            while candidates and candidates[0][1] == 0:
+                pending = []
+                while candidates and candidates[0][1] == 0:
+                    pending.append(heapq.heappop(candidates))
+                # in spur order whichever way they ran, so ties between
+                # candidates are broken the same way
+                results = self._find_spur_paths(
+                    [entry[-1] for entry in pending])
+                for entry, (cost, spur_path) in zip(pending, results):
+                    if not spur_path:
+                        continue
+                    _, _, _, parent, i, search = entry
+                    path = search.blocked + spur_path
+                    if path in origins:
+                        # spur from the earliest node it left a best path
+                        if i < origins[path][1]:
+                            origins[path] = (parent, i)
                         continue
-                    cost = 0
-                    for node_a, node_b in zip(path, path[1:]):
-                        cost += self.connections[node_a][node_b].cost
-                    heapq.heappush(candidates, (cost, path))
-                    candidates_set.add(path)
+                    origins[path] = (parent, i)
+                    heapq.heappush(candidates,
+                                   (best_costs[parent][i] + cost, 1, path))
             if not candidates:
                 break
-            path = heapq.heappop(candidates)[1]
-            candidates_set.remove(path)
+            path = heapq.heappop(candidates)[2]
+            parent, deviation = origins.pop(path)
             best_paths.append(path)
+            best_costs.append(
+                self._step_costs(path, best_costs[parent], deviation))
             yield path
 
-    def print_paths(self, start: str, target: str, limit: int = 10) -> None:
-        if start in self.from_category:
-            self.connections[start] = self.from_category[start]
-
-        if target in self.to_category:
-            self.connections[target] = {}
-            for item, con in self.to_category[target].items():
-                self.connections[item][target] = con
-
-        paths = self._find_paths_yen(start, target, limit)
-        for path in paths:
-            parts = []
-            prev = None
-            for node in path:
-                thing = self.db.items.get(node) or self.db.categories[node]
-                if prev:
-                    desc = self.connections[prev][node].description
-                    parts[-1] += ' ' + desc
-                parts.append(thing.name)
-                prev = node
-            print(' -> '.join(parts))
-
-        if start in self.from_category:
-            del self.connections[start]
-
-        if target in self.to_category:
-            del self.connections[target]
-            for item, con in self.to_category[target].items():
-                del self.connections[item][target]
+    def _find_spur_paths(
+            self, searches: list[SpurSearch]) -> list[tuple[float, NodePath]]:
+        '''the spur paths of one Yen iteration and their costs, on the
+        finder's SpurPool if it has one'''
+        self.spur_searches += len(searches)
+        pool = self.finder.spur_pool
+        if pool and len(searches) > 1:
+            results = pool.find_paths(self, searches)
+            # the workers do not know the limits, check them here
+            if self.expansions >= self._check_at:
+                self._check_limits()
+            return results
+        return [self._find_path(*search) for search in searches]
+
+    def paths(self,
+              limit: Optional[int] = 10) -> Generator[NodePath, None, None]:
+        '''the `limit` cheapest chains from any start to any target, all of
+        them if `limit` is None'''
+        for path in self._find_paths_yen(limit):
+            yield path[1:-1]
+
+    def chains(self,
+               limit: Optional[int] = 10) -> Generator[Chain, None, None]:
+        '''like paths, with the start and target tag and the cost of each
+        chain'''
+        tags = self.finder.tags
+        for path in self.paths(limit):
+            yield Chain(tags[path[0]], tags[path[-1]], path,
+                        self.finder.path_cost(path, self.masks))
+
+
+class ChainStream:
+    '''the chains of a ChainQuery, each as soon as it is final
+
+    the search stops at `limit` chains, `timeout` seconds after iteration
+    starts, or after expanding `budget` nodes, whichever comes first.
+    Iterate over the stream for the chains, then `cut_short` tells whether
+    the time or the budget ran out before all of them were found. A stream
+    can only be iterated once'''
+    query: ChainQuery
+    limit: Optional[int]
+    timeout: Optional[float]
+    budget: Optional[int]
+    # the chains so far
+    chains: list[Chain]
+    cut_short: bool
+
+    def __init__(self,
+                 query: ChainQuery,
+                 limit: Optional[int] = 10,
+                 timeout: Optional[float] = None,
+                 budget: Optional[int] = None):
+        self.query = query
+        self.limit = limit
+        self.timeout = timeout
+        self.budget = budget
+        self.chains = []
+        self.cut_short = False
+
+    def __iter__(self) -> Iterator[Chain]:
+        query = self.query
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+        query.limit_search(deadline, self.budget)
+        tags = query.finder.tags
+        try:
+            for path in query.paths(self.limit):
+                chain = Chain(tags[path[0]], tags[path[-1]], path,
+                              query.finder.path_cost(path, query.masks))
+                self.chains.append(chain)
+                yield chain
+        except SearchCutShort:
+            self.cut_short = True
+
+    def run(self) -> tuple[list[Chain], bool]:
+        '''all the chains the limits allow, and whether they cut it short'''
+        for _ in self:
+            pass
+        return self.chains, self.cut_short
+
+    def cancel(self) -> None:
+        '''stop the search, from any thread'''
+        self.query.cancel()
+
+    async def __aiter__(self) -> AsyncIterator[Chain]:
+        '''the chains from a worker thread, without blocking the event loop
+
+        cancelling the task iterating, or leaving the loop early, also
+        stops the search'''
+        loop = asyncio.get_running_loop()
+        chains = iter(self)
+        try:
+            while True:
+                chain = await loop.run_in_executor(None, next, chains, None)
+                if chain is None:
+                    return
+                yield chain
+        finally:
+            self.cancel()
+
+
+class SpurSearch(NamedTuple):
+    '''the arguments of one ChainQuery._find_path call of a Yen iteration'''
+    spur: int
+    # the root path before the spur
+    blocked: NodePath
+    skip_first: NodePath
+
+
+# the finder of a spur search worker process, and its recent queries
+SPUR_WORKER_FINDER: Optional[ChainFinder] = None
+SPUR_WORKER_QUERIES: OrderedDict[ResultKey, ChainQuery] = OrderedDict()
+
+
+def init_spur_worker(finder: ChainFinder) -> None:
+    global SPUR_WORKER_FINDER
+    # the forked copy must not hand searches on again
+    finder.spur_pool = None
+    SPUR_WORKER_FINDER = finder
+    SPUR_WORKER_QUERIES.clear()
+
+
+def run_spur_search(key: ResultKey,
+                    search: SpurSearch) -> tuple[float, NodePath, int]:
+    '''the cost and spur path of `search`, and the nodes it expanded'''
+    assert SPUR_WORKER_FINDER
+    query = SPUR_WORKER_QUERIES.get(key)
+    if query is None:
+        # keeps the A* bounds of a query for its later iterations
+        query = ChainQuery(SPUR_WORKER_FINDER, *key)
+        SPUR_WORKER_QUERIES[key] = query
+        while len(SPUR_WORKER_QUERIES) > 16:
+            SPUR_WORKER_QUERIES.popitem(last=False)
+    else:
+        SPUR_WORKER_QUERIES.move_to_end(key)
+    expansions = query.expansions
+    cost, path = query._find_path(*search)
+    return cost, path, query.expansions - expansions
+
+
+class SpurPool:
+    '''worker processes for the spur searches of ChainQuery
+
+    each worker has its own copy of the finder, forked where possible so
+    it is neither pickled nor rebuilt, and rebuilds a query from its key.
+    The spur searches of an iteration only differ in their masks, so they
+    run at the same time and come back in the order they were given'''
+    executor: ProcessPoolExecutor
+
+    def __init__(self, finder: ChainFinder, jobs: int):
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            'fork' if 'fork' in methods else None)
+        self.executor = ProcessPoolExecutor(jobs,
+                                            mp_context=context,
+                                            initializer=init_spur_worker,
+                                            initargs=(finder, ))
+
+    def find_paths(
+            self, query: ChainQuery,
+            searches: list[SpurSearch]) -> list[tuple[float, NodePath]]:
+        key: ResultKey = (query.starts, query.targets, query.mode,
+                          query.constraints)
+        results = []
+        for cost, path, expansions in self.executor.map(
+                run_spur_search, repeat(key), searches):
+            query.expansions += expansions
+            results.append((cost, path))
+        return results
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from array import array
+from pathlib import Path
+from typing import Optional
+import struct
+
+from .ryza_chain_finder import ChainFinder, NodePath
+from .ryza_snapshot import SNAPSHOT_SOURCES, cache_dir, fingerprint
+
+MAGIC = b'RYZADST1'
+# marks pairs without a chain
+UNREACHABLE = 255
+NO_NODE = 65535
+
+
+class DistanceOracle:
+    '''precomputed chain lengths between every pair of nodes
+
+    `dists[s * n + t]` is the number of crafting steps of the shortest
+    chain from node s to node t of the ChainFinder, UNREACHABLE if there is
+    none, and `preds[s * n + t]` the node before t on that chain. The
+    predecessors come from a single search per source, so the chains are
+    the same ones ChainQuery finds first, ties included'''
+    tags: list[str]
+    ids: dict[str, int]
+    dists: array
+    preds: array
+
+    def __init__(self, tags: list[str], dists: array, preds: array):
+        self.tags = tags
+        self.ids = {tag: idx for idx, tag in enumerate(tags)}
+        self.dists = dists
+        self.preds = preds
+
+    @classmethod
+    def build(cls, finder: ChainFinder) -> DistanceOracle:
+        '''one breadth first search from every item and category'''
+        n = len(finder.tags)
+        if n >= NO_NODE:
+            raise ValueError(f'too many nodes for the oracle: {n}')
+        offsets, targets = finder.offsets, finder.targets
+        is_category = finder.is_category
+
+        # the item steps of each node, hubs resolved, in search order
+        steps: list[list[int]] = []
+        # the categories of each item, these are only ever chain ends
+        memberships: list[list[int]] = []
+        for a in range(n):
+            found = set()
+            cats = []
+            for edge in range(offsets[a], offsets[a + 1]):
+                b = targets[edge]
+                if not is_category[b]:
+                    found.add(b)
+                    continue
+                cats.append(b)
+                if is_category[a]:
+                    continue
+                for hub_edge in range(offsets[b], offsets[b + 1]):
+                    found.add(targets[hub_edge])
+            found.discard(a)
+            steps.append(sorted(found))
+            memberships.append(cats if not is_category[a] else [])
+
+        dists = array('B', [UNREACHABLE]) * (n * n)
+        preds = array('H', [NO_NODE]) * (n * n)
+        for source in range(n):
+            row = source * n
+            seen = bytearray(n)
+            seen[source] = 1
+            dists[row + source] = 0
+            layer = [source]
+            dist = 0
+            while layer:
+                dist += 1
+                next_layer = []
+                # nodes of a layer in id order, like Dijkstra's heap pops
+                for a in layer:
+                    for cat in memberships[a]:
+                        # having a category is a free step to it
+                        if not seen[cat]:
+                            seen[cat] = 1
+                            dists[row + cat] = dist - 1
+                            preds[row + cat] = a
+                    for b in steps[a]:
+                        if not seen[b]:
+                            seen[b] = 1
+                            dists[row + b] = min(dist, UNREACHABLE - 1)
+                            preds[row + b] = a
+                            next_layer.append(b)
+                next_layer.sort()
+                layer = next_layer
+        return cls(list(finder.tags), dists, preds)
+
+    def distance(self, start: str, target: str) -> Optional[int]:
+        '''number of steps from start to target, None without a chain'''
+        n = len(self.tags)
+        dist = self.dists[self.ids[start] * n + self.ids[target]]
+        return None if dist == UNREACHABLE else dist
+
+    def within(self, start: str, steps: int) -> list[tuple[int, str]]:
+        '''(steps, tag) pairs of every node at most `steps` away'''
+        n = len(self.tags)
+        row = self.ids[start] * n
+        found = []
+        for node in range(n):
+            dist = self.dists[row + node]
+            if dist <= steps:
+                found.append((dist, self.tags[node]))
+        found.sort()
+        return found
+
+    def node_path(self, start: int, target: int) -> NodePath:
+        n = len(self.tags)
+        row = start * n
+        if self.dists[row + target] == UNREACHABLE:
+            return tuple()
+        path = [target]
+        while target != start:
+            target = self.preds[row + target]
+            path.append(target)
+        return tuple(reversed(path))
+
+    def path(self, start: str, target: str) -> tuple[str, ...]:
+        '''tags of the shortest chain, empty if there is none'''
+        path = self.node_path(self.ids[start], self.ids[target])
+        return tuple(self.tags[node] for node in path)
+
+    def save(self, path: Path) -> None:
+        tags = '\n'.join(self.tags).encode()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with tmp.open('wb') as fp:
+            fp.write(MAGIC)
+            fp.write(struct.pack('<qq', len(self.tags), len(tags)))
+            fp.write(tags)
+            fp.write(self.dists.tobytes())
+            fp.write(self.preds.tobytes())
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> DistanceOracle:
+        with path.open('rb') as fp:
+            if fp.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'not a distance table: {path}')
+            n, tags_size = struct.unpack('<qq', fp.read(16))
+            tags = fp.read(tags_size).decode().split('\n')
+            dists = array('B')
+            dists.frombytes(fp.read(n * n))
+            preds = array('H')
+            preds.frombytes(fp.read(n * n * preds.itemsize))
+        if len(tags) != n or len(preds) != n * n:
+            raise ValueError(f'truncated distance table: {path}')
+        return cls(tags, dists, preds)
+
+
+def oracle_path(game: str, lang: str) -> Path:
+    # the table also depends on how the finder builds its graph
+    sources = (*SNAPSHOT_SOURCES, 'ryza_chain_finder.py',
+               'ryza_chain_oracle.py')
+    key = fingerprint(game, lang, sources)
+    return cache_dir(game) / f'distances-{key}.bin'
+
+
+def load_oracle(finder: ChainFinder, rebuild: bool = False) -> DistanceOracle:
+    '''the finder's DistanceOracle, from the cache if it is up to date'''
+    db = finder.db
+    path = oracle_path(db.game, db.lang)
+    if not rebuild:
+        try:
+            oracle = DistanceOracle.load(path)
+            if oracle.tags == finder.tags:
+                return oracle
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f'WARNING: ignoring unreadable distance table {path}: {e}')
+    oracle = DistanceOracle.build(finder)
+    # tables of older inputs are never valid again
+    for old in path.parent.glob('distances-*.bin'):
+        old.unlink()
+    try:
+        oracle.save(path)
+    except OSError as e:
+        print(f'WARNING: could not save distance table {path}: {e}')
+    return oracle
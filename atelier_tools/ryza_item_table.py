@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+import re
+
+from .ryza_parser import (Category, Database, Effect, Element,
+                          normalize_name)
+
+# numeric columns and how to read them from an Item
+NUMBER_FIELDS = {
+    'level': lambda item: item.level,
+    'price': lambda item: item.price,
+    'element_value': lambda item: item.element_value,
+}
+# the values an item has of each set field, as tags or element names
+SET_FIELDS = {
+    'category':
+    lambda item: [cat.tag for cat in item.categories],
+    'possible_category':
+    lambda item: [cat.tag for cat in item.possible_categories],
+    'element':
+    lambda item: [elem.value.lower() for elem in item.elements],
+    'possible_element':
+    lambda item: [elem.value.lower() for elem in item.possible_elements],
+    'effect':
+    lambda item: [
+        spec.effect.tag for levels in item.effects
+        for spec in levels.values()
+    ] + [
+        forge_effect.forged_effect.tag for forge_effects in item.forge_effects
+        for forge_effect in forge_effects
+    ],
+}
+TEXT_FIELDS = ('game', 'lang', 'tag', 'name')
+# fields whose values are looked up by name in each game
+NAME_FIELDS = ('category', 'possible_category', 'effect')
+DEFAULT_FIELDS = ('tag', 'name')
+
+Value = Union[int, str]
+
+
+class Condition(NamedTuple):
+    '''`field op value`, set fields only take = (has) and != (has not)'''
+    field: str
+    op: str
+    value: Value
+
+
+class NumberIndex(NamedTuple):
+    '''the rows of a numeric column by value'''
+    # sorted distinct values
+    values: list[int]
+    # bitset of the rows with a value up to values[i]
+    up_to: list[int]
+
+
+class ItemTable:
+    '''the items of a Database as columns, built once and never changed
+
+    rows are in db.items order. Text and numeric fields are lists and
+    arrays, and every value of a text or set field has a bitset of the
+    rows having it, bit i for row i. Conditions are answered with a few
+    operations on these bitsets, for all items at once, see ItemQuery.
+    Tables of several games and languages can be combined into one'''
+    texts: dict[str, list[str]]
+    numbers: dict[str, array]
+    sets: dict[str, dict[str, int]]
+    # every row
+    all_rows: int
+    # rows by text field value, names are normalize_name()-d
+    _text_indexes: dict[str, dict[str, int]]
+    _number_indexes: dict[str, NumberIndex]
+
+    def __init__(self, texts: dict[str, list[str]],
+                 numbers: dict[str, array], sets: dict[str, dict[str, int]]):
+        self.texts = texts
+        self.numbers = numbers
+        self.sets = sets
+        self.all_rows = (1 << len(texts['tag'])) - 1
+        self._text_indexes = {}
+        for field, text_column in texts.items():
+            rows_by_text: dict[str, int] = {}
+            for row, text in enumerate(text_column):
+                if field == 'name':
+                    text = normalize_name(text)
+                rows_by_text[text] = rows_by_text.get(text, 0) | 1 << row
+            self._text_indexes[field] = rows_by_text
+        self._number_indexes = {}
+        for field, column in numbers.items():
+            rows_by_value: dict[int, int] = {}
+            for row, value in enumerate(column):
+                rows_by_value[value] = rows_by_value.get(value, 0) | 1 << row
+            values = sorted(rows_by_value)
+            up_to = []
+            rows = 0
+            for value in values:
+                rows |= rows_by_value[value]
+                up_to.append(rows)
+            self._number_indexes[field] = NumberIndex(values, up_to)
+
+    @classmethod
+    def build(cls, db: Database) -> ItemTable:
+        '''the table of `db`, names are in its active language'''
+        items = list(db.items.values())
+        texts = {
+            'game': [db.game] * len(items),
+            'lang': [db.active_language()] * len(items),
+            'tag': [item.tag for item in items],
+            'name': [item.name for item in items],
+        }
+        numbers = {
+            field: array('q', (get(item) for item in items))
+            for field, get in NUMBER_FIELDS.items()
+        }
+        sets: dict[str, dict[str, int]] = {}
+        for field, get in SET_FIELDS.items():
+            rows_by_value: dict[str, int] = {}
+            for row, item in enumerate(items):
+                for value in get(item):
+                    rows_by_value[value] = rows_by_value.get(value,
+                                                             0) | 1 << row
+            sets[field] = rows_by_value
+        return cls(texts, numbers, sets)
+
+    @classmethod
+    def combine(cls, tables: Iterable[ItemTable]) -> ItemTable:
+        '''the rows of all `tables` in one, in order'''
+        texts: dict[str, list[str]] = {field: [] for field in TEXT_FIELDS}
+        numbers = {field: array('q') for field in NUMBER_FIELDS}
+        sets: dict[str, dict[str, int]] = {field: {} for field in SET_FIELDS}
+        offset = 0
+        for table in tables:
+            for field, values in table.texts.items():
+                texts[field].extend(values)
+            for field, column in table.numbers.items():
+                numbers[field].extend(column)
+            for field, rows_by_value in table.sets.items():
+                combined = sets[field]
+                for value, rows in rows_by_value.items():
+                    combined[value] = combined.get(value, 0) | rows << offset
+            offset += len(table.texts['tag'])
+        return cls(texts, numbers, sets)
+
+    def fields(self) -> list[str]:
+        return [*self.texts, *self.numbers, *self.sets]
+
+    def _up_to(self, field: str, value: int, inclusive: bool) -> int:
+        '''the rows with a value below `value`, or up to it'''
+        index = self._number_indexes[field]
+        find = bisect_right if inclusive else bisect_left
+        pos = find(index.values, value)
+        return index.up_to[pos - 1] if pos else 0
+
+    def rows(self, cond: Condition) -> int:
+        '''bitset of the rows matching `cond`'''
+        field, op, value = cond
+        if field in self.numbers:
+            if not isinstance(value, int):
+                raise ValueError(f'{field} needs a number')
+            below = self._up_to(field, value, False)
+            up_to = self._up_to(field, value, True)
+            results = {
+                '<': below,
+                '<=': up_to,
+                '>': self.all_rows & ~up_to,
+                '>=': self.all_rows & ~below,
+                '=': up_to & ~below,
+                '!=': self.all_rows & ~(up_to & ~below),
+            }
+            if op not in results:
+                raise ValueError(f'unknown operator: {op}')
+            return results[op]
+        if op not in ('=', '!='):
+            raise ValueError(f'{field} only supports = and !=')
+        if field in self.sets:
+            rows = self.sets[field].get(str(value), 0)
+        elif field in self.texts:
+            key = str(value)
+            if field == 'name':
+                key = normalize_name(key)
+            rows = self._text_indexes[field].get(key, 0)
+        else:
+            raise ValueError(f'unknown field: {field}')
+        return rows if op == '=' else self.all_rows & ~rows
+
+    def games(self) -> list[str]:
+        return list(self._text_indexes['game'])
+
+    def game_rows(self, game: str) -> int:
+        '''bitset of the rows of `game`'''
+        return self._text_indexes['game'].get(game, 0)
+
+    def tag_rows(self, tags: Iterable[str]) -> int:
+        '''bitset of the rows of `tags`, unknown ones are ignored'''
+        rows_by_tag = self._text_indexes['tag']
+        rows = 0
+        for tag in tags:
+            rows |= rows_by_tag.get(tag, 0)
+        return rows
+
+    def value(self, field: str, row: int) -> Union[Value, list[str]]:
+        if field in self.texts:
+            return self.texts[field][row]
+        if field in self.numbers:
+            return self.numbers[field][row]
+        bit = 1 << row
+        return sorted(value for value, rows in self.sets[field].items()
+                      if rows & bit)
+
+    def query(self) -> ItemQuery:
+        return ItemQuery(self, self.all_rows)
+
+
+class ItemQuery:
+    '''filtered, sorted and projected rows of an ItemTable
+
+    every method returns a new query, iterate over one for its rows as
+    tuples of the selected fields'''
+    table: ItemTable
+    # bitset of the matching rows
+    rows: int
+    order: Optional[tuple[str, bool]]
+    selected: tuple[str, ...]
+
+    def __init__(self,
+                 table: ItemTable,
+                 rows: int,
+                 order: Optional[tuple[str, bool]] = None,
+                 selected: tuple[str, ...] = DEFAULT_FIELDS):
+        self.table = table
+        self.rows = rows
+        self.order = order
+        self.selected = selected
+
+    def where(self, field: str, op: str, value: Value) -> ItemQuery:
+        rows = self.table.rows(Condition(field, op, value))
+        return ItemQuery(self.table, self.rows & rows, self.order,
+                         self.selected)
+
+    def only(self, tags: Iterable[str]) -> ItemQuery:
+        '''the rows of `tags` among these'''
+        return ItemQuery(self.table, self.rows & self.table.tag_rows(tags),
+                         self.order, self.selected)
+
+    def where_games(self, conditions: dict[str, Condition]) -> ItemQuery:
+        '''the rows matching the condition of their game, see
+        parse_game_conditions
+
+        games without a condition have none of the values it names'''
+        op = next(iter(conditions.values())).op
+        rows = 0
+        for game in self.table.games():
+            cond = conditions.get(game)
+            if cond:
+                rows |= self.table.game_rows(game) & self.table.rows(cond)
+            elif op == '!=':
+                rows |= self.table.game_rows(game)
+        return ItemQuery(self.table, self.rows & rows, self.order,
+                         self.selected)
+
+    def only_games(self, tags: dict[str, Iterable[str]]) -> ItemQuery:
+        '''the rows of each game's `tags` among these'''
+        rows = 0
+        for game, game_tags in tags.items():
+            rows |= self.table.game_rows(game) & self.table.tag_rows(game_tags)
+        return ItemQuery(self.table, self.rows & rows, self.order,
+                         self.selected)
+
+    def sort(self, field: str, descending: bool = False) -> ItemQuery:
+        if field not in self.table.texts and field not in self.table.numbers:
+            raise ValueError(f'can not sort by {field}')
+        return ItemQuery(self.table, self.rows, (field, descending),
+                         self.selected)
+
+    def select(self, *fields: str) -> ItemQuery:
+        for field in fields:
+            if field not in self.table.fields():
+                raise ValueError(f'unknown field: {field}')
+        return ItemQuery(self.table, self.rows, self.order, fields)
+
+    def count(self) -> int:
+        return self.rows.bit_count()
+
+    def row_ids(self) -> list[int]:
+        '''the matching rows, in table order unless sorted'''
+        ids = []
+        rows = self.rows
+        while rows:
+            low = rows & -rows
+            ids.append(low.bit_length() - 1)
+            rows ^= low
+        if self.order:
+            field, descending = self.order
+            column: Union[array, list[str]]
+            if field in self.table.numbers:
+                column = self.table.numbers[field]
+            else:
+                column = self.table.texts[field]
+            # stable, so ties keep the table order either way
+            ids.sort(key=column.__getitem__, reverse=descending)
+        return ids
+
+    def __iter__(self) -> Iterator[tuple]:
+        for row in self.row_ids():
+            yield tuple(
+                self.table.value(field, row) for field in self.selected)
+
+
+def split_condition(text: str) -> Condition:
+    '''a Condition from text like `level<=20`, `element=ice` or
+    `category=(fuel)`, with the names of NAME_FIELDS not looked up yet'''
+    match = re.fullmatch(r'\s*(\w+)\s*(<=|>=|!=|<|>|=)\s*(.*?)\s*', text)
+    if not match:
+        raise ValueError(f'not a condition: {text}')
+    field, op, value = match.groups()
+    field = field.lower()
+    if field in NUMBER_FIELDS:
+        try:
+            return Condition(field, op, int(value))
+        except ValueError:
+            raise ValueError(f'{field} needs a number: {text}')
+    if field in ('element', 'possible_element'):
+        value = value.lower()
+        if value not in [elem.value.lower() for elem in Element]:
+            raise ValueError(f'unknown element: {value}')
+    elif field in ('game', 'lang'):
+        value = value.lower()
+    elif field not in NAME_FIELDS and field not in TEXT_FIELDS:
+        raise ValueError(f'unknown field: {field}')
+    return Condition(field, op, value)
+
+
+def resolve_name(db: Database,
+                 cond: Condition,
+                 loose: bool = True) -> Optional[Condition]:
+    '''`cond` with the category or effect of `db` it names, None if `db`
+    has none. Descriptions and fuzzy matches only count if `loose`'''
+    if cond.field not in NAME_FIELDS:
+        return cond
+    query = str(cond.value).lower()
+    found: Union[Category, Effect, None]
+    if cond.field == 'effect':
+        found = db.find_effect(query, loose)
+    else:
+        found = db.find_category(query, loose)
+    return cond._replace(value=found.tag) if found else None
+
+
+def parse_condition(db: Database, text: str) -> Condition:
+    '''a Condition from text like `level<=20`, `element=ice` or
+    `category=(fuel)`
+
+    categories and effects can be given by name, they are looked up like
+    the other commands do'''
+    cond = split_condition(text)
+    resolved = resolve_name(db, cond)
+    if not resolved:
+        raise ValueError(f'{cond.value} not found')
+    return resolved
+
+
+def parse_game_conditions(dbs: Iterable[Database],
+                          text: str) -> dict[str, Condition]:
+    '''the Condition of `text` in each game, for ItemQuery.where_games
+
+    a name can mean different things in each game, or only exist in some
+    of them, so it is looked up in each. A fuzzy match in one game would
+    shadow the real one of another, so they only count if no game has the
+    name. Fails if none has anything like it'''
+    cond = split_condition(text)
+    dbs = list(dbs)
+    for loose in (False, True):
+        conditions = {}
+        for db in dbs:
+            resolved = resolve_name(db, cond, loose)
+            if resolved:
+                conditions[db.game] = resolved
+        if conditions:
+            return conditions
+    raise ValueError(f'{cond.value} not found')
+
+
+def find_game_items(dbs: Iterable[Database],
+                    queries: Iterable[str]) -> dict[str, list[str]]:
+    '''the tags of the items matching `queries` in each game, for
+    ItemQuery.only_games, with fuzzy matches as in parse_game_conditions'''
+    dbs = list(dbs)
+    tags: dict[str, list[str]] = {db.game: [] for db in dbs}
+    for query in queries:
+        for loose in (False, True):
+            found = {
+                db.game: [item.tag for item in db.find_items(query, loose)]
+                for db in dbs
+            }
+            if any(found.values()):
+                break
+        for game, items in found.items():
+            tags[game] += items
+    return tags
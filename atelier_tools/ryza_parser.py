@@ -2,16 +2,26 @@
 
 from __future__ import annotations
 
-from typing import Generator, Iterable, Optional, TextIO, TypeVar, Union
+from typing import (Any, Generator, Generic, Iterable, NamedTuple, Optional,
+                    Sequence, TextIO, TypeVar, Union, overload)
+import collections.abc
 import typing
 import xml.etree.ElementTree as ET
 from enum import Enum
 from dataclasses import dataclass
 from pathlib import Path
 from itertools import count
+from bisect import bisect_right
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 import string
 import csv
 import json
+import sys
+
+from .ryza_search import SearchIndex, SearchMatch
+from .ryza_strings import StringTable
 
 # tag lists were pulled from `strings <game exe>`
 
@@ -43,50 +53,330 @@ ELEMENT_STR_MAP_GAME = {'ryza1': 4063340, 'ryza2': 4194395}
 
 EFFECT_DESC_OFFSET = 3538945
 
+# item descriptions are this far below the item names
+ITEM_DESC_DISTANCE = 3276800
+
 RING_TYPE_OFFSETS = {
     # label and help starting offsets
     'ryza1': (10092545, 10092565),
     'ryza2': (10092545, 10092585),
 }
 
+# data files, relative to the game's data dir
+# {lang} is replaced with the upper case language code
+STRINGS_XML = 'Saves/Text_{lang}/strCombineAll.xml'
+EFFECTS_XML = 'Saves/item/item_effect_no.xml'
+ITEM_DATA_XML = 'Saves/item/itemData_no.xml'
+RECIPE_DATA_XML = 'Saves/item/itemRecipeData.xml'
+MIXFIELD_XML = 'Saves/mix/mixFieldData.xml'
+ITEM_STATUS_XML = 'Saves/item/item_status.xml'
+FORGE_EFFECT_XMLS = [
+    f'Saves/weaponForge/{part}ForgeEffectTable.xml'
+    for part in ('Accessory', 'Weapon', 'Armor')
+]
+EV_EFFECTS_XML = 'Saves/item/item_ev_effect_no.xml'
+APPEAR_EV_EFFECT_XML = 'Saves/item/item_appear_ev_effect.xml'
+MATERIALS_CSV = 'materials.csv'
+
+# every file the parser might read
+DATA_FILES = [
+    STRINGS_XML,
+    EFFECTS_XML,
+    ITEM_DATA_XML,
+    RECIPE_DATA_XML,
+    MIXFIELD_XML,
+    ITEM_STATUS_XML,
+    *FORGE_EFFECT_XMLS,
+    EV_EFFECTS_XML,
+    APPEAR_EV_EFFECT_XML,
+    MATERIALS_CSV,
+]
+
+
+# marks a SectionAttribute without a default value
+_NO_DEFAULT: Any = object()
+
+# the value type of a SectionAttribute
+T = TypeVar('T')
+
+
+class SectionAttribute(Generic[T]):
+    '''attribute filled in by some of the Database's load stages
+
+    in lazy mode reading the attribute loads those stages first
+    the value itself is stored in `_<name>` on the instance. Annotate it
+    as SectionAttribute[value type]'''
+
+    def __init__(self, *sections: str, default: Any = _NO_DEFAULT):
+        self.sections = sections
+        self.default = default
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+        self.private_name = '_' + name
+
+    @overload
+    def __get__(self, obj: None, owner=None) -> SectionAttribute[T]:
+        ...
+
+    @overload
+    def __get__(self, obj: object, owner=None) -> T:
+        ...
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        db = getattr(obj, 'db', obj)
+        if db._unloaded:
+            db.ensure_sections(self.sections)
+        try:
+            return getattr(obj, self.private_name)
+        except AttributeError:
+            if self.default is _NO_DEFAULT:
+                raise AttributeError(self.name) from None
+            return self.default
+
+    def __set__(self, obj, value: T) -> None:
+        setattr(obj, self.private_name, value)
+
+
+class LocalizedAttribute(SectionAttribute[T]):
+    '''SectionAttribute coming from the string table
+
+    inside Database.language() blocks the active StringOverlay's value is
+    used instead. Untranslated values fall back to the Database's own
+    language, or to the default without `fallback`'''
+
+    def __init__(self,
+                 *sections: str,
+                 default: Any = _NO_DEFAULT,
+                 fallback: bool = True):
+        super().__init__(*sections, default=default)
+        self.fallback = fallback
+
+    @overload
+    def __get__(self, obj: None, owner=None) -> LocalizedAttribute[T]:
+        ...
+
+    @overload
+    def __get__(self, obj: object, owner=None) -> T:
+        ...
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            # no class level value, so dataclasses do not see a default
+            raise AttributeError(self.name)
+        overlay = ACTIVE_OVERLAY.get()
+        if overlay is not None and overlay.db is getattr(obj, 'db', obj):
+            value = overlay.lookup(obj, self.name)
+            if value is not None:
+                return value
+            if not self.fallback and self.default is not _NO_DEFAULT:
+                return self.default
+        return super().__get__(obj, owner)
+
+
+class StringOverlay:
+    '''names and descriptions of another language on top of a Database
+
+    only the string table is read for it, everything else is shared with
+    the Database'''
+    db: Database
+    lang: str
+    strings: StringTable
+    # the Database's own localized attributes, in this language
+    tables: dict[str, typing.Any]
 
-@dataclass
+    def __init__(self, db: Database, lang: str, strings: StringTable):
+        self.db = db
+        self.lang = lang
+        self.strings = strings
+        self.tables = {}
+
+    def lookup(self, obj, attr: str):
+        '''`attr` of `obj` in this language, None if it is not translated'''
+        if obj is self.db:
+            if attr not in self.tables:
+                self.tables[attr] = self.db.localize(attr, self.strings)
+            return self.tables[attr]
+        return obj.localize(attr, self.strings)
+
+
+# overlay used by LocalizedAttributes, see Database.language
+ACTIVE_OVERLAY: ContextVar[Optional[StringOverlay]] = ContextVar(
+    'ACTIVE_OVERLAY', default=None)
+
+
+def slotted(cls):
+    '''rebuild `cls` with __slots__ for its annotated attributes
+
+    dataclass(slots=True) would replace SectionAttributes with plain slots,
+    this keeps them and adds a slot for the value they store instead.
+    Annotated class level defaults are dropped, so __init__ has to set them.
+    Names in an existing __slots__ are kept too, use it for private
+    attributes. Goes above @dataclass'''
+    cls_dict = dict(cls.__dict__)
+    inherited = set()
+    for base in cls.__mro__[1:]:
+        inherited.update(base.__dict__.get('__slots__', ()))
+    slots: list[str] = []
+
+    def add(name: str):
+        if name not in inherited and name not in slots:
+            slots.append(name)
+
+    for name in cls_dict.pop('__slots__', ()):
+        if name.startswith('__') and not name.endswith('__'):
+            # private names are mangled like in the class body
+            name = f'_{cls.__name__.lstrip("_")}{name}'
+        # drop the member descriptors of the old class
+        cls_dict.pop(name, None)
+        add(name)
+    for name in cls_dict.get('__annotations__', {}):
+        if not isinstance(cls_dict.get(name), SectionAttribute):
+            cls_dict.pop(name, None)
+            add(name)
+    for value in cls_dict.values():
+        if isinstance(value, SectionAttribute):
+            add(value.private_name)
+    cls_dict['__slots__'] = tuple(slots)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+def filling(values: Sequence[T]) -> list[T]:
+    '''`values` as the list they are while loading, before compact()'''
+    assert isinstance(values, list), 'appending to a compacted sequence'
+    return values
+
+
+def ordered_set(values: Iterable[T]) -> tuple[T, ...]:
+    '''`values` without duplicates, in first seen order'''
+    # tagged objects are unique, compare them by identity
+    seen = set()
+    result = []
+    for value in values:
+        if id(value) not in seen:
+            seen.add(id(value))
+            result.append(value)
+    return tuple(result)
+
+
+# tags are unique in a Database, so objects compare by identity and reading
+# a field never loads a stage
+@slotted
+@dataclass(eq=False)
 class TaggedObject:
     db: Database
     idx: int
     tag: str
-    name: str
+    if typing.TYPE_CHECKING:
+        # a required field, LocalizedAttribute hides itself from dataclass
+        name: str
+    else:
+        name: LocalizedAttribute[str] = LocalizedAttribute()
     name_id: int
     description: str = ''
 
+    def __post_init__(self):
+        # the same tags are repeated all over the data files
+        self.tag = sys.intern(self.tag)
+
     def __str__(self):
         return self.name
 
+    def description_id(self) -> Optional[int]:
+        '''string table id of the description, if there is one'''
+        return None
+
+    def localize(self, attr: str, strings: StringTable) -> Optional[str]:
+        string_id = self.name_id if attr == 'name' else self.description_id()
+        if string_id is None:
+            return None
+        return strings.get(string_id)
+
 
 TaggedType = TypeVar('TaggedType', bound=TaggedObject)
 Ingredient = Union['Item', 'Category']
 
 
+def normalize_name(name: str) -> str:
+    return name.strip(' \r\t\u200b').upper()
+
+
+class TagRegistry(typing.Generic[TaggedType]):
+    '''hash indexes over one kind of tagged objects
+
+    all indexes keep the insertion order of the objects, so the first match
+    is the same one a linear scan over the tag map would find'''
+    by_tag: dict[str, TaggedType]
+    by_name_id: dict[int, list[TaggedType]]
+    # keys are normalize_name()-d display names
+    by_name: dict[str, list[TaggedType]]
+
+    def __init__(self, objects: dict[str, TaggedType]):
+        self.by_tag = objects
+        self.by_name_id = {}
+        self.by_name = {}
+        for obj in objects.values():
+            self.add(obj)
+
+    def add(self, obj: TaggedType) -> None:
+        self.by_tag[obj.tag] = obj
+        self.by_name_id.setdefault(obj.name_id, []).append(obj)
+        self.by_name.setdefault(normalize_name(obj.name), []).append(obj)
+
+    def with_name_id(self, name_id: int) -> TaggedType:
+        results = self.by_name_id.get(name_id, [])
+        if len(results) != 1:
+            raise ValueError(f'expected 1 item, got {len(results)}')
+        return results[0]
+
+    def with_name(self, name: str) -> list[TaggedType]:
+        '''objects with a matching name, ignoring case and padding'''
+        return self.by_name.get(normalize_name(name), [])
+
+
+@slotted
 class Category(TaggedObject):
     pass
 
 
+@slotted
 class Potential(TaggedObject):
     pass
 
 
+@slotted
 class EVEffect(TaggedObject):
-    effects: list[Effect]
+    effects: SectionAttribute[list[Effect]] = SectionAttribute('ev_effects')
 
 
-@dataclass
+@slotted
+@dataclass(eq=False)
 class Effect(TaggedObject):
     type: str = 'unknown effect'
     int_value: Optional[int] = None
     category_value: Optional[str] = None
     element_value: Optional[Element] = None
 
-    def init_effect(self, node: ET.Element):
+    if typing.TYPE_CHECKING:
+        # the dataclass field inherited from TaggedObject
+        description: str = ''
+    else:
+        # not annotated, so the dataclass field stays the inherited one
+        description = LocalizedAttribute('descriptions',
+                                         default='',
+                                         fallback=False)
+
+    def description_id(self) -> Optional[int]:
+        # effect descriptions are not spaced like the names, they start
+        # right at the offset
+        first_eff = next(iter(self.db.effects.values()))
+        return self.name_id - first_eff.name_id + EFFECT_DESC_OFFSET
+
+    def init_effect(self, node: XMLRecord):
         # effects can ACT on multiple stats
         # actTag_[0-9] tells which actions it will do, and min_ and max_ attrs
         # are the ranges for the actions
@@ -99,7 +389,7 @@ class Effect(TaggedObject):
             min_1 = node.get(f'min_1_{num}')
             if act == 'ACT_MIX_ADD_CATEGORY':
                 self.type = 'add_category'
-                self.category_value = min_1
+                self.category_value = sys.intern(min_1) if min_1 else min_1
             elif act == 'ACT_MIX_ADD_ELEMENT':
                 self.type = 'add_element'
                 assert min_1
@@ -110,41 +400,52 @@ class Effect(TaggedObject):
                 self.int_value = int(min_1)
 
 
-@dataclass
+@dataclass(slots=True)
 class EffectSpec:
     effect: Effect
     # reachable only with an essence
     is_essence: bool
 
 
+@slotted
 class MixfieldRingValue:
-    item_value: Optional[Item] = None
-    int_value: int = 0
-    effect_value: Optional[Effect] = None
-    effect_sort_idx: int = 0
+    item_value: Optional[Item]
+    int_value: int
+    effect_value: Optional[Effect]
+    effect_sort_idx: int
     # locked behind essence
-    is_locked: bool = False
+    is_locked: bool
+
+    def __init__(self):
+        self.item_value = None
+        self.int_value = 0
+        self.effect_value = None
+        self.effect_sort_idx = 0
+        self.is_locked = False
 
     def __repr__(self):
         value = self.item_value or self.effect_value or self.int_value
         return f'<{value} {self.is_locked}>'
 
 
+@slotted
 class MixfieldRing:
-    type: int = -1
-    is_essential: bool = False
-    ev_lv: int = 0
+    type: int
+    is_essential: bool
+    ev_lv: int
     element: Element
     ingredient: Ingredient
-    x: int = 0
-    y: int = 0
+    x: int
+    y: int
     # ring 0 has no parent
-    parent_idx: Optional[int] = None
-    morph_item: Optional[Item] = None
+    parent_idx: Optional[int]
+    morph_item: Optional[Item]
     # keys are target element values
     effects: dict[int, MixfieldRingValue]
 
-    def __init__(self, recipe: Recipe, ring: ET.Element):
+    def __init__(self, recipe: Recipe, ring: XMLRecord):
+        self.parent_idx = None
+        self.morph_item = None
         self.effects = {}
         self.type = int(ring.attrib['type'])
         self.ev_lv = int(ring.get('EvLv', '0'))
@@ -203,16 +504,16 @@ class MixfieldRing:
             target = first.item_value
             assert target
             if target not in item.children:
-                item.children.append(target)
+                filling(item.children).append(target)
             if item not in target.parents:
-                target.parents.append(item)
+                filling(target.parents).append(item)
             return
 
         if self.ingredient not in item.ingredients:
-            item.ingredients.append(self.ingredient)
+            filling(item.ingredients).append(self.ingredient)
         if self.is_essential:
             if self.ingredient not in item.essential_ingredients:
-                item.essential_ingredients.append(self.ingredient)
+                filling(item.essential_ingredients).append(self.ingredient)
 
         # we only care about morph and effect rings
         if self.type not in (0, 1, 2, 3):
@@ -220,7 +521,7 @@ class MixfieldRing:
 
         # make sure the effect group exists
         while len(item.effects) <= self.type:
-            item.effects.append({})
+            filling(item.effects).append({})
         group = item.effects[self.type]
         for ring_effect in self.effects.values():
             eff = ring_effect.effect_value
@@ -234,11 +535,12 @@ class MixfieldRing:
                     spec.is_essence = False
 
 
+@slotted
 class Mixfield:
     '''The mirage loops for an item and all its EV-link descendants'''
     rings: dict[int, MixfieldRing]
 
-    def __init__(self, recipe: Recipe, fielddata: ET.Element):
+    def __init__(self, recipe: Recipe, fielddata: XMLRecord):
         self.rings = {}
 
         try:
@@ -251,7 +553,7 @@ class Mixfield:
             raise
 
     def find_reachable_rings(self,
-                             fielddata: ET.Element) -> dict[int, ET.Element]:
+                             fielddata: XMLRecord) -> dict[int, XMLRecord]:
         all_rings = fielddata.findall('Ring')
         # find out which rings are actually connected to the recipe
         # unconnected rings are often broken
@@ -281,23 +583,26 @@ class Mixfield:
         item.apply_effects()
 
 
+@slotted
 class Recipe:
     db: Database
     item: Item
 
-    available_effects: list[dict[int, Effect]]
-    ingredients: list[Ingredient]
+    # lists while loading, tuples once compacted
+    available_effects: Sequence[dict[int, Effect]]
+    ingredients: Sequence[Ingredient]
     recipe_category: str
-    make_num: int = 0
-    is_ev_extended: bool = False
+    make_num: int
+    is_ev_extended: bool
     # seems to mean if the thing is actually craftable
-    has_data: bool = False
-    ev_extend_item: Optional[Item] = None
-    ev_extend_mat: Optional[Ingredient] = None
+    has_data: bool
+    ev_extend_item: Optional[Item]
+    ev_extend_mat: Optional[Ingredient]
 
-    mixfield: Optional[Mixfield] = None
+    mixfield: SectionAttribute[Optional[Mixfield]] = SectionAttribute(
+        'mixfield', default=None)
 
-    def __init__(self, db, item: Item, nodes: list[ET.Element]):
+    def __init__(self, db, item: Item, nodes: list[XMLRecord]):
         self.db = db
         self.item = item
 
@@ -305,8 +610,13 @@ class Recipe:
         first = nodes[0]
         self.available_effects = []
         self.ingredients = []
+        self.is_ev_extended = False
+        self.has_data = False
+        self.ev_extend_item = None
+        self.ev_extend_mat = None
         self.make_num = int(first.get('MakeNum', '1'))
-        self.recipe_category = first.get('RecipeCategory', '(unkown)')
+        self.recipe_category = sys.intern(
+            first.get('RecipeCategory', '(unkown)'))
         extend_recipe = first.get('EvExtendRecipe')
         if extend_recipe:
             # self.is_ev_extended = True
@@ -348,54 +658,86 @@ class Recipe:
                 # is_ev = node.get(f'EvLv{eff_num}')
                 recipe_group[eff_num] = eff
             self.available_effects.append(recipe_group)
-            item.effects.append(item_group)
+            filling(item.effects).append(item_group)
 
-    def parse_mixfield(self, fd: ET.Element):
+    def parse_mixfield(self, fd: XMLRecord):
         # FIXME: is this ok?
         if fd.get('EvLv'):
             return
         self.mixfield = Mixfield(self, fd)
 
+    def compact(self) -> None:
+        self.available_effects = tuple(self.available_effects)
+        self.ingredients = tuple(self.ingredients)
+
 
-@dataclass
+@dataclass(slots=True)
 class ForgeEffect:
     forged_effect: Effect
     source_effects: list[Effect]
 
 
+@slotted
 class Item(TaggedObject):
-    level: int = -1
-    price: int = -1
-
-    categories: list[Category]
-    possible_categories: list[Category]
-    elements: list[Element]
-    possible_elements: dict[Element, str]
-    element_value: int = 0
-    add_element_value: int = 0
-
-    children: list[Item]
-    parents: list[Item]
-
-    recipe: Optional[Recipe] = None
+    __slots__ = ('__effect_cache', )
+
+    level: int
+    price: int
+
+    # the sequences are lists while loading, tuples once compacted
+    categories: Sequence[Category]
+    possible_categories: SectionAttribute[Sequence[Category]] = (
+        SectionAttribute('mixfield'))
+    elements: Sequence[Element]
+    possible_elements: SectionAttribute[dict[Element, str]] = SectionAttribute(
+        'mixfield')
+    element_value: int
+    add_element_value: SectionAttribute[int] = SectionAttribute(
+        'mixfield', default=0)
+
+    children: SectionAttribute[Sequence[Item]] = SectionAttribute('mixfield')
+    parents: SectionAttribute[Sequence[Item]] = SectionAttribute('mixfield')
+
+    recipe: Optional[Recipe]
     # structure: [effect_1, effect_2, effect_3, effect_4]
     # where effect_n: {effect_level: EffectSpec}
     # -1 is default effect_level, active without reaching anything in recipe
-    effects: list[dict[int, EffectSpec]]
-    ingredients: list[Ingredient]
-    essential_ingredients: list[Ingredient]
+    effects: SectionAttribute[Sequence[dict[int, EffectSpec]]] = (
+        SectionAttribute('recipes', 'mixfield', 'item_status'))
+    ingredients: SectionAttribute[Sequence[Ingredient]] = SectionAttribute(
+        'mixfield')
+    essential_ingredients: SectionAttribute[Sequence[Ingredient]] = (
+        SectionAttribute('mixfield'))
+
+    ev_base: SectionAttribute[Optional[Item]] = SectionAttribute(
+        'mixfield', default=None)
+
+    gathering: SectionAttribute[Optional[str]] = SectionAttribute(
+        'gathering', default=None)
+    shop_data: SectionAttribute[Optional[str]] = SectionAttribute(
+        'gathering', default=None)
+    seed: SectionAttribute[Optional[Item]] = SectionAttribute(
+        'gathering', default=None)
+    fixed_potentials: SectionAttribute[Sequence[Potential]] = (
+        SectionAttribute('item_status'))
+    forge_effects: SectionAttribute[Sequence[Sequence[ForgeEffect]]] = (
+        SectionAttribute('forge_effects'))
+    # keys are UseEnemy, UseParty, Accessory
+    ev_effects: SectionAttribute[dict[str, Sequence[EVEffect]]] = (
+        SectionAttribute('appear_ev_effect'))
 
-    ev_base: Optional[Item] = None
+    description: LocalizedAttribute[str] = LocalizedAttribute(
+        'descriptions', default='', fallback=False)
 
-    gathering: Optional[str] = None
-    shop_data: Optional[str] = None
-    seed: Optional[Item] = None
-    fixed_potentials: list[Potential]
-    forge_effects: list[list[ForgeEffect]]
-    # keys are UseEnemy, UseParty, Accessory
-    ev_effects: dict[str, list[EVEffect]]
+    def description_id(self) -> Optional[int]:
+        return self.name_id - ITEM_DESC_DISTANCE
 
     def post_init(self):
+        self.level = -1
+        self.price = -1
+        self.element_value = 0
+        self.recipe = None
+
         self.children = []
         self.parents = []
         self.fixed_potentials = []
@@ -412,15 +754,15 @@ class Item(TaggedObject):
         self.essential_ingredients = []
         self.effects = []
 
-    def parse_itemdata(self, node: ET.Element):
+    def parse_itemdata(self, node: XMLRecord):
         self.element_value = int(node.get('elemValue', 0))
         for elem in Element:
             attr = 'elem' + elem.value
             if node.get(attr) is not None:
-                self.elements.append(elem)
+                filling(self.elements).append(elem)
         for name, value in node.attrib.items():
             if name.startswith('cat_'):
-                self.categories.append(self.db.categories[value])
+                filling(self.categories).append(self.db.categories[value])
         self.price = int(node.get('price', '0'))
         self.level = int(node.get('lv', '0'))
 
@@ -437,7 +779,7 @@ class Item(TaggedObject):
             for key, effect in spec.items():
                 if key not in self.ev_effects:
                     self.ev_effects[key] = []
-                self.ev_effects[key].append(effect)
+                filling(self.ev_effects[key]).append(effect)
 
     def apply_forge_effects(self, forge_effects: list[list[ForgeEffect]]):
         # books have no itemdata in ryza1
@@ -455,7 +797,7 @@ class Item(TaggedObject):
                         ForgeEffect(forge_effect.forged_effect,
                                     accepted_effects))
             if new_group:
-                self.forge_effects.append(new_group)
+                filling(self.forge_effects).append(new_group)
 
     def apply_effects(self, enable_essence=True):
         self.__effect_cache = []
@@ -475,12 +817,35 @@ class Item(TaggedObject):
                     value = eff.category_value
                     assert value
                     cat = self.db.categories[value]
-                    self.possible_categories.append(cat)
+                    # every mixfield application adds them again
+                    if cat not in self.possible_categories:
+                        filling(self.possible_categories).append(cat)
                 elif eff.type == 'add_element_value':
                     value = eff.int_value
                     assert value
                     self.add_element_value = max(self.add_element_value, value)
 
+    def compact(self) -> None:
+        '''freeze the lists filled while loading into tuples
+
+        empty ones all become the same empty tuple'''
+        # some DLC items really list a category twice
+        self.categories = tuple(self.categories)
+        self.possible_categories = ordered_set(self.possible_categories)
+        self.elements = tuple(self.elements)
+        self.children = ordered_set(self.children)
+        self.parents = ordered_set(self.parents)
+        self.ingredients = ordered_set(self.ingredients)
+        self.essential_ingredients = ordered_set(self.essential_ingredients)
+        self.effects = tuple(self.effects)
+        self.fixed_potentials = tuple(self.fixed_potentials)
+        self.forge_effects = tuple(tuple(g) for g in self.forge_effects)
+        self.ev_effects = {k: tuple(v) for k, v in self.ev_effects.items()}
+        # only needed while loading
+        self.__effect_cache = ()
+        if self.recipe:
+            self.recipe.compact()
+
     def format_effects(self):
         names = []
         for group in self.effects:
@@ -538,7 +903,8 @@ class Item(TaggedObject):
         parents = self.parents
         while parents:
             if len(parents) > 1:
-                lines.append(f'!!WARNING: got multiple parents: {parents}')
+                lines.append(
+                    f'!!WARNING: got multiple parents: {list(parents)}')
             parent = parents[0]
             resolved_parents.insert(0, str(parent))
             parents = parent.parents
@@ -549,6 +915,129 @@ class Item(TaggedObject):
         return '\n'.join(lines)
 
 
+class XMLRecord(NamedTuple):
+    '''plain data copy of an XML element
+
+    these are cheap to send between processes, unlike ElementTree nodes'''
+    tag: str
+    attrib: dict[str, str]
+    children: tuple[XMLRecord, ...] = ()
+
+    def get(self, key: str, default=None):
+        return self.attrib.get(key, default)
+
+    def find(self, tag: str) -> Optional[XMLRecord]:
+        for child in self.children:
+            if child.tag == tag:
+                return child
+        return None
+
+    def findall(self, tag: str) -> list[XMLRecord]:
+        return [child for child in self.children if child.tag == tag]
+
+    def to_element(self) -> ET.Element:
+        node = ET.Element(self.tag, self.attrib)
+        node.extend(child.to_element() for child in self.children)
+        return node
+
+
+class LoadStage(NamedTuple):
+    # Database method applying the stage
+    method: str
+    # data files the stage reads: (path in the data dir, record tag)
+    # if the tag is None every child of the root is a record
+    files: tuple[tuple[str, Optional[str]], ...] = ()
+    # stages that have to be applied before this one
+    deps: tuple[str, ...] = ()
+    # lazy databases only load this stage when one of the attributes it
+    # fills is used
+    lazy: bool = False
+
+
+# the file reading parts of these run in parallel, then the stages are
+# applied in dependency order, declaration order breaking ties
+LOAD_STAGES = {
+    'effects': LoadStage('parse_effects', ((EFFECTS_XML, 'item_effect'), )),
+    'items': LoadStage('parse_items', ((ITEM_DATA_XML, 'itemData'), )),
+    'recipes': LoadStage('parse_recipedata',
+                         ((RECIPE_DATA_XML, 'itemRecipeData'), ),
+                         ('effects', 'items')),
+    'mixfield': LoadStage('parse_mixfield', ((MIXFIELD_XML, 'FieldData'), ),
+                          ('recipes', ),
+                          lazy=True),
+    'descriptions': LoadStage('parse_descriptions', lazy=True),
+    'gathering': LoadStage('parse_gathering', ((MATERIALS_CSV, None), ),
+                           lazy=True),
+    # TODO: parse potential effects from item/item_potential.xml?
+    # item_status appends effect groups after the mixfield ones
+    'item_status': LoadStage('parse_item_status',
+                             ((ITEM_STATUS_XML, 'item_status'), ),
+                             ('mixfield', ),
+                             lazy=True),
+    'forge_effects': LoadStage(
+        'parse_forge_effects',
+        tuple((path, None) for path in FORGE_EFFECT_XMLS),
+        # forge effects depend on the effects collected from the mixfield
+        ('items', 'mixfield'),
+        lazy=True),
+    'ev_effects': LoadStage('parse_ev_effects', ((EV_EFFECTS_XML, None), ),
+                            lazy=True),
+    'appear_ev_effect': LoadStage('parse_appear_ev_effect',
+                                  ((APPEAR_EV_EFFECT_XML, None), ),
+                                  ('mixfield', ),
+                                  lazy=True),
+    'ring_types': LoadStage('parse_ring_types', lazy=True),
+}
+
+
+class DataReader:
+    '''reads and extracts data files, on a process pool if there is one'''
+    data_dir: Path
+    executor: Optional[Executor]
+    pending: dict[tuple[str, Optional[str]], Future]
+
+    def __init__(self, data_dir: Path, jobs: int = 1):
+        self.data_dir = data_dir
+        self.executor = ProcessPoolExecutor(jobs) if jobs > 1 else None
+        self.pending = {}
+
+    def __enter__(self) -> DataReader:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+        self.pending = {}
+
+    def path(self, part: str) -> Path:
+        return find_file(self.data_dir / part)
+
+    def exists(self, part: str) -> bool:
+        return self.path(part).exists()
+
+    def prefetch(self, part: str, tag: Optional[str]) -> None:
+        '''start reading a file in the background, if there is a pool'''
+        key = (part, tag)
+        if self.executor and key not in self.pending:
+            path = self.path(part)
+            self.pending[key] = self.executor.submit(read_records, path, tag)
+
+    def records(self, part: str, tag: Optional[str]) -> list:
+        '''records of `part`, see read_records'''
+        future = self.pending.pop((part, tag), None)
+        if future:
+            return future.result()
+        return read_records(self.path(part), tag)
+
+    def strings(self, part: str, ranges: list[range]) -> Future:
+        path = self.path(part)
+        if self.executor:
+            return self.executor.submit(load_string_table, path, ranges)
+        future: Future = Future()
+        future.set_result(load_string_table(path, ranges))
+        return future
+
+
 class Database:
     game: str
     lang: str
@@ -556,13 +1045,35 @@ class Database:
     categories: dict[str, Category]
     effects: dict[str, Effect]
     potentials: dict[str, Potential]
-    elements: dict[Element, str]
+    elements: LocalizedAttribute[dict[Element, str]] = LocalizedAttribute(
+        'descriptions')
     ev_effects: dict[str, EVEffect]
-    ring_types: dict[int, tuple[str, str]]
+    ring_types: LocalizedAttribute[dict[int, tuple[str, str]]] = (
+        LocalizedAttribute('ring_types'))
+    # the objects of each kind ('items', ...) by name and name id
+    registry: dict[str, TagRegistry]
 
     data_dir: Path
 
-    def __init__(self, game: str, lang: str = 'en'):
+    def __init__(self,
+                 game: str,
+                 lang: str = 'en',
+                 jobs: Optional[int] = None,
+                 lazy: bool = False):
+        '''parse all data of `game`
+
+        `jobs` is the number of processes reading the files, the default is
+        to read them in this process, which is usually faster
+        with `lazy` the stages marked lazy are only loaded when an attribute
+        they fill is first used'''
+        # names of the stages not loaded yet
+        self._unloaded: set[str] = set(LOAD_STAGES)
+        # the stages being loaded, innermost last
+        self._loading: list[str] = []
+        # search indexes and string overlays by language
+        self._search_indexes: dict[str, SearchIndex] = {}
+        self._effect_indexes: dict[str, SearchIndex] = {}
+        self._overlays: dict[str, StringOverlay] = {}
         self.game = game
         self.lang = lang
         self.data_dir = Path(f'game_files/{game}/data')
@@ -576,8 +1087,8 @@ class Database:
 
         with open(f'game_files/{game}/tags.json') as fp:
             tags = json.load(fp)
+        self._dlc_tags = frozenset(tags['items_dlc_1'] + tags['items_dlc_2'])
 
-        self.strings = self.load_strings()
         # first load basic data: tags and names
         # these magic offsets are the same for ryza 1 & 2
         init_data = [
@@ -590,49 +1101,190 @@ class Database:
             (self.potentials, 'potentials', Potential, 6946817),
             (self.ev_effects, 'ev_effects', EVEffect, 7208961),
         ]
+        # the string table is huge, only keep the parts we actually read
+        string_ranges = []
         for target, attr, factory, offset in init_data:
-            val = self.get_tag_map(factory, tags[attr], offset)
-            target.update(val)
-
-        self.parse_effects()
-        # FIXME: something has to be wrong with DLC data parsing
-        if self.game == 'ryza1':
-            # ITEM_DLC_014 has no name or itemData
-            # but has a recipe and a mixfield, and is referenced by
-            # ITEM_DLC_012's mixfield...
-            # maybe the item's name is at another offset?
-            for bad_tag in ['ITEM_DLC_014', 'ITEM_DLC_037']:
-                bad = Item(self, -1, bad_tag, '???', -1)
-                self.items[bad_tag] = bad
-        self.parse_items()
-        self.parse_recipedata()
-        self.parse_mixfield()
-        self.parse_descriptions()
-        self.parse_gathering()
-        # TODO: parse potential effects from item/item_potential.xml?
-        self.parse_item_status()
-        self.parse_forge_effects()
-        self.parse_ev_effects()
-        self.parse_appear_ev_effect()
-        self.parse_ring_types()
+            string_ranges.append(range(offset, offset + len(tags[attr])))
+            if factory is Item:
+                desc_offset = offset - ITEM_DESC_DISTANCE
+                string_ranges.append(
+                    range(desc_offset, desc_offset + len(tags[attr])))
+        effects_end = EFFECT_DESC_OFFSET + len(tags['effects'])
+        string_ranges.append(range(EFFECT_DESC_OFFSET, effects_end))
+        element_offset = ELEMENT_STR_MAP_GAME[game]
+        string_ranges.append(
+            range(element_offset, element_offset + len(Element)))
+        name_offset, desc_offset = RING_TYPE_OFFSETS[game]
+        string_ranges.append(
+            range(name_offset, 2 * desc_offset - name_offset))
+        # overlays read the same parts of their string tables
+        self._string_ranges = string_ranges
+
+        if jobs is None:
+            jobs = 1
+        stages = load_order(LOAD_STAGES)
+        if lazy:
+            stages = [name for name in stages if not LOAD_STAGES[name].lazy]
+        # one file per worker at most, the string table is one more
+        files = {file for name in stages for file in LOAD_STAGES[name].files}
+        jobs = min(jobs, len(files) + 1)
+        with DataReader(self.data_dir, jobs) as self.reader:
+            # start reading everything, the string table is needed first
+            strings = self.reader.strings(
+                STRINGS_XML.format(lang=lang.upper()), string_ranges)
+            for name in stages:
+                for part, tag in LOAD_STAGES[name].files:
+                    self.reader.prefetch(part, tag)
+            self.strings = strings.result()
+
+            for target, attr, factory, offset in init_data:
+                val = self.get_tag_map(factory, tags[attr], offset)
+                target.update(val)
+            self.registry = {
+                'items': TagRegistry(self.items),
+                'categories': TagRegistry(self.categories),
+                'effects': TagRegistry(self.effects),
+                'potentials': TagRegistry(self.potentials),
+                'ev_effects': TagRegistry(self.ev_effects),
+            }
 
-    def parse_ring_types(self):
+            # FIXME: something has to be wrong with DLC data parsing
+            if self.game == 'ryza1':
+                # ITEM_DLC_014 has no name or itemData
+                # but has a recipe and a mixfield, and is referenced by
+                # ITEM_DLC_012's mixfield...
+                # maybe the item's name is at another offset?
+                for bad_tag in ['ITEM_DLC_014', 'ITEM_DLC_037']:
+                    bad = Item(self, -1, bad_tag, '???', -1)
+                    self.registry['items'].add(bad)
+
+            for name in stages:
+                self.load_stage(name)
+        if self._unloaded:
+            # lazy stages read their files when needed, without a pool
+            self.reader = DataReader(self.data_dir)
+        else:
+            # the reader only lives while loading
+            del self.reader
+            self.compact()
+
+    def load_stage(self, name: str) -> None:
+        stage = LOAD_STAGES[name]
+        for dep in stage.deps:
+            if dep in self._unloaded:
+                self.load_stage(dep)
+        self._loading.append(name)
+        try:
+            getattr(self, stage.method)()
+        finally:
+            self._loading.pop()
+        self._unloaded.discard(name)
+
+    def ensure_sections(self, names: Iterable[str]) -> None:
+        '''load the named stages, if they were not loaded yet
+
+        while a stage is loading, it may only read what it fills in itself
+        or what is loaded already, anything else is a missing dependency
+        in LOAD_STAGES'''
+        names = tuple(names)
+        if self._loading:
+            stage = self._loading[-1]
+            missing = [name for name in names if name in self._unloaded]
+            if missing and stage not in names:
+                raise RuntimeError(
+                    f'stage {stage} reads sections {missing} it does not '
+                    'depend on')
+            return
+        for name in names:
+            if name in self._unloaded:
+                self.load_stage(name)
+        if not self._unloaded and hasattr(self, 'reader'):
+            del self.reader
+            self.compact()
+
+    def compact(self) -> None:
+        '''shrink the data once every stage is loaded, see Item.compact'''
+        for item in self.items.values():
+            item.compact()
+
+    def ensure_loaded(self) -> None:
+        '''load every stage a lazy database skipped so far'''
+        self.ensure_sections(load_order(LOAD_STAGES))
+
+    def ring_type_names(
+            self, strings: StringTable) -> dict[int, tuple[str, str]]:
         name_offset, desc_offset = RING_TYPE_OFFSETS[self.game]
+        ring_types = {}
         for i in range(desc_offset - name_offset):
-            name = self.strings.get(name_offset + i)
+            name = strings.get(name_offset + i)
             if not name:
                 continue
-            desc = self.strings[desc_offset + i]
-            self.ring_types[i] = (name, desc)
+            desc = strings[desc_offset + i]
+            ring_types[i] = (name, desc)
+        return ring_types
+
+    def element_names(self, strings: StringTable) -> dict[Element, str]:
+        offset = ELEMENT_STR_MAP_GAME[self.game]
+        return {
+            element: strings[offset + idx]
+            for idx, element in enumerate(Element)
+        }
+
+    def localize(self, attr: str, strings: StringTable):
+        '''the Database's LocalizedAttribute `attr` read from `strings`'''
+        if attr == 'elements':
+            return self.element_names(strings)
+        elif attr == 'ring_types':
+            return self.ring_type_names(strings)
+        raise AttributeError(attr)
+
+    def available_languages(self) -> list[str]:
+        '''codes of the languages with a string table'''
+        langs = set()
+        for path in (self.data_dir / 'Saves').glob('*'):
+            if path.name.lower().startswith('text_'):
+                langs.add(path.name[5:].lower())
+        return sorted(langs)
+
+    def overlay(self, lang: str) -> StringOverlay:
+        '''the names and descriptions in `lang`, loaded on first use'''
+        if lang not in self._overlays:
+            part = STRINGS_XML.format(lang=lang.upper())
+            strings = DataReader(self.data_dir).strings(
+                part, self._string_ranges).result()
+            self._overlays[lang] = StringOverlay(self, lang, strings)
+        return self._overlays[lang]
+
+    @contextmanager
+    def language(self, lang: Optional[str]):
+        '''use the names and descriptions of `lang` inside the block
+
+        None or the Database's own language switch back to the parsed ones'''
+        overlay = None
+        if lang is not None and lang != self.lang:
+            overlay = self.overlay(lang)
+        token = ACTIVE_OVERLAY.set(overlay)
+        try:
+            yield self
+        finally:
+            ACTIVE_OVERLAY.reset(token)
+
+    def active_language(self) -> str:
+        overlay = ACTIVE_OVERLAY.get()
+        if overlay is not None and overlay.db is self:
+            return overlay.lang
+        return self.lang
+
+    def parse_ring_types(self):
+        self.ring_types = self.ring_type_names(self.strings)
 
     def parse_appear_ev_effect(self):
-        xml_path = self.data_dir / 'Saves/item/item_appear_ev_effect.xml'
-        if not xml_path.exists():
+        if not self.reader.exists(APPEAR_EV_EFFECT_XML):
             return
-        root = self.open_xml(xml_path)
+        records = self.reader.records(APPEAR_EV_EFFECT_XML, None)
 
         specs = {}
-        for node in root:
+        for node in records:
             src_tag = node.attrib['srcEff']
             effs = {}
             for typ in ('UseEnemy', 'UseParty', 'Accessory'):
@@ -642,10 +1294,9 @@ class Database:
             item.apply_ev_effects(specs)
 
     def parse_ev_effects(self):
-        xml_path = self.data_dir / 'Saves/item/item_ev_effect_no.xml'
-        if not xml_path.exists():
+        if not self.reader.exists(EV_EFFECTS_XML):
             return
-        root = self.open_xml(xml_path)
+        records = self.reader.records(EV_EFFECTS_XML, None)
 
         for ev_eff in self.ev_effects.values():
             # FIXME:
@@ -653,10 +1304,10 @@ class Database:
             # this results in freeze protection not having any effects
             ev_eff.effects = []
 
-        for node in root:
+        for node in records:
             name_id = int(node.attrib['nameID'])
             try:
-                ev_eff = self.with_name_id(self.ev_effects, name_id)
+                ev_eff = self.with_name_id('ev_effects', name_id)
             except ValueError:
                 continue
             for i in range(10):
@@ -666,14 +1317,11 @@ class Database:
                 ev_eff.effects.append(self.effects[eff_tag])
 
     def parse_forge_effects(self):
-        for eq_type in ('accessory', 'weapon', 'armor'):
-            part = eq_type.title()
-            path_part = f'Saves/weaponForge/{part}ForgeEffectTable.xml'
-            xml_path = self.data_dir / path_part
+        for path_part in FORGE_EFFECT_XMLS:
             # ryza 1 only has weapon forge
-            if not xml_path.exists():
+            if not self.reader.exists(path_part):
                 continue
-            root = self.open_xml(xml_path)
+            records = self.reader.records(path_part, None)
 
             effect_groups = []
             current = {}
@@ -685,7 +1333,7 @@ class Database:
                         effect_groups.append(current['forge_effects'])
                     current = {'num': num, 'forge_effects': []}
 
-            for node in root:
+            for node in records:
                 dst = self.effects[node.attrib['dst']]
                 num = int(node.attrib['No'])
                 maybe_emit(num)
@@ -705,30 +1353,19 @@ class Database:
         if not self.potentials:
             print('WARNING: potentials were not parsed!')
             return
-        xml_path = self.data_dir / 'Saves/item/item_status.xml'
-        root = self.open_xml(xml_path)
-
-        nodes = root.iter('item_status')
+        nodes = self.reader.records(ITEM_STATUS_XML, 'item_status')
         for node, item in zip(nodes, self.items.values()):
             for i in range(10):
                 pot = node.get(f'pot_{i}')
                 eff = node.get(f'eff_{i}')
                 if pot:
                     potential = self.potentials[pot]
-                    item.fixed_potentials.append(potential)
+                    filling(item.fixed_potentials).append(potential)
                 if eff:
                     effect = self.effects[eff]
                     assert len(item.effects) <= i
-                    item.effects.append({-1: EffectSpec(effect, False)})
-
-    def load_strings(self) -> dict[int, str]:
-        str_path = f'Saves/Text_{self.lang.upper()}/strCombineAll.xml'
-        stringmap = {}
-        root = self.open_xml(Path(self.data_dir / str_path))
-        for node in root.iter('str'):
-            text = node.attrib['Text'].strip(' \r\t\u200b')
-            stringmap[int(node.attrib['String_No'])] = text
-        return stringmap
+                    group = {-1: EffectSpec(effect, False)}
+                    filling(item.effects).append(group)
 
     def dump(self, fp: TextIO):
         import json
@@ -743,15 +1380,44 @@ class Database:
         dump['ring_types'] = self.ring_types
         json.dump(dump, fp, default=json_dump_helper)
 
-    def find_items(self, query: str) -> Generator[Item, None, None]:
-        query = query.upper()
-        for item in self.items.values():
-            if query in item.tag or query in item.name.upper():
-                yield item
+    def search(self,
+               query: str,
+               kinds: Optional[tuple[type, ...]] = None,
+               limit: Optional[int] = None,
+               loose: bool = True) -> list[SearchMatch]:
+        '''ranked item and category matches, see SearchIndex.search
+
+        names and descriptions are searched in the active language'''
+        lang = self.active_language()
+        if lang not in self._search_indexes:
+            self._search_indexes[lang] = SearchIndex(
+                [*self.items.values(), *self.categories.values()])
+        return self._search_indexes[lang].search(query, kinds, limit, loose)
+
+    def best_matches(self, query: str,
+                     kinds: tuple[type, ...]) -> list[SearchMatch]:
+        '''tag, name and substring matches, or if there are none, the
+        description and fuzzy ones'''
+        matches = self.search(query, kinds, loose=False)
+        if not matches:
+            matches = self.search(query, kinds)
+        return matches
+
+    def matches(self, query: str, kinds: tuple[type, ...],
+                loose: bool) -> list[SearchMatch]:
+        '''best_matches, or only the strict ones if not `loose`'''
+        if loose:
+            return self.best_matches(query, kinds)
+        return self.search(query, kinds, loose=False)
+
+    def find_items(self,
+                   query: str,
+                   loose: bool = True) -> Generator[Item, None, None]:
+        for match in self.matches(query, (Item, ), loose):
+            yield typing.cast(Item, match.obj)
 
     def parse_gathering(self):
-        csv_path = self.data_dir / 'materials.csv'
-        if not csv_path.exists():
+        if not self.reader.exists(MATERIALS_CSV):
             return
         seeds = {}
         for num in count(1):
@@ -760,47 +1426,30 @@ class Database:
             if not seed:
                 break
             seeds[seed.name.split()[0]] = seed
-        with csv_path.open() as fp:
-            for row in csv.DictReader(fp):
-                # FIXME: DLC items are missing
-                name = row['Item'].strip(' \r\t\u200b')
-                for item in self.items.values():
-                    if item.name == name:
-                        break
-                else:
-                    continue
-                item.gathering = row['Location Info']
-                item.shop_data = row['Development Info']
-                seed = row['Seed']
-                if seed:
-                    item.seed = seeds[row['Seed']]
-
-    def parse_descriptions(self):
-        offset = ELEMENT_STR_MAP_GAME[self.game]
-        for idx, element in enumerate(Element):
-            self.elements[element] = self.strings[offset + idx]
-
-        offset = EFFECT_DESC_OFFSET
-        first_eff = next(iter(self.effects.values()))
-        for eff in self.effects.values():
-            idx = eff.name_id - first_eff.name_id + offset
-            desc = self.strings.get(idx)
-            if not desc:
+        for row in self.reader.records(MATERIALS_CSV, None):
+            # FIXME: DLC items are missing
+            name = row['Item'].strip(' \r\t\u200b')
+            for item in self.registry['items'].with_name(name):
+                if item.name == name:
+                    break
+            else:
                 continue
-            eff.description = desc
+            item.gathering = row['Location Info']
+            item.shop_data = row['Development Info']
+            seed = row['Seed']
+            if seed:
+                item.seed = seeds[row['Seed']]
 
-        for item in self.items.values():
-            idx = item.name_id - 3276800
-            desc = self.strings.get(idx)
+    def parse_descriptions(self):
+        self.elements = self.element_names(self.strings)
+        for obj in [*self.effects.values(), *self.items.values()]:
+            desc = obj.localize('description', self.strings)
             if not desc:
                 continue
-            item.description = desc
+            obj.description = desc
 
     def parse_mixfield(self):
-        xml_path = self.data_dir / 'Saves/mix/mixFieldData.xml'
-        root = self.open_xml(xml_path)
-
-        for fd in root.iter('FieldData'):
+        for fd in self.reader.records(MIXFIELD_XML, 'FieldData'):
             fd_tag = fd.get('tag', '')
             item = self.items[fd_tag]
             assert item.recipe, (item.tag, item.name)
@@ -815,8 +1464,6 @@ class Database:
                 extend.ev_base = item
 
     def parse_recipedata(self):
-        xml_path = self.data_dir / 'Saves/item/itemRecipeData.xml'
-        root = self.open_xml(xml_path)
         item = None
         recipe = []
 
@@ -829,7 +1476,7 @@ class Database:
             item = None
             recipe = []
 
-        for node in root.iter('itemRecipeData'):
+        for node in self.reader.records(RECIPE_DATA_XML, 'itemRecipeData'):
             item_tag = node.get('ItemTag')
             if item_tag:
                 parse_current_recipe()
@@ -845,20 +1492,18 @@ class Database:
         for item in self.items.values():
             # make sure evey item has basic structures
             item.post_init()
-        xml_path = self.data_dir / 'Saves/item/itemData_no.xml'
-        root = self.open_xml(xml_path)
-        for node in root.iter('itemData'):
+        for node in self.reader.records(ITEM_DATA_XML, 'itemData'):
             name_id = node.get('nameID')
             if name_id is None:
                 continue
             name_id = int(name_id)
             try:
-                item = self.with_name_id(self.items, name_id)
+                item = self.with_name_id('items', name_id)
             except ValueError:
                 kind = node.get('kindTag')
                 cat_0 = node.get('cat_0')
                 is_dlc = node.get('isDlc')
-                name = self.strings[name_id]
+                name = self.strings.get(name_id)
                 # I have no idea where tags for mists are in ryza 2
                 if kind == 'ITEM_KIND_IMPORTANT' and cat_0 is None:
                     continue
@@ -869,36 +1514,29 @@ class Database:
             item.parse_itemdata(node)
 
     def parse_effects(self):
-        xml_path = self.data_dir / 'Saves/item/item_effect_no.xml'
-        root = self.open_xml(xml_path)
-        for node in root.iter('item_effect'):
+        for node in self.reader.records(EFFECTS_XML, 'item_effect'):
             name_id = node.get('nameID')
             if name_id is None:
                 continue
             name_id = int(name_id)
-            effect = self.with_name_id(self.effects, name_id)
+            effect = self.with_name_id('effects', name_id)
             effect.init_effect(node)
 
-    def with_name_id(self, items: dict[str, TaggedType],
-                     name_id: int) -> TaggedType:
-        results = [item for item in items.values() if item.name_id == name_id]
-        if len(results) != 1:
-            raise ValueError(f'expected 1 item, got {len(results)}')
-        return results[0]
+    def is_dlc(self, item: Item) -> bool:
+        return item.tag in self._dlc_tags
 
-    def open_xml(self, path: Path) -> ET.Element:
-        # switch rips yield case-sensitive files
-        # but steam rips are all-lowercase
-        if not path.exists():
-            path = Path(str(path).lower())
-        # ElementTree sometimes struggles with shift-jis
-        try:
-            tree = ET.parse(path)
-            root = tree.getroot()
-        except ValueError:
-            with path.open('rt', encoding='shift-jis') as stream:
-                root = ET.fromstring(stream.read())
-        return root
+    def with_name_id(self, kind: str, name_id: int) -> TaggedObject:
+        '''the only object of `kind` (eg. 'items') with `name_id`'''
+        return self.registry[kind].with_name_id(name_id)
+
+    @staticmethod
+    def input_paths(game: str, lang: str = 'en') -> list[Path]:
+        '''all files a Database for `game` and `lang` is built from'''
+        data_dir = Path(f'game_files/{game}/data')
+        paths = [Path(f'game_files/{game}/tags.json')]
+        for part in DATA_FILES:
+            paths.append(find_file(data_dir / part.format(lang=lang.upper())))
+        return paths
 
     def get_tag_map(self, factory, tags: list[str], offset: int):
         '''load tag list from flat file, then add ids and names from xml'''
@@ -912,47 +1550,38 @@ class Database:
 
     def find_item_or_category(
             self, query: str) -> tuple[Optional[Item], Optional[Category]]:
-        query = query.upper()
-        item_match = None
-        cat_match = None
-        # 1st check if the query is an exact tag
-        if query in self.items:
-            return (self.items[query], None)
-        if query in self.categories:
-            return (None, self.categories[query])
-        for item in self.items.values():
-            haystack = item.name.upper()
-            if query == haystack:
-                return (item, None)
-            elif query in haystack and not item_match:
-                item_match = item
-        for cat in self.categories.values():
-            haystack = cat.name.upper()
-            if query == haystack:
-                return (None, cat)
-            elif query in haystack and not cat_match:
-                cat_match = cat
-        if item_match:
-            return (item_match, None)
-        return (None, cat_match)
+        for match in self.best_matches(query, (Item, Category)):
+            if isinstance(match.obj, Item):
+                return (match.obj, None)
+            return (None, typing.cast(Category, match.obj))
+        return (None, None)
 
     def find_item(self, query: str) -> Optional[Item]:
-        query = query.upper()
-        for tag, item in self.items.items():
-            if query == tag or query == item.name.upper():
-                return item
-        for tag, item in self.items.items():
-            if query in tag or query in item.name.upper():
-                return item
-
-    def find_category(self, query: str) -> Optional[Category]:
-        query = query.upper()
-        for tag, cat in self.categories.items():
-            if query == tag or query == cat.name.upper():
-                return cat
-        for tag, cat in self.categories.items():
-            if query in tag or query in cat.name.upper():
-                return cat
+        for match in self.best_matches(query, (Item, )):
+            return typing.cast(Item, match.obj)
+        return None
+
+    def find_category(self,
+                      query: str,
+                      loose: bool = True) -> Optional[Category]:
+        for match in self.matches(query, (Category, ), loose):
+            return typing.cast(Category, match.obj)
+        return None
+
+    def find_effect(self,
+                    query: str,
+                    loose: bool = True) -> Optional[Effect]:
+        '''the best effect match, like find_item'''
+        lang = self.active_language()
+        if lang not in self._effect_indexes:
+            self._effect_indexes[lang] = SearchIndex(self.effects.values())
+        index = self._effect_indexes[lang]
+        matches = index.search(query, limit=1, loose=False)
+        if not matches and loose:
+            matches = index.search(query, limit=1)
+        for match in matches:
+            return typing.cast(Effect, match.obj)
+        return None
 
     def get_ingredient(self, tag: str) -> Ingredient:
         if tag in self.items:
@@ -960,7 +1589,116 @@ class Database:
         return self.categories[tag]
 
 
-def xml_to_str(node: ET.Element):
+class StringTableTarget:
+    '''XMLParser target collecting <str> nodes without building a tree'''
+    strings: dict[int, str]
+
+    def __init__(self, ranges: Iterable[range]):
+        self.strings = {}
+        # merge the ranges, so lookups are a single bisect
+        self.starts: list[int] = []
+        self.stops: list[int] = []
+        for r in sorted((r for r in ranges if r), key=lambda r: r.start):
+            if self.stops and r.start <= self.stops[-1]:
+                self.stops[-1] = max(self.stops[-1], r.stop)
+            else:
+                self.starts.append(r.start)
+                self.stops.append(r.stop)
+
+    def wanted(self, num: int) -> bool:
+        idx = bisect_right(self.starts, num) - 1
+        return idx >= 0 and num < self.stops[idx]
+
+    def start(self, tag: str, attrib: dict[str, str]) -> None:
+        if tag != 'str':
+            return
+        num = int(attrib['String_No'])
+        if self.wanted(num):
+            self.strings[num] = attrib['Text'].strip(' \r\t\u200b')
+
+    def close(self) -> StringTable:
+        blocks = [range(*r) for r in zip(self.starts, self.stops)]
+        return StringTable.from_dict(self.strings, blocks)
+
+
+def parse_string_table(stream: typing.IO,
+                       ranges: Iterable[range]) -> StringTable:
+    parser = ET.XMLParser(target=StringTableTarget(ranges))
+    while chunk := stream.read(1 << 16):
+        parser.feed(chunk)
+    # close() returns what the target's close() does
+    return typing.cast(StringTable, parser.close())
+
+
+def load_string_table(path: Path, ranges: Iterable[range]) -> StringTable:
+    '''stream the string table, keeping only the ids inside `ranges`'''
+    try:
+        with path.open('rb') as stream:
+            return parse_string_table(stream, ranges)
+    except ValueError:
+        # same shift-jis problem as in open_xml
+        with path.open('rt', encoding='shift-jis') as stream:
+            return parse_string_table(stream, ranges)
+
+
+def open_xml(path: Path) -> ET.Element:
+    # ElementTree sometimes struggles with shift-jis
+    try:
+        tree = ET.parse(path)
+        root = tree.getroot()
+    except ValueError:
+        with path.open('rt', encoding='shift-jis') as stream:
+            root = ET.fromstring(stream.read())
+    return root
+
+
+def to_record(node: ET.Element) -> XMLRecord:
+    children = tuple(to_record(child) for child in node)
+    return XMLRecord(node.tag, dict(node.attrib), children)
+
+
+def read_records(path: Path, tag: Optional[str]) -> list:
+    '''read a data file into plain data
+
+    XML files become a list of XMLRecords, either every `tag` node or every
+    child of the root, and CSV files become a list of row dicts'''
+    if path.suffix == '.csv':
+        with path.open() as fp:
+            return list(csv.DictReader(fp))
+    root = open_xml(path)
+    nodes = root.iter(tag) if tag else root
+    return [to_record(node) for node in nodes]
+
+
+def load_order(stages: dict[str, LoadStage]) -> list[str]:
+    '''order stages so dependencies come first, keeping declaration order
+    where the dependencies allow it'''
+    for name, stage in stages.items():
+        for dep in stage.deps:
+            if dep not in stages:
+                raise ValueError(f'stage {name} depends on unknown {dep}')
+    order: list[str] = []
+    while len(order) < len(stages):
+        for name, stage in stages.items():
+            if name not in order and all(d in order for d in stage.deps):
+                order.append(name)
+                break
+        else:
+            raise ValueError('load stages have circular dependencies')
+    return order
+
+
+def find_file(path: Path) -> Path:
+    # switch rips yield case-sensitive files
+    # but steam rips are all-lowercase
+    if not path.exists():
+        path = Path(str(path).lower())
+    return path
+
+
+def xml_to_str(node: Union[ET.Element, XMLRecord]):
+    if isinstance(node, XMLRecord):
+        node = node.to_element()
     return ET.tostring(node, encoding='unicode').strip()
 
 
@@ -1106,12 +1844,16 @@ def unpack_type(type_, known, no_tags=False):
             if type_ not in known:
                 known[type_] = None
             return type_.__name__
+    elif isinstance(origin, type) and issubclass(origin, SectionAttribute):
+        return unpack_type(args[0], known, no_tags)
     elif origin == Union:
         return '(' + ' | '.join(unpack_type(i, known, no_tags)
                                 for i in args) + ')'
-    elif origin == list:
+    elif origin in (list, collections.abc.Sequence):
         assert len(args) == 1, args
         return f'{unpack_type(args[0], known, no_tags)}[]'
+    elif origin == tuple and len(args) == 2 and args[1] is Ellipsis:
+        return f'{unpack_type(args[0], known, no_tags)}[]'
     elif origin == dict:
         assert len(args) == 2, args
         # javascript can only use strings as object index
@@ -1133,6 +1875,9 @@ def create_typescript_interface(cls, known, no_tags=False):
         # do not serialize backrefs to the db
         if type_ == Database:
             continue
+        # or the lookup tables of the objects
+        if type_ == dict[str, TagRegistry]:
+            continue
         type_str = unpack_type(type_, known, no_tags)
         result += f'  {name}: {type_str};\n'
     result += '}\n'
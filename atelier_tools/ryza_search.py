@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import Counter
+from enum import IntEnum
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from .ryza_parser import TaggedObject
+
+
+class MatchRank(IntEnum):
+    # lower is better
+    EXACT_TAG = 0
+    EXACT_NAME = 1
+    PREFIX = 2
+    SUBSTRING = 3
+    DESCRIPTION = 4
+    FUZZY = 5
+
+
+class SearchMatch(NamedTuple):
+    rank: MatchRank
+    # only used for ordering fuzzy matches, higher is better
+    similarity: float
+    obj: TaggedObject
+
+
+# minimum trigram similarity for a fuzzy match
+FUZZY_THRESHOLD = 0.45
+
+
+def normalize_query(text: str) -> str:
+    return text.strip(' \r\t\u200b').upper()
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def padded_trigrams(text: str) -> set[str]:
+    # padding lets short words and word boundaries count in fuzzy matching
+    return trigrams(f'  {text} ')
+
+
+class TrigramIndex:
+    '''maps trigrams to the ids of the documents containing them'''
+    keys: list[str]
+    postings: dict[str, list[int]]
+    # number of distinct padded trigrams per document
+    sizes: list[int]
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys = list(keys)
+        self.postings = {}
+        self.sizes = []
+        for doc, key in enumerate(self.keys):
+            grams = padded_trigrams(key)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(doc)
+
+    def containing(self, query: str) -> list[int]:
+        '''ids of the documents with `query` as a substring, in order'''
+        grams = trigrams(query)
+        if not grams:
+            # too short for trigrams, fall back to a scan
+            return [
+                doc for doc, key in enumerate(self.keys) if query in key
+            ]
+        lists = sorted((self.postings.get(g, []) for g in grams), key=len)
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return [doc for doc in sorted(candidates) if query in self.keys[doc]]
+
+    def similar(self, query: str,
+                threshold: float = FUZZY_THRESHOLD) -> dict[int, float]:
+        '''trigram (dice) similarity of the documents close to `query`'''
+        grams = padded_trigrams(query)
+        shared: Counter[int] = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        result = {}
+        for doc, count in shared.items():
+            similarity = 2 * count / (len(grams) + self.sizes[doc])
+            if similarity >= threshold:
+                result[doc] = similarity
+        return result
+
+
+class SearchIndex:
+    '''ranked lookup of tagged objects by tag, name and description
+
+    documents keep the order they were given in, which decides between
+    matches of the same rank'''
+    docs: list[TaggedObject]
+    by_tag: dict[str, int]
+    by_name: dict[str, list[int]]
+    # sorted (key, doc) pairs of both names and tags for prefix lookups
+    prefixes: list[tuple[str, int]]
+    names: TrigramIndex
+    tags: TrigramIndex
+    _descriptions: Optional[TrigramIndex]
+
+    def __init__(self, objects: Iterable[TaggedObject]):
+        self.docs = list(objects)
+        self.by_tag = {}
+        self.by_name = {}
+        prefixes = []
+        names = []
+        for doc, obj in enumerate(self.docs):
+            name = normalize_query(obj.name)
+            names.append(name)
+            self.by_tag[obj.tag] = doc
+            self.by_name.setdefault(name, []).append(doc)
+            # categories are named like '(Fuel)', let 'fuel' match them too
+            bare = name.strip('()')
+            if bare != name:
+                self.by_name.setdefault(bare, []).append(doc)
+            prefixes.append((name, doc))
+            prefixes.append((obj.tag, doc))
+        self.prefixes = sorted(prefixes)
+        self.names = TrigramIndex(names)
+        self.tags = TrigramIndex(obj.tag for obj in self.docs)
+        # descriptions might not even be loaded yet, index them on first use
+        self._descriptions = None
+
+    @property
+    def descriptions(self) -> TrigramIndex:
+        if self._descriptions is None:
+            self._descriptions = TrigramIndex(
+                normalize_query(obj.description) for obj in self.docs)
+        return self._descriptions
+
+    def with_prefix(self, query: str) -> list[int]:
+        found = set()
+        for idx in range(bisect_left(self.prefixes, (query, -1)),
+                         len(self.prefixes)):
+            key, doc = self.prefixes[idx]
+            if not key.startswith(query):
+                break
+            found.add(doc)
+        return sorted(found)
+
+    def search(self,
+               query: str,
+               kinds: Optional[tuple[type, ...]] = None,
+               limit: Optional[int] = None,
+               loose: bool = True) -> list[SearchMatch]:
+        '''ranked matches for `query`
+
+        `kinds` restricts the results to instances of the given types.
+        Matches are ranked exact tag > exact name > prefix > substring, and
+        with `loose` also description substring and fuzzy (typo tolerant)
+        name matches are returned'''
+        query = normalize_query(query)
+        if not query:
+            return []
+        ranks: dict[int, tuple[MatchRank, float]] = {}
+
+        def add(docs: Iterable[int], rank: MatchRank, similarity=0.0):
+            for doc in docs:
+                if doc not in ranks:
+                    ranks[doc] = (rank, similarity)
+
+        if query in self.by_tag:
+            add([self.by_tag[query]], MatchRank.EXACT_TAG)
+        add(self.by_name.get(query, []), MatchRank.EXACT_NAME)
+        add(self.with_prefix(query), MatchRank.PREFIX)
+        add(self.names.containing(query), MatchRank.SUBSTRING)
+        add(self.tags.containing(query), MatchRank.SUBSTRING)
+        if loose:
+            add(self.descriptions.containing(query), MatchRank.DESCRIPTION)
+            similar = self.names.similar(query)
+            for doc in sorted(similar, key=lambda d: (-similar[d], d)):
+                add([doc], MatchRank.FUZZY, similar[doc])
+
+        order = sorted(ranks, key=lambda d: (ranks[d][0], -ranks[d][1], d))
+        matches = []
+        for doc in order:
+            obj = self.docs[doc]
+            if kinds and not isinstance(obj, kinds):
+                continue
+            rank, similarity = ranks[doc]
+            matches.append(SearchMatch(rank, similarity, obj))
+            if limit is not None and len(matches) >= limit:
+                break
+        return matches
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+import json
+import os
+import socket
+import socketserver
+import traceback
+
+from .ryza_chain_batch import chain_record
+from .ryza_chain_finder import ChainFinder, SearchMode
+from .ryza_parser import Category, Database, Item, json_dump_helper
+
+# larger limits are lowered to this, chain queries get slow with many chains
+MAX_LIMIT = 100
+
+
+class QueryError(Exception):
+    '''a request the service can not answer, with its HTTP status'''
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryService:
+    '''the queries of the serve command, on one Database kept in memory
+
+    the finder's graph is only read, so chain queries run on the request
+    threads in parallel. Its results cache is `cache_size` queries big'''
+    db: Database
+    finder: ChainFinder
+
+    def __init__(self, db: Database, cache_size: int = 256):
+        # lazy loading is not thread safe, load everything up front
+        db.ensure_loaded()
+        self.db = db
+        self.finder = ChainFinder(db, cache_size, landmarks=8)
+
+    def resolve(self, name: str) -> Union[Item, Category]:
+        item, cat = self.db.find_item_or_category(name.lower())
+        thing = item or cat
+        if not thing:
+            raise QueryError(404, f'{name} not found')
+        return thing
+
+    def items(self, names: list[str]) -> dict:
+        if not names:
+            items = list(self.db.items.values())
+        else:
+            seen = set()
+            items = []
+            for name in names:
+                for item in self.db.find_items(name.lower()):
+                    if item.tag not in seen:
+                        seen.add(item.tag)
+                        items.append(item)
+        return {'items': [json_dump_helper(item, True) for item in items]}
+
+    def category(self, name: str) -> dict:
+        cat = self.db.find_category(name.lower())
+        if not cat:
+            raise QueryError(404, f'{name} not found')
+        items = self.db.items.values()
+        return {
+            'tag': cat.tag,
+            'name': cat.name,
+            'items': [i.tag for i in items if cat in i.categories],
+            'possible_items':
+            [i.tag for i in items if cat in i.possible_categories],
+            # see the category command
+            'used_in': [i.tag for i in items if cat in i.ingredients],
+        }
+
+    def search(self, query: str, limit: int) -> dict:
+        matches = []
+        for match in self.db.search(query, limit=limit):
+            matches.append({
+                'rank': match.rank.name.lower(),
+                'kind': type(match.obj).__name__.lower(),
+                'tag': match.obj.tag,
+                'name': match.obj.name,
+            })
+        return {'matches': matches}
+
+    def chain(self,
+              sources: list[str],
+              targets: list[str],
+              limit: int,
+              mode: SearchMode = SearchMode.BREADTH_FIRST) -> dict:
+        source_tags = [self.resolve(name).tag for name in sources]
+        target_tags = [self.resolve(name).tag for name in targets]
+        chains = self.finder.find_paths(source_tags, target_tags, limit,
+                                        mode)
+        return {
+            'sources': sorted(set(source_tags)),
+            'targets': sorted(set(target_tags)),
+            'limit': limit,
+            'chains':
+            [chain_record(self.finder, chain.path) for chain in chains],
+        }
+
+    def handle(self, path: str, params: dict[str, list[str]]) -> dict:
+        '''answer a GET of `path`, with its query string `params`'''
+
+        def values(name: str) -> list[str]:
+            if not params.get(name):
+                raise QueryError(400, f'missing parameter: {name}')
+            return params[name]
+
+        def param(name: str) -> str:
+            return values(name)[0]
+
+        def int_param(name: str, default: int) -> int:
+            if name not in params:
+                return default
+            try:
+                return int(param(name))
+            except ValueError:
+                raise QueryError(400, f'not a number: {name}')
+
+        def limit_param(default: int) -> int:
+            limit = int_param('limit', default)
+            if limit < 1:
+                raise QueryError(400, 'limit has to be at least 1')
+            return min(limit, MAX_LIMIT)
+
+        def mode_param() -> SearchMode:
+            if 'bidirectional' in params:
+                return SearchMode.BIDIRECTIONAL
+            try:
+                return SearchMode(params.get('mode', ['bfs'])[0])
+            except ValueError:
+                raise QueryError(400, 'unknown search mode')
+
+        handlers: dict[str, Callable[[], dict]] = {
+            '/items':
+            lambda: self.items(params.get('q', [])),
+            '/category':
+            lambda: self.category(param('q')),
+            '/search':
+            lambda: self.search(param('q'), limit_param(20)),
+            '/chain':
+            lambda: self.chain(values('source'), values('target'),
+                               limit_param(10), mode_param()),
+        }
+        if path not in handlers:
+            raise QueryError(404, f'unknown query: {path}')
+        return handlers[path]()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    server: QueryServer
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = parse_qs(url.query, keep_blank_values=True)
+        try:
+            status, body = 200, self.server.service.handle(url.path, params)
+        except QueryError as e:
+            status, body = e.status, {'error': str(e)}
+        except Exception:
+            # keep serving, the details only go to the log
+            self.log_error('%s failed', self.path)
+            traceback.print_exc()
+            status, body = 500, {'error': 'internal error'}
+        data = json.dumps(body, default=json_dump_helper).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # unix socket clients have no address
+        return str(self.client_address[0]) if self.client_address else '-'
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    service: QueryService
+
+    def __init__(self, address: tuple[str, int], service: QueryService):
+        self.service = service
+        super().__init__(address, QueryHandler)
+
+
+class UnixQueryServer(QueryServer):
+    address_family = socket.AF_UNIX
+
+    def __init__(self, path: str, service: QueryService):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.service = service
+        ThreadingHTTPServer.__init__(self, path, QueryHandler)  # type: ignore
+
+    def server_bind(self) -> None:
+        # HTTPServer.server_bind expects a host and port
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def serve(service: QueryService,
+          host: str = '127.0.0.1',
+          port: int = 8377,
+          socket_path: Optional[str] = None) -> None:
+    server: QueryServer
+    if socket_path:
+        server = UnixQueryServer(socket_path, service)
+        print(f'Serving on {socket_path}')
+    else:
+        server = QueryServer((host, port), service)
+        print(f'Serving on http://{host}:{server.server_port}')
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable, Optional
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+from .ryza_parser import Database
+
+# bump this when the pickled layout of Database changes in a way the
+# source fingerprint would not catch
+SNAPSHOT_VERSION = 1
+# the modules deciding what a parsed Database contains
+SNAPSHOT_SOURCES = ('ryza_parser.py', 'ryza_strings.py', 'ryza_search.py')
+# temporary snapshot files older than this are left over from interrupted
+# writes, younger ones may still be written by another process
+STALE_TMP_SECONDS = 3600
+
+
+def cache_dir(game: str) -> Path:
+    return Path(f'game_files/{game}/cache')
+
+
+def fingerprint(game: str,
+                lang: str,
+                sources: Iterable[str] = SNAPSHOT_SOURCES,
+                hash_inputs: bool = False) -> str:
+    '''hash of everything a Database snapshot depends on
+
+    the game files are only stat()-ed, unless `hash_inputs` is set: then
+    their contents are hashed instead, which is slow but survives copies
+    and touched files. Of the package only the `sources` modules count,
+    their contents are always hashed'''
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{SNAPSHOT_VERSION}:{game}:{lang}:{hash_inputs}\n'.encode())
+    package = Path(__file__).parent
+    for path in [package / name for name in sources]:
+        digest.update(f'{path.name}\n'.encode())
+        digest.update(path.read_bytes())
+    for path in Database.input_paths(game, lang):
+        digest.update(f'{path.name}\n'.encode())
+        if not path.exists():
+            # optional files, like ryza 1's missing forge tables
+            digest.update(b'missing\n')
+            continue
+        if not hash_inputs:
+            stat = path.stat()
+            digest.update(f'{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+            continue
+        with path.open('rb') as fp:
+            while chunk := fp.read(1 << 20):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_path(game: str, lang: str, hash_inputs: bool = False) -> Path:
+    '''`<lang>-<key>.pickle`, or `<lang>-hashed-<key>.pickle` with
+    `hash_inputs`, so the two kinds of snapshot do not replace each other'''
+    key = fingerprint(game, lang, hash_inputs=hash_inputs)
+    kind = f'{lang}-hashed' if hash_inputs else lang
+    return cache_dir(game) / f'{kind}-{key}.pickle'
+
+
+def snapshot_kind(path: Path) -> str:
+    return path.name.rsplit('-', 1)[0]
+
+
+def load_snapshot(path: Path) -> Optional[Database]:
+    try:
+        with path.open('rb') as fp:
+            db = pickle.load(fp)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # a broken snapshot is just a cache miss
+        print(f'WARNING: ignoring unreadable snapshot {path}: {e}')
+        return None
+    if not isinstance(db, Database):
+        return None
+    return db
+
+
+def save_snapshot(db: Database, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # snapshots of older inputs are never valid again, another process
+    # may be removing them at the same time
+    kind = snapshot_kind(path)
+    for old in path.parent.glob(f'{kind}-*.pickle'):
+        if snapshot_kind(old) == kind:
+            old.unlink(missing_ok=True)
+    for tmp in path.parent.glob(f'{db.lang}-*.tmp'):
+        try:
+            if time.time() - tmp.stat().st_mtime > STALE_TMP_SECONDS:
+                tmp.unlink()
+        except FileNotFoundError:
+            pass
+    # write to a temporary file of our own first, so neither a concurrent
+    # reader nor a concurrent writer ever sees half of a snapshot
+    with tempfile.NamedTemporaryFile(dir=path.parent,
+                                     prefix=f'{db.lang}-',
+                                     suffix='.tmp',
+                                     delete=False) as fp:
+        try:
+            pickle.dump(db, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            fp.close()
+            os.unlink(fp.name)
+            raise
+    os.replace(fp.name, path)
+
+
+def load_database(game: str,
+                  lang: str = 'en',
+                  use_cache: bool = True,
+                  jobs: Optional[int] = None,
+                  lazy: bool = False,
+                  hash_inputs: bool = False) -> Database:
+    '''load a Database, from a compiled snapshot if the inputs match
+
+    a `lazy` database is never saved as a snapshot, but an existing snapshot
+    is still used. See fingerprint for `hash_inputs`'''
+    if not use_cache:
+        return Database(game, lang=lang, jobs=jobs, lazy=lazy)
+    path = snapshot_path(game, lang, hash_inputs)
+    db = load_snapshot(path)
+    if db is None and lazy:
+        return Database(game, lang=lang, jobs=jobs, lazy=lazy)
+    if db is None:
+        db = Database(game, lang=lang, jobs=jobs)
+        try:
+            save_snapshot(db, path)
+        except OSError as e:
+            print(f'WARNING: could not save snapshot {path}: {e}')
+    return db
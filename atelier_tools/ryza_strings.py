@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Iterator, Literal, Optional, Sequence, Union
+import mmap
+import struct
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+# struct formats of the id, offset and length arrays
+ArrayFormat = Literal['q', 'I', 'i']
+
+MAGIC = b'RYZASTR1'
+# block count, entry count, text size, and 1 to check the byte order
+HEADER = struct.Struct('=qqqq')
+
+
+class StringTable:
+    '''read-only string table for blocks of consecutive ids
+
+    the game's string ids come in dense blocks (names, descriptions, ...),
+    so instead of a dict every block gets a slice of the offset and length
+    arrays into one UTF-8 buffer. Strings are only decoded when looked up.
+    `get`, `[]` and `in` work like on the dict it replaces'''
+    # first id and one past the last id of each block
+    starts: Sequence[int]
+    stops: Sequence[int]
+    # index of each block's first entry in offsets and lengths
+    bases: Sequence[int]
+    offsets: Sequence[int]
+    # -1 marks ids without a string
+    lengths: Sequence[int]
+    text: Buffer
+
+    def __init__(self, starts: Sequence[int], stops: Sequence[int],
+                 bases: Sequence[int], offsets: Sequence[int],
+                 lengths: Sequence[int], text: Buffer):
+        self.starts = starts
+        self.stops = stops
+        self.bases = bases
+        self.offsets = offsets
+        self.lengths = lengths
+        self.text = text
+
+    @classmethod
+    def from_dict(cls, strings: dict[int, str],
+                  blocks: Sequence[range]) -> StringTable:
+        '''pack `strings` into sorted, non-overlapping `blocks`'''
+        starts = array('q')
+        stops = array('q')
+        bases = array('q')
+        offsets = array('I')
+        lengths = array('i')
+        text = bytearray()
+        for block in blocks:
+            starts.append(block.start)
+            stops.append(block.stop)
+            bases.append(len(offsets))
+            for num in block:
+                value = strings.get(num)
+                offsets.append(len(text))
+                if value is None:
+                    lengths.append(-1)
+                    continue
+                encoded = value.encode()
+                lengths.append(len(encoded))
+                text += encoded
+        return cls(starts, stops, bases, offsets, lengths, bytes(text))
+
+    @classmethod
+    def from_buffer(cls, buffer: Buffer) -> StringTable:
+        '''a table over the output of to_bytes, without copying it'''
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError('not a string table')
+        pos = len(MAGIC)
+        n_blocks, n_entries, text_size, one = HEADER.unpack_from(view, pos)
+        if one != 1:
+            raise ValueError('string table of another byte order')
+        pos += HEADER.size
+
+        def take(fmt: ArrayFormat, count: int) -> memoryview:
+            nonlocal pos
+            size = count * struct.calcsize(fmt)
+            part = view[pos:pos + size].cast(fmt)
+            pos += size
+            return part
+
+        starts = take('q', n_blocks)
+        stops = take('q', n_blocks)
+        bases = take('q', n_blocks)
+        offsets = take('I', n_entries)
+        lengths = take('i', n_entries)
+        text = view[pos:pos + text_size]
+        return cls(starts, stops, bases, offsets, lengths, text)
+
+    @classmethod
+    def open(cls, path: Path) -> StringTable:
+        '''memory map a table written by save'''
+        with path.open('rb') as fp:
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(mapped)
+
+    def to_bytes(self) -> bytes:
+        # the arrays are 8 byte aligned first, then 4 byte aligned ones
+        parts = [
+            MAGIC,
+            HEADER.pack(len(self.starts), len(self.offsets), len(self.text),
+                        1),
+        ]
+        for values, fmt in ((self.starts, 'q'), (self.stops, 'q'),
+                            (self.bases, 'q'), (self.offsets, 'I'),
+                            (self.lengths, 'i')):
+            parts.append(array(fmt, values).tobytes())
+        parts.append(bytes(self.text))
+        return b''.join(parts)
+
+    def save(self, path: Path) -> None:
+        path.write_bytes(self.to_bytes())
+
+    def __reduce__(self):
+        # memory views and maps do not pickle
+        return (StringTable.from_buffer, (self.to_bytes(), ))
+
+    def entry(self, num: int) -> int:
+        '''index of `num` in offsets and lengths, -1 if it has no string'''
+        block = bisect_right(self.starts, num) - 1
+        if block < 0 or num >= self.stops[block]:
+            return -1
+        idx = self.bases[block] + num - self.starts[block]
+        if self.lengths[idx] < 0:
+            return -1
+        return idx
+
+    def get(self, num: int, default: Optional[str] = None) -> Optional[str]:
+        idx = self.entry(num)
+        if idx < 0:
+            return default
+        offset = self.offsets[idx]
+        return str(self.text[offset:offset + self.lengths[idx]], 'utf-8')
+
+    def __getitem__(self, num: int) -> str:
+        value = self.get(num)
+        if value is None:
+            raise KeyError(num)
+        return value
+
+    def __contains__(self, num: object) -> bool:
+        return isinstance(num, int) and self.entry(num) >= 0
+
+    def __iter__(self) -> Iterator[int]:
+        for start, stop, base in zip(self.starts, self.stops, self.bases):
+            for num in range(start, stop):
+                if self.lengths[base + num - start] >= 0:
+                    yield num
+
+    def __len__(self) -> int:
+        return sum(1 for length in self.lengths if length >= 0)
+
+    def items(self) -> Iterator[tuple[int, str]]:
+        for num in self:
+            yield num, self[num]
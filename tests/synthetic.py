@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from typing import Optional
+import random
+
+from atelier_tools.ryza_parser import (Category, Database, Effect,
+                                       EffectSpec, Element, Item, TagRegistry)
+
+
+class ItemSpec:
+    '''an item of a synthetic Database, other items and categories by tag'''
+
+    def __init__(self,
+                 level: int = 1,
+                 price: int = 10,
+                 categories: tuple[str, ...] = (),
+                 possible_categories: tuple[str, ...] = (),
+                 ingredients: tuple[str, ...] = (),
+                 children: tuple[str, ...] = (),
+                 ev_base: Optional[str] = None,
+                 elements: tuple[Element, ...] = (),
+                 effects: tuple[str, ...] = (),
+                 name: Optional[str] = None):
+        self.level = level
+        self.price = price
+        self.categories = categories
+        self.possible_categories = possible_categories
+        self.ingredients = ingredients
+        self.children = children
+        self.ev_base = ev_base
+        self.elements = elements
+        self.effects = effects
+        self.name = name
+
+
+def make_database(items: dict[str, ItemSpec],
+                  categories: list[str],
+                  effects: tuple[str, ...] = (),
+                  dlc: tuple[str, ...] = ()) -> Database:
+    '''a fully loaded Database without any game files'''
+    db = Database.__new__(Database)
+    db._unloaded = set()
+    db._loading = []
+    db._search_indexes = {}
+    db._effect_indexes = {}
+    db._overlays = {}
+    db._dlc_tags = frozenset(dlc)
+    db.game = 'ryza2'
+    db.lang = 'en'
+    db.elements = {elem: elem.value for elem in Element}
+    db.ring_types = {}
+    db.potentials = {}
+    db.ev_effects = {}
+    db.categories = {
+        tag: Category(db, idx, tag, f'({tag.title()})', 1000 + idx)
+        for idx, tag in enumerate(categories)
+    }
+    db.effects = {
+        tag: Effect(db, idx, tag, tag.title(), 2000 + idx)
+        for idx, tag in enumerate(effects)
+    }
+    db.items = {}
+    for idx, tag in enumerate(items):
+        item = Item(db, idx, tag, items[tag].name or tag.title(), idx)
+        item.post_init()
+        db.items[tag] = item
+    for tag, spec in items.items():
+        item = db.items[tag]
+        item.level = spec.level
+        item.price = spec.price
+        item.categories = [db.categories[cat] for cat in spec.categories]
+        item.possible_categories = [
+            db.categories[cat] for cat in spec.possible_categories
+        ]
+        item.ingredients = [
+            db.items.get(ing) or db.categories[ing] for ing in spec.ingredients
+        ]
+        item.children = [db.items[child] for child in spec.children]
+        for child in item.children:
+            child.parents.append(item)
+        if spec.ev_base:
+            item.ev_base = db.items[spec.ev_base]
+        item.elements = list(spec.elements)
+        item.possible_elements = {elem: elem.value for elem in spec.elements}
+        item.effects = [{
+            0: EffectSpec(db.effects[effect], False)
+        } for effect in spec.effects]
+    db.registry = {
+        'items': TagRegistry(db.items),
+        'categories': TagRegistry(db.categories),
+        'effects': TagRegistry(db.effects),
+        'potentials': TagRegistry(db.potentials),
+        'ev_effects': TagRegistry(db.ev_effects),
+    }
+    db.compact()
+    return db
+
+
+def random_database(seed: int,
+                    n_items: int = 9,
+                    n_categories: int = 3) -> Database:
+    '''a small random crafting graph, sparse enough to enumerate every
+    chain of it'''
+    rng = random.Random(seed)
+    tags = [f'ITEM_{n}' for n in range(n_items)]
+    categories = [f'CAT_{n}' for n in range(n_categories)]
+    effects = ('EFF_HOT', 'EFF_COLD', 'EFF_HEAVY')
+    items = {}
+    for tag in tags:
+        others = [other for other in tags if other != tag]
+        items[tag] = ItemSpec(
+            level=rng.randint(1, 30),
+            price=rng.randint(1, 500),
+            categories=tuple(rng.sample(categories, rng.randint(0, 1))),
+            possible_categories=tuple(
+                rng.sample(categories, rng.randint(0, 1))),
+            ingredients=tuple(
+                rng.sample(others + categories, rng.randint(0, 2))),
+            children=tuple(rng.sample(others, rng.randint(0, 1)))
+            if rng.random() < 0.3 else (),
+            ev_base=rng.choice(others) if rng.random() < 0.15 else None,
+            elements=tuple(rng.sample(list(Element), rng.randint(0, 2))),
+            effects=tuple(rng.sample(effects, rng.randint(0, 2))))
+    return make_database(items, categories, effects)
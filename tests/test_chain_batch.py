@@ -0,0 +1,87 @@
+import io
+import json
+import threading
+import unittest
+
+from atelier_tools.ryza_chain_batch import (BatchError, BatchQuery,
+                                            read_queries, run_batch)
+from atelier_tools.ryza_chain_finder import ChainFinder
+
+from .synthetic import random_database
+
+QUERIES = '''# source, target, limit
+item_0\titem_8
+item_1\tcat_0\t3
+
+item_2\tnothing
+item_3
+item_4\titem_5\tmany
+item_6\titem_7\t2
+'''
+
+
+def results(text: str) -> dict[int, dict]:
+    return {
+        record['line']: record
+        for record in map(json.loads, text.splitlines())
+    }
+
+
+class ChainBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.finder = ChainFinder(random_database(8))
+
+    def test_read_queries(self):
+        self.assertEqual(list(read_queries(io.StringIO(QUERIES), 5)), [
+            BatchQuery(2, 'item_0', 'item_8', 5),
+            BatchQuery(3, 'item_1', 'cat_0', 3),
+            BatchQuery(5, 'item_2', 'nothing', 5),
+            BatchError(6, 'expected source, target and optionally a limit, '
+                       'separated by tabs'),
+            BatchError(7, 'limit is not a number: many'),
+            BatchQuery(8, 'item_6', 'item_7', 2),
+        ])
+
+    def run_batch(self, jobs: int) -> tuple[int, dict[int, dict]]:
+        out = io.StringIO()
+        failed = run_batch(self.finder, read_queries(io.StringIO(QUERIES), 5),
+                           out, jobs)
+        return failed, results(out.getvalue())
+
+    def test_results(self):
+        failed, records = self.run_batch(1)
+        self.assertEqual(failed, 3)
+        self.assertEqual(sorted(records), [2, 3, 5, 6, 7, 8])
+        self.assertEqual(records[5]['error'], 'nothing not found')
+        self.assertIn('error', records[6])
+        self.assertIn('error', records[7])
+        chains = self.finder.find_paths('ITEM_1', 'CAT_0', 3)
+        self.assertEqual(
+            [chain['tags'] for chain in records[3]['chains']],
+            [[self.finder.tags[node] for node in chain.path]
+             for chain in chains])
+        self.assertEqual([chain['cost'] for chain in records[3]['chains']],
+                         [chain.cost for chain in chains])
+
+    def test_jobs(self):
+        self.assertEqual(self.run_batch(2), self.run_batch(1))
+
+    def test_streams_results(self):
+        # the first result is written before the input ends
+        out = io.StringIO()
+        answered = threading.Event()
+
+        class Out(io.StringIO):
+
+            def write(self, text: str) -> int:
+                answered.set()
+                return out.write(text)
+
+        def queries():
+            yield BatchQuery(1, 'item_0', 'item_8', 5)
+            self.assertTrue(answered.wait(30))
+            yield BatchQuery(2, 'item_1', 'cat_0', 5)
+
+        self.assertEqual(run_batch(self.finder, queries(), Out(), 2), 0)
+        self.assertEqual(sorted(results(out.getvalue())), [1, 2])
@@ -0,0 +1,215 @@
+import unittest
+
+from atelier_tools.ryza_chain_finder import (ChainConstraints, ChainFinder,
+                                             ChainQuery, NodePath, SearchMode)
+from atelier_tools.ryza_parser import Element
+
+from .synthetic import ItemSpec, make_database, random_database
+
+# (starts, targets) of the random graph queries
+ENDS = [
+    (['ITEM_0'], ['ITEM_8']),
+    (['ITEM_1', 'ITEM_2'], ['ITEM_5', 'CAT_0']),
+    (['CAT_1'], ['ITEM_3', 'ITEM_4']),
+    (['ITEM_6'], ['ITEM_6', 'ITEM_7']),
+]
+CONSTRAINTS = [
+    ChainConstraints(),
+    ChainConstraints(excluded=frozenset({'ITEM_4', 'CAT_2'})),
+    ChainConstraints(max_level=20, no_morphs=True),
+    ChainConstraints(no_ev_links=True, no_dlc=True),
+    ChainConstraints(carry_elements=frozenset({Element.FIRE})),
+]
+SEEDS = range(10)
+
+
+def step_costs(query: ChainQuery, node: int) -> dict[int, int]:
+    '''the cheapest step from `node` to each of its neighbours'''
+    costs: dict[int, int] = {}
+    for b, cost in query.neighbours(node):
+        costs[b] = min(cost, costs.get(b, cost))
+    return costs
+
+
+def search_cost(query: ChainQuery, path: NodePath) -> int:
+    return sum(step_costs(query, a)[b] for a, b in zip(path, path[1:]))
+
+
+def all_chains(query: ChainQuery) -> list[tuple[int, NodePath]]:
+    '''every chain of `query` with its cost, by trying every simple path'''
+    masked = query.masks.nodes
+    found = []
+    path: list[int] = []
+
+    def visit(node: int, cost: int) -> None:
+        for b, step in step_costs(query, node).items():
+            if b == query.sink:
+                found.append((cost + step, tuple(path)))
+            elif not masked[b] and b not in path:
+                path.append(b)
+                visit(b, cost + step)
+                path.pop()
+
+    visit(query.source, 0)
+    return sorted(found)
+
+
+class ChainSearchTest(unittest.TestCase):
+
+    def check_query(self, query: ChainQuery):
+        expected = all_chains(query)
+        paths = list(query.paths(None))
+        self.assertEqual(len(set(paths)), len(paths))
+        self.assertEqual(sorted(paths), sorted(path for _, path in expected))
+        costs = [search_cost(query, path) for path in paths]
+        self.assertEqual(costs, [cost for cost, _ in expected])
+
+    def test_all_chains(self):
+        for seed in SEEDS:
+            finder = ChainFinder(random_database(seed), landmarks=3)
+            for starts, targets in ENDS:
+                for mode in SearchMode:
+                    with self.subTest(seed=seed,
+                                      starts=starts,
+                                      targets=targets,
+                                      mode=mode):
+                        self.check_query(finder.query(starts, targets, mode))
+
+    def test_constraints(self):
+        for seed in SEEDS:
+            finder = ChainFinder(random_database(seed), landmarks=3)
+            for constraints in CONSTRAINTS:
+                for mode in SearchMode:
+                    with self.subTest(seed=seed,
+                                      constraints=constraints,
+                                      mode=mode):
+                        self.check_query(
+                            finder.query(['ITEM_0', 'ITEM_1'],
+                                         ['ITEM_7', 'CAT_0'], mode,
+                                         constraints))
+
+    def test_constraints_hold(self):
+        constraints = ChainConstraints(excluded=frozenset({'ITEM_4'}),
+                                       max_level=20)
+        for seed in SEEDS:
+            db = random_database(seed)
+            finder = ChainFinder(db)
+            starts, targets = ['ITEM_0'], ['ITEM_7', 'ITEM_8']
+            for chain in finder.find_paths(starts, targets, 20,
+                                           constraints=constraints):
+                for node in chain.path[1:-1]:
+                    item = db.items.get(finder.tags[node])
+                    self.assertNotEqual(finder.tags[node], 'ITEM_4')
+                    if item:
+                        self.assertLessEqual(item.level, 20)
+
+    def test_limits(self):
+        for seed in SEEDS:
+            finder = ChainFinder(random_database(seed), landmarks=3)
+            for mode in SearchMode:
+                query = finder.query(['ITEM_1', 'ITEM_2'], ['ITEM_5'], mode)
+                costs = [cost for cost, _ in all_chains(query)]
+                for limit in (1, 3):
+                    query = finder.query(['ITEM_1', 'ITEM_2'], ['ITEM_5'],
+                                         mode)
+                    with self.subTest(seed=seed, mode=mode, limit=limit):
+                        paths = list(query.paths(limit))
+                        self.assertEqual(
+                            [search_cost(query, path) for path in paths],
+                            costs[:limit])
+
+    def test_find_paths(self):
+        for seed in SEEDS:
+            db = random_database(seed)
+            finder = ChainFinder(db)
+            starts, targets = ['ITEM_0', 'ITEM_3'], ['ITEM_8', 'CAT_2']
+            constraints = ChainConstraints(no_morphs=True)
+            query = finder.query(starts, targets, constraints=constraints)
+            # asking for more resumes the cached search
+            finder.find_paths(starts, targets, 2, constraints=constraints)
+            chains = finder.find_paths(starts, targets, 6,
+                                       constraints=constraints)
+            fresh = ChainFinder(db).find_paths(starts, targets, 6,
+                                               constraints=constraints)
+            self.assertEqual(chains, fresh)
+            for chain in chains:
+                self.assertEqual(chain.start, finder.tags[chain.path[0]])
+                self.assertEqual(chain.target, finder.tags[chain.path[-1]])
+                self.assertEqual(chain.cost, search_cost(query, chain.path))
+
+    def test_spur_pool(self):
+        for seed in SEEDS[:3]:
+            finder = ChainFinder(random_database(seed), landmarks=3)
+            expected = {
+                mode: list(finder.query(['ITEM_0'], ['ITEM_8'], mode).paths(
+                    None))
+                for mode in SearchMode
+            }
+            finder.start_spur_pool(2)
+            try:
+                for mode in SearchMode:
+                    with self.subTest(seed=seed, mode=mode):
+                        query = finder.query(['ITEM_0'], ['ITEM_8'], mode)
+                        self.assertEqual(list(query.paths(None)),
+                                         expected[mode])
+            finally:
+                finder.close()
+
+    def test_stream(self):
+        finder = ChainFinder(random_database(2))
+        starts, targets = ['ITEM_1', 'ITEM_2'], ['ITEM_5', 'CAT_0']
+        chains = finder.find_paths(starts, targets, 5)
+        self.assertEqual(
+            finder.stream_paths(starts, targets, 5).run(), (chains, False))
+        cut, cut_short = finder.stream_paths(starts, targets, 5,
+                                             budget=1).run()
+        self.assertTrue(cut_short)
+        self.assertEqual(cut, chains[:len(cut)])
+
+
+class HandMadeGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        # ORE -> INGOT -> SWORD, ORE -(metal)-> SWORD, SWORD morphs into
+        # GREATSWORD, GREATSWORD EV-links to HOLY_SWORD
+        items = {
+            'ORE': ItemSpec(categories=('METAL', )),
+            'INGOT': ItemSpec(ingredients=('ORE', ), level=10),
+            'SWORD': ItemSpec(ingredients=('INGOT', 'METAL'),
+                              children=('GREATSWORD', )),
+            'GREATSWORD': ItemSpec(level=40),
+            'HOLY_SWORD': ItemSpec(ev_base='GREATSWORD'),
+        }
+        self.finder = ChainFinder(make_database(items, ['METAL']),
+                                  landmarks=2)
+
+    def chains(self, start: str, target: str, **kwargs) -> list[tuple]:
+        return [(tuple(self.finder.tags[node] for node in chain.path),
+                 chain.cost)
+                for chain in self.finder.find_paths(start, target, **kwargs)]
+
+    def test_chains(self):
+        expected = [
+            (('ORE', 'SWORD', 'GREATSWORD', 'HOLY_SWORD'), 3),
+            (('ORE', 'INGOT', 'SWORD', 'GREATSWORD', 'HOLY_SWORD'), 4),
+        ]
+        for mode in SearchMode:
+            self.assertEqual(self.chains('ORE', 'HOLY_SWORD', mode=mode),
+                             expected)
+
+    def test_category_target(self):
+        self.assertEqual(self.chains('INGOT', 'METAL'), [])
+        self.assertEqual(self.chains('ORE', 'METAL'), [(('ORE', 'METAL'), 0)])
+
+    def test_constraints(self):
+        self.assertEqual(
+            self.chains('ORE', 'HOLY_SWORD',
+                        constraints=ChainConstraints(no_ev_links=True)), [])
+        self.assertEqual(
+            self.chains('ORE', 'SWORD',
+                        constraints=ChainConstraints(
+                            excluded=frozenset({'METAL'}))),
+            [(('ORE', 'INGOT', 'SWORD'), 2)])
+        self.assertEqual(
+            self.chains('ORE', 'HOLY_SWORD',
+                        constraints=ChainConstraints(max_level=30)), [])
@@ -0,0 +1,61 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+from atelier_tools.ryza_chain_finder import ChainFinder
+from atelier_tools.ryza_chain_oracle import DistanceOracle
+
+from .synthetic import random_database
+
+SEEDS = range(6)
+
+
+class DistanceOracleTest(unittest.TestCase):
+
+    def test_first_chains(self):
+        for seed in SEEDS:
+            finder = ChainFinder(random_database(seed))
+            oracle = DistanceOracle.build(finder)
+            for start in finder.tags:
+                for target in finder.tags:
+                    if start == target:
+                        continue
+                    with self.subTest(seed=seed, start=start, target=target):
+                        chains = finder.find_paths(start, target, 1)
+                        if not chains:
+                            self.assertIsNone(oracle.distance(start, target))
+                            self.assertEqual(oracle.path(start, target), ())
+                            continue
+                        chain = chains[0]
+                        self.assertEqual(oracle.distance(start, target),
+                                         chain.cost)
+                        self.assertEqual(
+                            oracle.path(start, target),
+                            tuple(finder.tags[node] for node in chain.path))
+
+    def test_within(self):
+        finder = ChainFinder(random_database(4))
+        oracle = DistanceOracle.build(finder)
+        dists = {tag: oracle.distance('ITEM_0', tag) for tag in finder.tags}
+        for steps in range(4):
+            self.assertEqual(
+                oracle.within('ITEM_0', steps),
+                sorted((dist, tag) for tag, dist in dists.items()
+                       if dist is not None and dist <= steps))
+        self.assertIn((0, 'ITEM_0'), oracle.within('ITEM_0', 0))
+
+    def test_save_and_load(self):
+        oracle = DistanceOracle.build(ChainFinder(random_database(1)))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'distances.bin'
+            oracle.save(path)
+            loaded = DistanceOracle.load(path)
+            self.assertEqual(loaded.tags, oracle.tags)
+            self.assertEqual(loaded.dists, oracle.dists)
+            self.assertEqual(loaded.preds, oracle.preds)
+            path.write_bytes(path.read_bytes()[:-10])
+            with self.assertRaises(ValueError):
+                DistanceOracle.load(path)
+            path.write_bytes(b'not a table')
+            with self.assertRaises(ValueError):
+                DistanceOracle.load(path)
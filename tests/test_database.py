@@ -0,0 +1,225 @@
+from dataclasses import fields, is_dataclass
+from pathlib import Path
+from unittest import mock
+import io
+import json
+import os
+import unittest
+
+from atelier_tools.ryza_parser import (LOAD_STAGES, Database, Element,
+                                       Item, LoadStage, SectionAttribute)
+
+# a few items, categories and effects in the game's file formats
+FIXTURE_DIR = Path(__file__).parent
+_cwd = os.getcwd()
+
+
+def setUpModule():
+    # Database reads game_files/ relative to the working directory, lazy
+    # ones whenever they load a stage
+    global _cwd
+    _cwd = os.getcwd()
+    os.chdir(FIXTURE_DIR)
+
+
+def tearDownModule():
+    os.chdir(_cwd)
+
+
+def load(**kwargs) -> Database:
+    return Database('ryza2', **kwargs)
+
+
+def plain(value):
+    '''`value` with objects as their tags, to compare databases'''
+    if hasattr(value, 'tag'):
+        return value.tag
+    if isinstance(value, Element):
+        return value.value
+    if isinstance(value, dict):
+        return {plain(key): plain(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(val) for val in value]
+    if is_dataclass(value):
+        return {
+            field.name: plain(getattr(value, field.name))
+            for field in fields(value)
+        }
+    return value
+
+
+def dump(db: Database) -> dict:
+    fp = io.StringIO()
+    db.dump(fp)
+    return json.loads(fp.getvalue())
+
+
+class LoadTest(unittest.TestCase):
+
+    def test_objects(self):
+        db = load()
+        self.assertEqual(list(db.items), [
+            'ITEM_MAT_ORE', 'ITEM_MIX_INGOT', 'ITEM_MIX_SWORD',
+            'ITEM_MIX_GREATSWORD'
+        ])
+        ore, ingot, sword, greatsword = db.items.values()
+        metal = db.categories['ITEM_CATEGORY_METAL']
+        self.assertEqual((ingot.name, ingot.level, ingot.price),
+                         ('Ingot', 8, 40))
+        self.assertEqual(ore.description, 'A lump of metal.')
+        self.assertEqual(ingot.description, '')
+        self.assertEqual(list(greatsword.categories),
+                         [db.categories['ITEM_CATEGORY_WEAPON'], metal])
+        self.assertEqual(list(ingot.ingredients), [ore, metal])
+        self.assertEqual(list(ingot.essential_ingredients), [ore])
+        self.assertEqual(list(sword.children), [greatsword])
+        self.assertEqual(list(greatsword.parents), [sword])
+        self.assertEqual(ingot.recipe.make_num, 2)
+        self.assertEqual(
+            [{level: spec.effect.tag
+              for level, spec in group.items()} for group in ingot.effects],
+            [{0: 'ITEM_EFF_SHARP', 1: 'ITEM_EFF_ADD_FIRE'},
+             {-1: 'ITEM_EFF_HEAVY'}])
+        # item_status effects of items without a recipe
+        self.assertEqual(
+            [group[-1].effect.tag for group in greatsword.effects],
+            ['ITEM_EFF_HEAVY', 'ITEM_EFF_SHARP'])
+        self.assertEqual([pot.tag for pot in ore.fixed_potentials],
+                         ['ITEM_POTENTIAL_000'])
+        self.assertEqual(len(ingot.forge_effects), 2)
+        self.assertEqual(ore.gathering, 'Old Mine')
+        self.assertEqual(db.effects['ITEM_EFF_HEAVY'].int_value, 2)
+        self.assertEqual(db.ring_types, {0: ('Effect', 'Adds an effect.')})
+
+    def test_pool_matches_serial(self):
+        self.assertEqual(dump(load(jobs=2)), dump(load()))
+
+
+class LazyLoadTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.eager = load()
+
+    def test_first_access(self):
+        attrs = [
+            name for name, attr in vars(Item).items()
+            if isinstance(attr, SectionAttribute)
+        ]
+        for name in attrs:
+            with self.subTest(attr=name):
+                db = load(lazy=True)
+                sections = vars(Item)[name].sections
+                self.assertTrue(
+                    any(section in db._unloaded for section in sections))
+                self.assertEqual(
+                    [plain(getattr(item, name)) for item in db.items.values()],
+                    [plain(getattr(item, name))
+                     for item in self.eager.items.values()])
+                for section in sections:
+                    self.assertNotIn(section, db._unloaded)
+        db = load(lazy=True)
+        self.assertEqual(db.elements, self.eager.elements)
+        self.assertEqual(db.ring_types, self.eager.ring_types)
+
+    def test_loads_only_what_is_read(self):
+        db = load(lazy=True)
+        self.assertEqual(db.items['ITEM_MAT_ORE'].gathering, 'Old Mine')
+        self.assertNotIn('gathering', db._unloaded)
+        self.assertIn('mixfield', db._unloaded)
+        self.assertIn('forge_effects', db._unloaded)
+        db.ensure_loaded()
+        self.assertFalse(db._unloaded)
+        # the reader is dropped and the data compacted, as in eager loads
+        self.assertFalse(hasattr(db, 'reader'))
+        self.assertIsInstance(db.items['ITEM_MIX_SWORD'].children, tuple)
+        self.assertEqual(dump(db), dump(self.eager))
+
+    def test_undeclared_read(self):
+        def parse_probe(db):
+            # mixfield is neither a dependency nor filled in here
+            db.items['ITEM_MIX_SWORD'].children
+
+        db = load(lazy=True)
+        probe = LoadStage('parse_probe', lazy=True)
+        with mock.patch.dict(LOAD_STAGES, probe=probe), mock.patch.object(
+                Database, 'parse_probe', parse_probe, create=True):
+            with self.assertRaisesRegex(RuntimeError, 'stage probe reads'):
+                db.load_stage('probe')
+            # reading it outside of a stage still works
+            self.assertEqual(
+                [child.tag for child in db.items['ITEM_MIX_SWORD'].children],
+                ['ITEM_MIX_GREATSWORD'])
+
+
+class LanguageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = load()
+        self.ore = self.db.items['ITEM_MAT_ORE']
+        self.sword = self.db.items['ITEM_MIX_SWORD']
+
+    def check_english(self):
+        self.assertEqual(self.db.active_language(), 'en')
+        self.assertEqual(self.sword.name, 'Sword')
+        self.assertEqual(self.sword.description, 'A plain sword.')
+        self.assertEqual(self.ore.description, 'A lump of metal.')
+        self.assertEqual(self.db.categories['ITEM_CATEGORY_METAL'].name,
+                         '(Metal)')
+        self.assertEqual(self.db.elements[Element.AIR], 'Wind')
+
+    def check_japanese(self):
+        self.assertEqual(self.db.active_language(), 'jp')
+        self.assertEqual(self.sword.name, '剣')
+        self.assertEqual(self.sword.description, '普通の剣。')
+        self.assertEqual(self.db.categories['ITEM_CATEGORY_METAL'].name,
+                         '（金属）')
+        self.assertEqual(self.db.effects['ITEM_EFF_HEAVY'].description,
+                         '持ち上げにくい。')
+        self.assertEqual(self.db.elements[Element.AIR], '風')
+        self.assertEqual(self.db.ring_types, {0: ('効果', '効果を追加する。')})
+        # untranslated names fall back, descriptions do not
+        self.assertEqual(self.db.items['ITEM_MIX_GREATSWORD'].name,
+                         'Greatsword')
+        self.assertEqual(self.ore.description, '')
+
+    def test_available_languages(self):
+        self.assertEqual(self.db.available_languages(), ['en', 'jp'])
+
+    def test_switch_and_revert(self):
+        self.check_english()
+        with self.db.language('jp') as db:
+            self.assertIs(db, self.db)
+            self.check_japanese()
+        self.check_english()
+
+    def test_nested(self):
+        with self.db.language('jp'):
+            for lang in ('en', None):
+                with self.db.language(lang):
+                    self.check_english()
+                self.check_japanese()
+            with self.db.language('jp'):
+                self.check_japanese()
+            self.check_japanese()
+        self.check_english()
+
+    def test_reverts_on_error(self):
+        with self.assertRaises(KeyError):
+            with self.db.language('jp'):
+                self.db.items['NOPE']
+        self.check_english()
+
+    def test_other_databases(self):
+        # an overlay only applies to the database it belongs to
+        other = load()
+        with self.db.language('jp'):
+            self.assertEqual(other.items['ITEM_MIX_SWORD'].name, 'Sword')
+            self.assertEqual(other.active_language(), 'en')
+            self.check_japanese()
+
+    def test_search(self):
+        with self.db.language('jp'):
+            self.assertIsNone(self.db.find_item('大剣'))
+            self.assertEqual(self.db.find_item('剣'), self.sword)
+        self.assertEqual(self.db.find_item('sword'), self.sword)
@@ -0,0 +1,215 @@
+import operator
+import unittest
+
+from atelier_tools.ryza_item_table import (ItemTable, find_game_items,
+                                           parse_condition,
+                                           parse_game_conditions)
+from atelier_tools.ryza_parser import Database, Item, normalize_name
+
+from .synthetic import random_database
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '=': operator.eq,
+    '!=': operator.ne,
+}
+SEEDS = range(5)
+
+
+def item_row(db: Database, item: Item) -> dict:
+    return {
+        'game': db.game,
+        'lang': db.lang,
+        'tag': item.tag,
+        'name': normalize_name(item.name),
+        'level': item.level,
+        'price': item.price,
+        'category': {cat.tag for cat in item.categories},
+        'possible_category': {cat.tag for cat in item.possible_categories},
+        'element': {elem.value.lower() for elem in item.elements},
+        'effect': {
+            spec.effect.tag
+            for levels in item.effects for spec in levels.values()
+        },
+    }
+
+
+def matches(row: dict, field: str, op: str, value) -> bool:
+    if isinstance(row[field], set):
+        return (value in row[field]) == (op == '=')
+    if field == 'name':
+        value = normalize_name(value)
+    return OPERATORS[op](row[field], value)
+
+
+def conditions(db: Database) -> list[tuple]:
+    found = []
+    for field in ('level', 'price'):
+        values = sorted({getattr(item, field) for item in db.items.values()})
+        for value in (0, values[0], values[len(values) // 2], values[-1],
+                      1000):
+            found.extend((field, op, value) for op in OPERATORS)
+    for value in ('fire', 'ice', 'light'):
+        found.append(('element', '=', value))
+    for value in ('CAT_0', 'CAT_2', 'ITEM_CATEGORY_NONE'):
+        found.append(('category', '=', value))
+        found.append(('possible_category', '!=', value))
+    for value in db.effects:
+        found.append(('effect', '=', value))
+    found += [('tag', '=', 'ITEM_3'), ('tag', '!=', 'ITEM_3'),
+              ('name', '=', 'item_4 '), ('name', '=', 'Unknown'),
+              ('game', '=', 'ryza1'), ('lang', '!=', 'en')]
+    return found
+
+
+class ItemTableTest(unittest.TestCase):
+
+    def check_conditions(self, table: ItemTable, rows: list[dict],
+                         conds: list[tuple]):
+        for cond in conds:
+            with self.subTest(cond=cond):
+                self.assertEqual(
+                    [tag for tag, in table.query().where(*cond).select('tag')],
+                    [row['tag'] for row in rows if matches(row, *cond)])
+        # and every pair of them together
+        for first in conds[::7]:
+            for second in conds[::5]:
+                query = table.query().where(*first).where(*second)
+                self.assertEqual(query.count(), sum(
+                    matches(row, *first) and matches(row, *second)
+                    for row in rows))
+
+    def test_conditions(self):
+        for seed in SEEDS:
+            db = random_database(seed)
+            rows = [item_row(db, item) for item in db.items.values()]
+            self.check_conditions(ItemTable.build(db), rows, conditions(db))
+
+    def test_combine(self):
+        old, new = random_database(1), random_database(2)
+        old.game = 'ryza1'
+        table = ItemTable.combine(
+            [ItemTable.build(old), ItemTable.build(new)])
+        rows = [item_row(db, item) for db in (old, new)
+                for item in db.items.values()]
+        self.check_conditions(table, rows, conditions(new))
+        self.assertEqual(table.query().where('game', '=', 'ryza1').count(),
+                         len(old.items))
+
+    def test_sort_and_select(self):
+        db = random_database(3)
+        table = ItemTable.build(db)
+        items = list(db.items.values())
+        self.assertEqual(
+            list(table.query().sort('price', descending=True).select(
+                'tag', 'price')),
+            [(item.tag, item.price)
+             for item in sorted(items, key=lambda item: -item.price)])
+        # ties keep the table order
+        self.assertEqual(
+            [tag for tag, in table.query().sort('lang').select('tag')],
+            [item.tag for item in items])
+        self.assertEqual(
+            list(table.query().only(['ITEM_2', 'ITEM_0', 'NOPE']).select(
+                'tag', 'category')),
+            [(item.tag, sorted(cat.tag for cat in item.categories))
+             for item in items if item.tag in ('ITEM_0', 'ITEM_2')])
+        self.assertEqual(list(table.query())[0], (items[0].tag, items[0].name))
+        for bad in (lambda: table.query().sort('category'),
+                    lambda: table.query().select('colour'),
+                    lambda: table.query().where('colour', '=', 'red'),
+                    lambda: table.query().where('level', '=', 'high'),
+                    lambda: table.query().where('category', '<', 'CAT_0')):
+            with self.assertRaises(ValueError):
+                bad()
+
+    def test_parse_condition(self):
+        db = random_database(0)
+        self.assertEqual(tuple(parse_condition(db, ' level <= 20 ')),
+                         ('level', '<=', 20))
+        self.assertEqual(tuple(parse_condition(db, 'category=cat_1')),
+                         ('category', '=', 'CAT_1'))
+        self.assertEqual(tuple(parse_condition(db, 'effect!=eff_hot')),
+                         ('effect', '!=', 'EFF_HOT'))
+        self.assertEqual(tuple(parse_condition(db, 'Element=ICE')),
+                         ('element', '=', 'ice'))
+        self.assertEqual(tuple(parse_condition(db, 'game=Ryza2')),
+                         ('game', '=', 'ryza2'))
+        for bad in ('level', 'level<=high', 'element=wood',
+                    'category=nothing like it', 'colour=red'):
+            with self.assertRaises(ValueError):
+                parse_condition(db, bad)
+
+    def test_names_in_each_game(self):
+        old = random_database(1, n_categories=4)
+        new = random_database(2)
+        old.game = 'ryza1'
+        dbs = [new, old]
+        # the same name is another tag in each game
+        old.categories['CAT_2'].name = '(Shared)'
+        new.categories['CAT_0'].name = '(Shared)'
+        table = ItemTable.combine([ItemTable.build(db) for db in dbs])
+        rows = [(db.game, item_row(db, item)) for db in dbs
+                for item in db.items.values()]
+
+        def tags(query) -> list[str]:
+            return [tag for tag, in query.select('tag')]
+
+        expected = {'ryza1': 'CAT_2', 'ryza2': 'CAT_0'}
+        for op in ('=', '!='):
+            conds = parse_game_conditions(dbs, f'category{op}(shared)')
+            self.assertEqual(
+                {game: cond.value for game, cond in conds.items()}, expected)
+            self.assertEqual(
+                tags(table.query().where_games(conds)),
+                [row['tag'] for game, row in rows
+                 if matches(row, 'category', op, expected[game])])
+        # a name only one game has
+        conds = parse_game_conditions(dbs, 'category=(cat_3)')
+        self.assertEqual(list(conds), ['ryza1'])
+        self.assertEqual(
+            tags(table.query().where_games(conds)),
+            [row['tag'] for game, row in rows
+             if game == 'ryza1' and 'CAT_3' in row['category']])
+        conds = parse_game_conditions(dbs, 'category!=(cat_3)')
+        self.assertEqual(
+            table.query().where_games(conds).count(),
+            len(rows) - len(tags(table.query().where_games(
+                parse_game_conditions(dbs, 'category=(cat_3)')))))
+        with self.assertRaises(ValueError):
+            parse_game_conditions(dbs, 'category=(nothing like it)')
+        # other conditions are the same in every game
+        self.assertEqual(parse_game_conditions(dbs, 'level<10'), {
+            'ryza2': ('level', '<', 10),
+            'ryza1': ('level', '<', 10),
+        })
+
+    def test_only_games(self):
+        old, new = random_database(1), random_database(2)
+        old.game = 'ryza1'
+        table = ItemTable.combine([ItemTable.build(old), ItemTable.build(new)])
+        query = table.query().only_games({
+            'ryza1': ['ITEM_1', 'NOPE'],
+            'ryza2': ['ITEM_2', 'ITEM_3'],
+        }).select('game', 'tag')
+        self.assertEqual(list(query), [('ryza1', 'ITEM_1'),
+                                       ('ryza2', 'ITEM_2'),
+                                       ('ryza2', 'ITEM_3')])
+
+    def test_find_game_items(self):
+        old = random_database(1, n_items=6)
+        new = random_database(2)
+        old.game = 'ryza1'
+        dbs = [new, old]
+        # ryza1 has no item_7, fuzzy matches do not stand in for it
+        self.assertEqual(find_game_items(dbs, ['item_7', 'item_1']), {
+            'ryza2': ['ITEM_7', 'ITEM_1'],
+            'ryza1': ['ITEM_1'],
+        })
+        self.assertEqual(find_game_items(dbs, ['nothing like it']), {
+            'ryza2': [],
+            'ryza1': [],
+        })
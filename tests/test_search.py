@@ -0,0 +1,118 @@
+from typing import Optional
+import unittest
+
+from atelier_tools.ryza_parser import Category, Item, TaggedObject
+from atelier_tools.ryza_search import MatchRank, normalize_query
+
+from .synthetic import ItemSpec, make_database
+
+NAMES = {
+    'ITEM_BOMB': 'Bomb',
+    'ITEM_BOMB_SHELL': 'Bomb Shell',
+    'ITEM_WATER_BOMB': 'Water Bomb',
+    'ITEM_CLEAN_WATER': 'Clean Water',
+    'ITEM_GUNPOWDER': 'Gunpowder',
+    'ITEM_CRAFT': 'Craft',
+}
+CATEGORIES = {
+    'ITEM_CATEGORY_BOMBS': '(Bombs)',
+    'ITEM_CATEGORY_FUEL': '(Fuel)',
+}
+
+
+def slow_rank(obj: TaggedObject, query: str) -> Optional[MatchRank]:
+    '''the rank SearchIndex gives `obj`, without its indexes and without
+    fuzzy matches'''
+    name = normalize_query(obj.name)
+    if query == obj.tag:
+        return MatchRank.EXACT_TAG
+    if query in (name, name.strip('()')):
+        return MatchRank.EXACT_NAME
+    if name.startswith(query) or obj.tag.startswith(query):
+        return MatchRank.PREFIX
+    if query in name or query in obj.tag:
+        return MatchRank.SUBSTRING
+    if query in normalize_query(obj.description):
+        return MatchRank.DESCRIPTION
+    return None
+
+
+class SearchTest(unittest.TestCase):
+
+    def setUp(self):
+        items = {tag: ItemSpec(name=name) for tag, name in NAMES.items()}
+        self.db = make_database(items, list(CATEGORIES))
+        for tag, name in CATEGORIES.items():
+            self.db.categories[tag].name = name
+        self.db.items['ITEM_GUNPOWDER'].description = 'Goes off like a bomb'
+
+    def ranked(self, query: str, **kwargs) -> list[tuple[str, MatchRank]]:
+        return [(match.obj.tag, match.rank)
+                for match in self.db.search(query, **kwargs)]
+
+    def test_ranking(self):
+        self.assertEqual(self.ranked('bomb', loose=False), [
+            ('ITEM_BOMB', MatchRank.EXACT_NAME),
+            ('ITEM_BOMB_SHELL', MatchRank.PREFIX),
+            # ties keep the document order, items before categories
+            ('ITEM_WATER_BOMB', MatchRank.SUBSTRING),
+            ('ITEM_CATEGORY_BOMBS', MatchRank.SUBSTRING),
+        ])
+        self.assertEqual(self.ranked('item_water_bomb')[0],
+                         ('ITEM_WATER_BOMB', MatchRank.EXACT_TAG))
+        # categories match without their parentheses
+        self.assertEqual(self.ranked('fuel')[0],
+                         ('ITEM_CATEGORY_FUEL', MatchRank.EXACT_NAME))
+
+    def test_loose_matches(self):
+        ranked = self.ranked('bomb')
+        self.assertIn(('ITEM_GUNPOWDER', MatchRank.DESCRIPTION), ranked)
+        self.assertEqual(self.ranked('gunpowdr', loose=False), [])
+        self.assertEqual(self.ranked('gunpowdr')[0],
+                         ('ITEM_GUNPOWDER', MatchRank.FUZZY))
+
+    def test_kinds_and_limit(self):
+        self.assertEqual(
+            [tag for tag, _ in self.ranked('bomb', kinds=(Category, ))],
+            ['ITEM_CATEGORY_BOMBS'])
+        self.assertEqual(len(self.ranked('bomb', limit=2)), 2)
+        self.assertEqual(
+            self.db.find_category('bombs').tag, 'ITEM_CATEGORY_BOMBS')
+        # a prefix beats a substring
+        item, cat = self.db.find_item_or_category('water')
+        self.assertIsNone(cat)
+        self.assertEqual(item.tag, 'ITEM_WATER_BOMB')
+        self.assertEqual([item.tag for item in self.db.find_items('craft')],
+                         ['ITEM_CRAFT'])
+
+    def test_against_scan(self):
+        objects = [*self.db.items.values(), *self.db.categories.values()]
+        queries = {'', ' ', 'xyz', '(bombs)'}
+        for obj in objects:
+            for text in (obj.name, obj.tag):
+                text = normalize_query(text)
+                for size in (1, 2, 3, 5):
+                    for start in range(len(text) - size + 1):
+                        queries.add(text[start:start + size])
+        for query in sorted(queries):
+            expected = []
+            for doc, obj in enumerate(objects):
+                rank = slow_rank(obj, normalize_query(query))
+                if rank is not None and normalize_query(query):
+                    expected.append((rank, doc, obj.tag))
+            expected.sort()
+            with self.subTest(query=query):
+                self.assertEqual(self.ranked(query, loose=False), [
+                    (tag, rank) for rank, _, tag in expected
+                    if rank < MatchRank.DESCRIPTION
+                ])
+                loose = [(tag, rank) for tag, rank in self.ranked(query)
+                         if rank != MatchRank.FUZZY]
+                self.assertEqual(loose,
+                                 [(tag, rank) for rank, _, tag in expected])
+
+    def test_items_first(self):
+        # items come before categories of the same rank
+        item, cat = self.db.find_item_or_category('bomb')
+        self.assertIsInstance(item, Item)
+        self.assertIsNone(cat)
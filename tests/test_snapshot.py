@@ -0,0 +1,124 @@
+from pathlib import Path
+import os
+import pickle
+import tempfile
+import time
+import unittest
+
+from atelier_tools.ryza_chain_finder import ChainFinder
+from atelier_tools.ryza_parser import Database
+from atelier_tools.ryza_snapshot import (STALE_TMP_SECONDS, load_snapshot,
+                                         save_snapshot, snapshot_path)
+
+from .synthetic import random_database
+
+
+def item_rows(db: Database) -> list[tuple]:
+    rows = []
+    for item in db.items.values():
+        rows.append((item.tag, item.name, item.level, item.price,
+                     [cat.tag for cat in item.categories],
+                     [cat.tag for cat in item.possible_categories],
+                     [ing.tag for ing in item.ingredients],
+                     [child.tag for child in item.children],
+                     [parent.tag for parent in item.parents],
+                     item.ev_base.tag if item.ev_base else None,
+                     list(item.elements),
+                     [{level: spec.effect.tag
+                       for level, spec in group.items()}
+                      for group in item.effects]))
+    return rows
+
+
+class PickleTest(unittest.TestCase):
+
+    def test_database_round_trip(self):
+        db = random_database(3)
+        copy = pickle.loads(pickle.dumps(db, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(item_rows(copy), item_rows(db))
+        # references stay inside the copy
+        for item in copy.items.values():
+            self.assertIs(item.db, copy)
+            for ing in item.ingredients:
+                self.assertIs(copy.items.get(ing.tag)
+                              or copy.categories[ing.tag], ing)
+        self.assertEqual(copy.find_item('item_4').tag, 'ITEM_4')
+
+    def test_finder_round_trip(self):
+        db = random_database(5)
+        finder = ChainFinder(db, landmarks=2)
+        copy = pickle.loads(pickle.dumps(finder))
+        self.assertEqual(copy.graph_hash, finder.graph_hash)
+        self.assertIsNone(copy.spur_pool)
+        self.assertEqual(
+            copy.find_paths('ITEM_0', ['ITEM_1', 'ITEM_2'], 5),
+            finder.find_paths('ITEM_0', ['ITEM_1', 'ITEM_2'], 5))
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_and_load(self):
+        db = random_database(7)
+        path = self.dir / 'en-new.pickle'
+        save_snapshot(db, path)
+        loaded = load_snapshot(path)
+        assert loaded is not None
+        self.assertEqual(item_rows(loaded), item_rows(db))
+        self.assertEqual(
+            ChainFinder(loaded).graph_hash,
+            ChainFinder(db).graph_hash)
+
+    def test_replaces_old_snapshots(self):
+        old = self.dir / 'en-old.pickle'
+        old.write_bytes(b'stale')
+        other_lang = self.dir / 'jp-old.pickle'
+        other_lang.write_bytes(b'stale')
+        path = self.dir / 'en-new.pickle'
+        save_snapshot(random_database(1), path)
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()),
+                         ['en-new.pickle', 'jp-old.pickle'])
+
+    def test_names(self):
+        cwd = os.getcwd()
+        # the fixture tree of test_database
+        os.chdir(Path(__file__).parent)
+        try:
+            stat_keyed = snapshot_path('ryza2', 'en')
+            hash_keyed = snapshot_path('ryza2', 'en', hash_inputs=True)
+        finally:
+            os.chdir(cwd)
+        self.assertRegex(stat_keyed.name, r'^en-[0-9a-f]{32}\.pickle$')
+        self.assertRegex(hash_keyed.name, r'^en-hashed-[0-9a-f]{32}\.pickle$')
+
+    def test_keeps_the_other_kind(self):
+        # snapshots keyed by stat and by content hash live side by side
+        for name in ('en-old.pickle', 'en-hashed-old.pickle'):
+            (self.dir / name).write_bytes(b'stale')
+        save_snapshot(random_database(1), self.dir / 'en-new.pickle')
+        save_snapshot(random_database(1), self.dir / 'en-hashed-new.pickle')
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()),
+                         ['en-hashed-new.pickle', 'en-new.pickle'])
+
+    def test_removes_stale_temporary_files(self):
+        old = time.time() - STALE_TMP_SECONDS - 60
+        for name in ('en-stale.tmp', 'en-writing.tmp', 'distances-x.tmp'):
+            (self.dir / name).write_bytes(b'partial')
+        os.utime(self.dir / 'en-stale.tmp', (old, old))
+        os.utime(self.dir / 'distances-x.tmp', (old, old))
+        save_snapshot(random_database(1), self.dir / 'en-new.pickle')
+        self.assertEqual(
+            sorted(p.name for p in self.dir.iterdir()),
+            ['distances-x.tmp', 'en-new.pickle', 'en-writing.tmp'])
+
+    def test_missing_or_broken(self):
+        self.assertIsNone(load_snapshot(self.dir / 'en-none.pickle'))
+        broken = self.dir / 'en-broken.pickle'
+        broken.write_bytes(b'not a pickle')
+        self.assertIsNone(load_snapshot(broken))
@@ -0,0 +1,77 @@
+from pathlib import Path
+import pickle
+import tempfile
+import unittest
+
+from atelier_tools.ryza_strings import StringTable
+
+STRINGS = {
+    3: 'Bomb',
+    4: '',
+    6: 'Clean Water',
+    100: 'Gunpowder',
+    101: 'ヒンメルの雫',
+    102: 'tab\tand\nnewline',
+    # outside of every block, dropped
+    50: 'unused',
+}
+BLOCKS = [range(2, 8), range(20, 20), range(100, 104)]
+
+
+class StringTableTest(unittest.TestCase):
+
+    def expected(self) -> dict[int, str]:
+        return {
+            num: text
+            for num, text in STRINGS.items()
+            if any(num in block for block in BLOCKS)
+        }
+
+    def check(self, table: StringTable):
+        expected = self.expected()
+        self.assertEqual(dict(table.items()), expected)
+        self.assertEqual(list(table), sorted(expected))
+        self.assertEqual(len(table), len(expected))
+        for num in range(0, 110):
+            self.assertEqual(table.get(num), expected.get(num))
+            self.assertEqual(num in table, num in expected)
+            if num in expected:
+                self.assertEqual(table[num], expected[num])
+            else:
+                with self.assertRaises(KeyError):
+                    table[num]
+        self.assertEqual(table.get(5, 'default'), 'default')
+        self.assertNotIn('3', table)
+
+    def test_from_dict(self):
+        self.check(StringTable.from_dict(STRINGS, BLOCKS))
+
+    def test_bytes_round_trip(self):
+        table = StringTable.from_dict(STRINGS, BLOCKS)
+        data = table.to_bytes()
+        self.check(StringTable.from_buffer(data))
+        self.assertEqual(StringTable.from_buffer(data).to_bytes(), data)
+
+    def test_file_round_trip(self):
+        table = StringTable.from_dict(STRINGS, BLOCKS)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'strings.bin'
+            table.save(path)
+            mapped = StringTable.open(path)
+            self.check(mapped)
+            # mapped tables pickle by value
+            self.check(pickle.loads(pickle.dumps(mapped)))
+
+    def test_pickle(self):
+        table = StringTable.from_dict(STRINGS, BLOCKS)
+        self.check(pickle.loads(pickle.dumps(table)))
+
+    def test_empty(self):
+        table = StringTable.from_dict({}, [])
+        self.assertEqual(len(table), 0)
+        self.assertIsNone(table.get(0))
+        self.assertEqual(len(StringTable.from_buffer(table.to_bytes())), 0)
+
+    def test_not_a_table(self):
+        with self.assertRaises(ValueError):
+            StringTable.from_buffer(b'NOTATABLE' + bytes(64))